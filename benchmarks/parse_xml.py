@@ -0,0 +1,204 @@
+"""Benchmark XML parsing of Soundtouch payloads.
+
+Compare the single-pass ElementTree models with the former minidom path
+(each field looked up with getElementsByTagName) on the fixtures of
+tests/data, then eager and lazy decoding of statuses when only source and
+play status are read. Report parse time and memory allocations per
+payload.
+
+Preset source_xml is serialized on first access by the ElementTree models
+(only when a preset is selected) while minidom serializes it eagerly.
+
+Usage: python benchmarks/parse_xml.py [iterations]
+"""
+
+import os
+import sys
+import timeit
+import tracemalloc
+from xml.dom import minidom
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# pylint: disable=wrong-import-position
+from libsoundtouch.device import Config, Status, Volume, \
+    _parse_presets, _parse_xml  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'tests', 'data')
+
+
+# Former minidom path
+
+def _dom_elements(xml_dom, element):
+    return xml_dom.getElementsByTagName(element)
+
+
+def _dom_element(xml_dom, element):
+    elements = _dom_elements(xml_dom, element)
+    return elements[0] if elements else None
+
+
+def _dom_attribute(xml_dom, attribute):
+    if attribute in xml_dom.attributes.keys():
+        return xml_dom.attributes[attribute].value
+    return None
+
+
+def _dom_element_attribute(xml_dom, element, attribute):
+    element = _dom_element(xml_dom, element)
+    return _dom_attribute(element, attribute) if element else None
+
+
+def _dom_element_value(xml_dom, element):
+    element = _dom_element(xml_dom, element)
+    if element is not None and element.firstChild is not None:
+        return element.firstChild.nodeValue.strip()
+    return None
+
+
+def _legacy_content_item(xml_dom):
+    return dict([('name', _dom_element_value(xml_dom, "itemName"))] + [
+        (attribute, _dom_attribute(xml_dom, attribute))
+        for attribute in ("source", "type", "location", "sourceAccount",
+                          "isPresetable")])
+
+
+def _legacy_status(xml_dom):
+    status = dict(
+        (element, _dom_element_value(xml_dom, element))
+        for element in ("track", "artist", "album", "art", "time",
+                        "playStatus", "shuffleSetting", "repeatSetting",
+                        "streamType", "trackID", "stationName",
+                        "description", "stationLocation"))
+    status['source'] = _dom_element_attribute(xml_dom, "nowPlaying", "source")
+    status['image_status'] = _dom_element_attribute(xml_dom, "art",
+                                                    "artImageStatus")
+    status['duration'] = _dom_element_attribute(xml_dom, "time", "total")
+    if _dom_elements(xml_dom, "ContentItem"):
+        status['content_item'] = _legacy_content_item(
+            _dom_element(xml_dom, "ContentItem"))
+    return status
+
+
+def _legacy_config(xml_dom):
+    config = dict(
+        (element, _dom_element_value(xml_dom, element))
+        for element in ("name", "type", "margeAccountUUID", "moduleType",
+                        "variant", "variantMode", "countryCode",
+                        "regionCode"))
+    config['id'] = _dom_element_attribute(xml_dom, "info", "deviceID")
+    config['networks'] = [
+        (network.attributes["type"].value,
+         _dom_element_value(network, "macAddress"),
+         _dom_element_value(network, "ipAddress"))
+        for network in _dom_elements(xml_dom, "networkInfo")]
+    config['components'] = [
+        (_dom_element_value(component, "componentCategory"),
+         _dom_element_value(component, "softwareVersion"),
+         _dom_element_value(component, "serialNumber"))
+        for components in _dom_elements(xml_dom, "components")
+        for component in _dom_elements(components, "component")]
+    return config
+
+
+def _legacy_volume(xml_dom):
+    return (int(_dom_element_value(xml_dom, "actualvolume")),
+            int(_dom_element_value(xml_dom, "targetvolume")),
+            _dom_element_value(xml_dom, "muteenabled") == "true")
+
+
+def _legacy_presets(xml_dom):
+    presets = []
+    for preset in _dom_elements(xml_dom, "preset"):
+        fields = dict(
+            (attribute, _dom_element_attribute(preset, "ContentItem",
+                                               attribute))
+            for attribute in ("source", "type", "location", "sourceAccount",
+                              "isPresetable"))
+        fields['name'] = _dom_element_value(preset, "itemName")
+        fields['id'] = _dom_attribute(preset, "id")
+        fields['source_xml'] = _dom_element(preset, "ContentItem").toxml()
+        presets.append(fields)
+    return presets
+
+
+def _legacy(build):
+    return lambda payload: build(minidom.parseString(payload))
+
+
+# Single-pass ElementTree path
+
+def _updated(build):
+    return lambda payload: build(_parse_xml(payload)[0][0])
+
+
+PAYLOADS = [
+    ("device_info.xml", _legacy(_legacy_config),
+     lambda payload: Config(_parse_xml(payload))),
+    ("device_info_utf8.xml", _legacy(_legacy_config),
+     lambda payload: Config(_parse_xml(payload))),
+    ("radio.xml", _legacy(_legacy_status),
+     lambda payload: Status(_parse_xml(payload))),
+    ("spotify.xml", _legacy(_legacy_status),
+     lambda payload: Status(_parse_xml(payload))),
+    ("stored_music.xml", _legacy(_legacy_status),
+     lambda payload: Status(_parse_xml(payload))),
+    ("ws_status.xml", _legacy(_legacy_status), _updated(Status)),
+    ("ws_volume.xml", _legacy(_legacy_volume), _updated(Volume)),
+    ("ws_presets.xml", _legacy(_legacy_presets), _updated(_parse_presets)),
+]
+
+# Lazy decoding: only source and play status are read
+LAZY_PAYLOADS = [
+    ("radio.xml", lambda payload: Status(_parse_xml(payload)),
+     lambda payload: Status(_parse_xml(payload), lazy=True)),
+    ("ws_status.xml", _updated(Status),
+     _updated(lambda element: Status(element, lazy=True))),
+]
+
+
+def _allocations(function, payload):
+    """Return blocks kept by the parsed model and peak bytes of one call."""
+    tracemalloc.start()
+    try:
+        result = function(payload)
+        peak = tracemalloc.get_traced_memory()[1]
+        blocks = sum(stat.count for stat in
+                     tracemalloc.take_snapshot().statistics('filename'))
+    finally:
+        tracemalloc.stop()
+    del result
+    return blocks, peak
+
+
+def _read_status(build):
+    def _read(payload):
+        status = build(payload)
+        return status.source, status.play_status
+    return _read
+
+
+def _run(payloads, parsers, iterations):
+    for filename, first, second in payloads:
+        with open(os.path.join(DATA_DIR, filename), 'rb') as data:
+            payload = data.read()
+        for name, function in zip(parsers, (first, second)):
+            duration = timeit.timeit(lambda: function(payload),
+                                     number=iterations)
+            blocks, size = _allocations(function, payload)
+            print("%-22s %-8s %10.1f %8d %12d" % (
+                filename, name, duration / iterations * 1e6, blocks, size))
+
+
+def main(iterations=2000):
+    """Run the benchmark and print one line per payload and parser."""
+    print("%-22s %-8s %10s %8s %12s" % ("payload", "parser", "us/parse",
+                                        "blocks", "peak bytes"))
+    _run(PAYLOADS, ("minidom", "etree"), iterations)
+    _run([(filename, _read_status(eager), _read_status(lazy))
+          for filename, eager, lazy in LAZY_PAYLOADS],
+         ("eager", "lazy"), iterations)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -1,49 +1,242 @@
 """libsoundtouch."""
 
 import logging
+from concurrent.futures import ThreadPoolExecutor, wait, \
+    TimeoutError as FutureTimeoutError
 
 try:
     from queue import Queue, Empty
 except ImportError:
     from Queue import Queue, Empty  # type: ignore
+try:
+    from time import monotonic
+except ImportError:  # Python 2.7
+    from time import time as monotonic
 from zeroconf import Zeroconf, ServiceBrowser
 from libsoundtouch.device import SoundTouchDevice
+from libsoundtouch.devicecache import DeviceCache  # noqa: F401
+from libsoundtouch.dispatch import ListenerDispatcher  # noqa: F401
+from libsoundtouch.events import EventStream  # noqa: F401
+from libsoundtouch.hub import NotificationHub  # noqa: F401
+from libsoundtouch.registry import DeviceRegistry, SERVICE_TYPE  # noqa: F401
+from libsoundtouch.scan import scan_devices  # noqa: F401
+from libsoundtouch.transport import Transport, FleetTransport  # noqa: F401
 from libsoundtouch.utils import SoundtouchDeviceListener
 
 _LOGGER = logging.getLogger(__name__)
 
 
-def soundtouch_device(host, port=8090):
+def soundtouch_device(host, port=8090, transport=None):
     """Create a new Soundtouch device.
 
     :param host: Host of the device
     :param port: Port of the device. Default 8090
+    :param transport: Transport shared between devices (see FleetTransport).
+        Each device uses its own transport if not set
 
     """
-    s_device = SoundTouchDevice(host, port)
+    s_device = SoundTouchDevice(host, port, transport=transport)
     return s_device
 
 
-def discover_devices(timeout=5):
-    """Discover devices on the local network.
+def soundtouch_devices(hosts, timeout=5, transport=None, max_workers=16,
+                       failures=None):
+    """Create Soundtouch devices fetching their configuration concurrently.
+
+    Devices whose configuration can't be fetched before the deadline are
+    left out.
+
+    :param hosts: List of hosts or (host, port) tuples
+    :param timeout: Max time to wait in seconds for all the configurations.
+        Default 5
+    :param transport: Transport shared by the devices. Its executor fetches
+        the configurations if set
+    :param max_workers: Max concurrent fetches if transport is not set.
+        Default 16
+    :param failures: Dict filled with the errors of the devices left out,
+        by host
+    """
+    devices = []
+    for host in hosts:
+        host, port = host if isinstance(host, tuple) else (host, 8090)
+        devices.append(SoundTouchDevice(host, port, transport=transport,
+                                        lazy=True))
+    if transport is not None:
+        executor = transport.executor
+    else:
+        executor = ThreadPoolExecutor(max(1, min(max_workers, len(devices))))
+    futures = [executor.submit(device.load_config) for device in devices]
+    if transport is None:
+        executor.shutdown(wait=False)
+    wait(futures, timeout)
+    ready = []
+    for device, future in zip(devices, futures):
+        if not future.done():
+            _LOGGER.warning("Timeout while fetching %s configuration",
+                            device.host)
+            error = FutureTimeoutError()
+        elif future.exception() is not None:
+            _LOGGER.warning("Unable to fetch %s configuration: %s",
+                            device.host, future.exception())
+            error = future.exception()
+        else:
+            ready.append(device)
+            continue
+        if failures is not None:
+            failures[device.host] = error
+    return ready
+
+
+def _discovery_done(devices, expected_count, stop_when):
+    """Return True if the devices found end the discovery."""
+    if expected_count is not None and len(devices) >= expected_count:
+        return True
+    return stop_when is not None and stop_when(devices)
+
+
+def iter_devices(timeout=5, transport=None, expected_count=None,
+                 stop_when=None, max_workers=16, device_timeout=None,
+                 failures=None, cache=None, zeroconf=None):
+    """Discover devices on the local network, yield each one when found.
+
+    Services are resolved and configurations fetched concurrently: devices
+    are yielded in the order their configuration is fetched. Discovery ends
+    when the timeout expires, expected_count devices are found or stop_when
+    returns True.
 
     :param timeout: Max time to wait in seconds. Default 5
+    :param transport: Transport shared by discovered devices. Its executor
+        fetches the configurations if set
+    :param expected_count: Number of devices after which discovery ends.
+        Wait for the timeout if not set
+    :param stop_when: Function called with the list of devices found so
+        far after each new device. Discovery ends when it returns True
+    :param max_workers: Max concurrent resolutions and fetches. Default 16
+    :param device_timeout: Max time in seconds to fetch the configuration of
+        a device once found. Bounded by the discovery timeout only if not set
+    :param failures: Dict filled with the errors of the devices left out
+        (unreachable or too slow), by host
+    :param cache: DeviceCache whose devices are yielded first, without any
+        request, and revalidated in the background. Discovered devices are
+        stored in it
+    :param zeroconf: Zeroconf instance shared with other services (see
+        DeviceRegistry). Left open when discovery ends. A new instance is
+        created and closed if not set
     """
+    deadline = monotonic() + timeout
     devices = []
-    # Using Queue as a timeout timer
-    add_devices_queue = Queue()
+    seen = set()
+    yielded = {}  # Device id: yielded device
+    if cache is not None:
+        for device in cache.devices(transport, max_workers=max_workers):
+            seen.add((device.host, device.port))
+            yielded[device.config.device_id] = device
+            devices.append(device)
+            yield device
+            if _discovery_done(devices, expected_count, stop_when):
+                return
+    found = Queue()  # Resolved services and fetched configurations
+    resolver = ThreadPoolExecutor(max_workers)
+    executor = transport.executor if transport is not None else resolver
 
     def add_device_function(name, host, port):
-        """Add device callback."""
+        """Add device callback, run by the resolving threads."""
         _LOGGER.info("%s discovered (host: %s, port: %i)", name, host, port)
-        devices.append(soundtouch_device(host, port))
+        found.put((name, host, port))
+
+    def fail(name, device, error):
+        _LOGGER.warning("Unable to fetch %s configuration (host: %s): %s",
+                        name, device.host, error)
+        if failures is not None:
+            failures[device.host] = error
 
-    zeroconf = Zeroconf()
-    listener = SoundtouchDeviceListener(add_device_function)
+    own_zeroconf = zeroconf is None
+    if own_zeroconf:
+        zeroconf = Zeroconf()
+    listener = SoundtouchDeviceListener(add_device_function, resolver)
     _LOGGER.debug("Starting discovery...")
-    ServiceBrowser(zeroconf, "_soundtouch._tcp.local.", listener)
+    browser = ServiceBrowser(zeroconf, SERVICE_TYPE, listener)
+    pending = {}  # Fetch future: (name, device, deadline)
     try:
-        add_devices_queue.get(timeout=timeout)
-    except Empty:
+        while True:
+            now = monotonic()
+            for future, (name, device, expiry) in list(pending.items()):
+                if expiry <= now:
+                    del pending[future]
+                    fail(name, device, FutureTimeoutError())
+            if now >= deadline:
+                break
+            wakeup = min([deadline] + [expiry for _, _, expiry
+                                       in pending.values()])
+            try:
+                item = found.get(timeout=wakeup - now)
+            except Empty:
+                continue
+            if isinstance(item, tuple):
+                name, host, port = item
+                if (host, port) in seen:
+                    continue
+                seen.add((host, port))
+                device = SoundTouchDevice(host, port, transport=transport,
+                                          lazy=True)
+                future = executor.submit(device.load_config)
+                pending[future] = (name, device, deadline
+                                   if device_timeout is None else
+                                   min(deadline, now + device_timeout))
+                future.add_done_callback(found.put)
+                continue
+            if item not in pending:  # Too late
+                continue
+            name, device, _ = pending.pop(item)
+            if item.exception() is not None:
+                fail(name, device, item.exception())
+                continue
+            if cache is not None:
+                cache.put(device)
+            known = yielded.get(device.config.device_id)
+            if known is not None:
+                # Cached device found at a new address: the former one may
+                # now be the address of another device
+                # pylint: disable=protected-access
+                seen.discard((known.host, known.port))
+                known._update(device.host, device.port, device.config)
+                continue
+            yielded[device.config.device_id] = device
+            devices.append(device)
+            yield device
+            if _discovery_done(devices, expected_count, stop_when):
+                break
+    finally:
         _LOGGER.debug("End of discovery...")
-    return devices
+        if own_zeroconf:
+            zeroconf.close()
+        else:
+            browser.cancel()
+        resolver.shutdown(wait=False)
+
+
+def discover_devices(timeout=5, transport=None, expected_count=None,
+                     stop_when=None, max_workers=16, device_timeout=None,
+                     failures=None, cache=None, zeroconf=None):
+    """Discover devices on the local network.
+
+    See iter_devices: return as soon as discovery ends.
+
+    :param timeout: Max time to wait in seconds. Default 5
+    :param transport: Transport shared by discovered devices
+    :param expected_count: Number of devices after which discovery ends.
+        Wait for the timeout if not set
+    :param stop_when: Function called with the list of devices found so
+        far after each new device. Discovery ends when it returns True
+    :param max_workers: Max concurrent resolutions and fetches. Default 16
+    :param device_timeout: Max time in seconds to fetch the configuration of
+        a device once found
+    :param failures: Dict filled with the errors of the devices left out,
+        by host
+    :param cache: DeviceCache whose devices are returned without any
+        request. Discovered devices are stored in it
+    :param zeroconf: Zeroconf instance shared with other services
+    """
+    return list(iter_devices(timeout, transport, expected_count, stop_when,
+                             max_workers, device_timeout, failures, cache,
+                             zeroconf))
@@ -0,0 +1,83 @@
+"""Asyncio event streams of Bose Soundtouch notifications.
+
+Require Python 3.5+.
+"""
+
+import asyncio
+from threading import Lock
+
+from .dispatch import DEFAULT_MAX_QUEUE_SIZE
+from .events import _Stream
+from .utils import DispatchPolicy
+
+
+class AsyncEventStream(_Stream):
+    """Asynchronous iterator over the events of one or more devices.
+
+    Same as EventStream but read with ``async for`` in the event loop. The
+    listeners of a SoundTouchDevice run in its websocket thread: the loop is
+    woken up thread-safely.
+    """
+
+    def __init__(self, devices, types=None, max_size=DEFAULT_MAX_QUEUE_SIZE,
+                 policy=DispatchPolicy.COALESCE, timeout=None, loop=None):
+        """Create a new asynchronous event stream.
+
+        :param devices: Devices (SoundTouchDevice or AsyncSoundTouchDevice)
+        :param types: Event types to read. All types if not set
+        :param max_size: Max pending events. Default 100
+        :param policy: DispatchPolicy of the buffer. Default COALESCE
+        :param timeout: Max idle time in seconds: iteration ends when no
+            event is received within the timeout. Wait forever if not set
+        :param loop: Event loop reading the stream. Default the current loop
+        """
+        self._loop = loop if loop is not None else asyncio.get_event_loop()
+        self._ready = asyncio.Event()
+        self._timeout = timeout
+        super(AsyncEventStream, self).__init__(devices, types, max_size,
+                                               policy, Lock())
+
+    def _wakeup(self):
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:  # Loop closed
+            pass
+
+    async def get(self, timeout=None):
+        """Return next event, wait for it if needed.
+
+        Return None if the stream is closed or no event is received within
+        the timeout.
+
+        :param timeout: Max time to wait in seconds. Wait forever if not set
+        """
+        while True:
+            with self._lock:
+                if self._events:
+                    return self._events.popleft()
+                if self._closed:
+                    return None
+                self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+    def __aiter__(self):
+        """Return the stream."""
+        return self
+
+    async def __anext__(self):
+        """Return next event."""
+        event = await self.get(self._timeout)
+        if event is None:
+            raise StopAsyncIteration()
+        return event
+
+    async def __aenter__(self):
+        """Enter the async context."""
+        return self
+
+    async def __aexit__(self, *args):
+        """Close the stream when leaving the async context."""
+        self.close()
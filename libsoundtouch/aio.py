@@ -0,0 +1,896 @@
+"""Bose Soundtouch Device for asyncio.
+
+Require Python 3.5+ and aiohttp (pip install libsoundtouch[async]).
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+from zeroconf import Zeroconf, ServiceBrowser
+
+from .device import Config, Status, Volume, STATE_STANDBY, \
+    NoExistingZoneException, _NotificationListeners, _key_bodies, \
+    _content_item_body, _play_media_body, _zone_body, _play_url_request, \
+    _parse_presets, _parse_zone_status, _parse_xml, _update_type, \
+    _parse_sources, _parse_group, Bass, _UPDATE_EVENTS, _STATE_EVENTS, \
+    _PUSHED_UPDATES, _FETCHED_EVENTS
+from .cache import StateCache, fingerprint
+from .reconnect import Connection, DEFAULT_PING_INTERVAL
+from .registry import SERVICE_TYPE
+from .transport import DEFAULT_TIMEOUT, DEFAULT_POOL_SIZE
+from .utils import ConnectionEvent, Key, Source, Type, \
+    SoundtouchDeviceListener
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_soundtouch_device(host, port=8090, session=None,
+                                  timeout=DEFAULT_TIMEOUT):
+    """Create a new asyncio Soundtouch device.
+
+    :param host: Host of the device
+    :param port: Port of the device. Default 8090
+    :param session: aiohttp ClientSession shared between devices. Each
+        device creates its own session if not set
+    :param timeout: HTTP timeout in seconds (or (connect, read) tuple).
+        Default 10
+    """
+    device = AsyncSoundTouchDevice(host, port, session=session,
+                                   timeout=timeout)
+    await device.refresh_config()
+    return device
+
+
+def _client_timeout(timeout):
+    if isinstance(timeout, tuple):
+        return aiohttp.ClientTimeout(sock_connect=timeout[0],
+                                     sock_read=timeout[1])
+    return aiohttp.ClientTimeout(total=timeout)
+
+
+def async_iter_devices(timeout=5, session=None, expected_count=None,
+                       stop_when=None, max_workers=16, device_timeout=None,
+                       failures=None):
+    """Discover devices on the local network, yield each one when found.
+
+    Asynchronous version of libsoundtouch.iter_devices, read with
+    ``async for``::
+
+        async for device in async_iter_devices(expected_count=3):
+            print(device.config.name)
+
+    :param timeout: Max time to wait in seconds. Default 5
+    :param session: aiohttp ClientSession shared by discovered devices
+    :param expected_count: Number of devices after which discovery ends.
+        Wait for the timeout if not set
+    :param stop_when: Function called with the list of devices found so
+        far after each new device. Discovery ends when it returns True
+    :param max_workers: Max concurrent resolutions and fetches. Default 16
+    :param device_timeout: Max time in seconds to fetch the configuration of
+        a device once found. Bounded by the discovery timeout only if not set
+    :param failures: Dict filled with the errors of the devices left out
+        (unreachable or too slow), by host
+    """
+    return _AsyncDiscovery(timeout, session, expected_count, stop_when,
+                           max_workers, device_timeout, failures)
+
+
+async def async_discover_devices(timeout=5, session=None, expected_count=None,
+                                 stop_when=None, max_workers=16,
+                                 device_timeout=None, failures=None):
+    """Discover devices on the local network.
+
+    See async_iter_devices: return as soon as discovery ends.
+    """
+    devices = []
+    async with async_iter_devices(timeout, session, expected_count,
+                                  stop_when, max_workers, device_timeout,
+                                  failures) as discovery:
+        async for device in discovery:
+            devices.append(device)
+    return devices
+
+
+class _AsyncDiscovery:
+    """Asynchronous iterator over discovered devices.
+
+    Zeroconf runs in its own thread: it is started and closed in the
+    default executor, services are resolved by a thread pool which wakes up
+    the event loop thread-safely. Configurations are fetched by concurrent
+    tasks.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, timeout, session, expected_count, stop_when,
+                 max_workers, device_timeout, failures):
+        # pylint: disable=too-many-arguments
+        self._timeout = timeout
+        self._session = session
+        self._expected_count = expected_count
+        self._stop_when = stop_when
+        self._max_workers = max_workers
+        self._device_timeout = device_timeout
+        self._failures = failures
+        self._loop = None
+        self._found = None
+        self._fetches = None
+        self._deadline = None
+        self._zeroconf = None
+        self._resolver = None
+        self._tasks = {}
+        self._devices = []
+        self._seen = set()
+        self._done = False
+
+    def _browse(self):
+        zeroconf = Zeroconf()
+        listener = SoundtouchDeviceListener(self._add_device, self._resolver)
+        _LOGGER.debug("Starting discovery...")
+        ServiceBrowser(zeroconf, SERVICE_TYPE, listener)
+        return zeroconf
+
+    def _add_device(self, name, host, port):
+        """Add device callback, run by the resolving threads."""
+        _LOGGER.info("%s discovered (host: %s, port: %i)", name, host, port)
+        self._loop.call_soon_threadsafe(self._on_service, name, host, port)
+
+    def _on_service(self, name, host, port):
+        if self._done or (host, port) in self._seen:
+            return
+        self._seen.add((host, port))
+        device = AsyncSoundTouchDevice(host, port, session=self._session)
+        timeout = max(0, self._deadline - self._loop.time())
+        if self._device_timeout is not None:
+            timeout = min(timeout, self._device_timeout)
+        self._tasks[device] = asyncio.ensure_future(
+            self._fetch(name, device, timeout))
+
+    async def _fetch(self, name, device, timeout):
+        try:
+            await asyncio.wait_for(self._fetch_config(device), timeout)
+        except asyncio.CancelledError:
+            # Discovery ended: too slow if it ended with the timeout
+            if self._loop.time() >= self._deadline:
+                self._fail(name, device, asyncio.TimeoutError())
+            await device.close()
+            raise
+        except Exception as error:  # pylint: disable=broad-except
+            # Unreachable host, or not a device (invalid XML, missing info)
+            self._fail(name, device, error)
+            await device.close()
+        else:
+            self._found.put_nowait(device)
+        finally:
+            self._tasks.pop(device, None)
+
+    def _fail(self, name, device, error):
+        _LOGGER.warning("Unable to fetch %s configuration (host: %s): %s",
+                        name, device.host, error)
+        if self._failures is not None:
+            self._failures[device.host] = error
+
+    async def _fetch_config(self, device):
+        async with self._fetches:
+            await device.refresh_config()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._loop is None:
+            self._loop = asyncio.get_event_loop()
+            self._found = asyncio.Queue()
+            self._fetches = asyncio.Semaphore(self._max_workers)
+            self._deadline = self._loop.time() + self._timeout
+            self._resolver = ThreadPoolExecutor(self._max_workers)
+            self._zeroconf = await self._loop.run_in_executor(None,
+                                                              self._browse)
+        if not self._done:
+            try:
+                device = await asyncio.wait_for(
+                    self._found.get(),
+                    max(0, self._deadline - self._loop.time()))
+            except asyncio.TimeoutError:
+                pass
+            else:
+                self._devices.append(device)
+                self._done = (self._expected_count is not None and
+                              len(self._devices) >= self._expected_count) or (
+                    self._stop_when is not None and
+                    self._stop_when(self._devices))
+                return device
+        await self.aclose()
+        raise StopAsyncIteration()
+
+    async def aclose(self):
+        """Stop discovery, pending fetches are cancelled."""
+        self._done = True
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._zeroconf is not None:
+            zeroconf, self._zeroconf = self._zeroconf, None
+            _LOGGER.debug("End of discovery...")
+            self._resolver.shutdown(wait=False)
+            await self._loop.run_in_executor(None, zeroconf.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
+
+
+class AsyncSoundTouchDevice(_NotificationListeners):
+    """Bose SoundTouch Device driven by asyncio.
+
+    Same API as SoundTouchDevice but HTTP calls are coroutines and
+    notifications are read by a task of the running event loop.
+    """
+
+    def __init__(self, host, port=8090, ws_port=8080, dlna_port=8091,
+                 session=None, timeout=DEFAULT_TIMEOUT,
+                 pool_size=DEFAULT_POOL_SIZE, cache_ttl=0,
+                 lazy_decoding=False, reconnect=True, backoff=None,
+                 ping_interval=DEFAULT_PING_INTERVAL,
+                 filter_notifications=False):
+        """Create a new asyncio Soundtouch device.
+
+        The configuration is not fetched: await refresh_config() or use
+        async_soundtouch_device().
+
+        :param host: Host of the device
+        :param port: Port of the device. Default 8090
+        :param ws_port: Web socket port. Default 8080
+        :param dlna_port: DLNA port. Default 8091
+        :param session: aiohttp ClientSession. A new session is created on
+            first use if not set
+        :param timeout: HTTP timeout in seconds (or (connect, read) tuple).
+            Ignored if session is set. Default 10
+        :param pool_size: Max connections per host of the created session.
+            Ignored if session is set. Default 4
+        :param cache_ttl: Max age in seconds of the states returned by
+            status(), volume(), presets() and zone_status(). Default 0
+            (always refresh)
+        :param lazy_decoding: Decode status and presets fields on first
+            access instead of when received. Default False
+        :param reconnect: Open the websocket again when it is disconnected
+            and fetch the states again once reconnected. Default True
+        :param backoff: Backoff of the reconnection attempts. Default
+            Backoff()
+        :param ping_interval: Websocket heartbeat interval in seconds to
+            detect dead connections. 0 to disable. Default 30
+        :param filter_notifications: Don't parse volume, status, presets and
+            zone notifications without listener when the state cache is
+            disabled: their stored state is dropped. Default False
+        """
+        self._host = host
+        self._port = port
+        self._ws_port = ws_port
+        self._dlna_port = dlna_port
+        self._own_session = session is None
+        self._session = session
+        self._timeout = timeout
+        self._pool_size = pool_size
+        self._config = None
+        self._status = None
+        self._volume = None
+        self._zone_status = None
+        self._presets = None
+        self._now_selection = None
+        self._recents = None
+        self._sources = None
+        self._bass = None
+        self._connection_state = None
+        self._group = None
+        self._cache = StateCache(cache_ttl)
+        self._lazy_decoding = lazy_decoding
+        self._filter_notifications = filter_notifications
+        self._ws_task = None
+        self._reconnect = reconnect
+        self._ping_interval = ping_interval
+        self._connection = Connection(backoff)
+        self._deferred = {}
+        self._deferred_again = set()
+        self._init_listeners()
+        self._snapshot = None
+
+    async def __aenter__(self):
+        """Enter the async context."""
+        return self
+
+    async def __aexit__(self, *args):
+        """Close the device when leaving the async context."""
+        await self.close()
+
+    def _get_session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit_per_host=self._pool_size),
+                timeout=_client_timeout(self._timeout))
+        return self._session
+
+    def _url(self, action):
+        return "http://" + self._host + ":" + str(self._port) + action
+
+    async def _request(self, method, url, **kwargs):
+        response = await self._get_session().request(method, url, **kwargs)
+        try:
+            return await response.read()
+        finally:
+            response.release()
+
+    async def _get(self, action):
+        return await self._request('GET', self._url(action))
+
+    async def _post(self, action, data, **kwargs):
+        return await self._request('POST', self._url(action), data=data,
+                                   **kwargs)
+
+    async def close(self):
+        """Stop notifications and close the created session.
+
+        An injected session is left open: its owner is in charge of it.
+        """
+        self.stop_notification()
+        if self._own_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _run_listeners(self, listeners, value):
+        """Run listeners, a failing listener doesn't stop the others."""
+        for listener in listeners:
+            try:
+                result = listener(value)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error in listener of %s", self._host)
+                continue
+            if asyncio.iscoroutine(result):
+                asyncio.ensure_future(result)
+
+    async def _on_message(self, message):
+        """Call when web socket is received."""
+        event = _UPDATE_EVENTS.get(_update_type(message))
+        if event in _STATE_EVENTS and not self._interested(event):
+            self._ignore(event)
+            return
+        root = _parse_xml(message.encode('utf-8'))
+        if root.tag != "updates" or not len(root):
+            return
+        action_node = root[0]
+        action = action_node.tag
+        if action == "volumeUpdated" and len(action_node):
+            self._volume = Volume(action_node[0])
+            self._cache.updated('volume')
+            self._run_listeners(self._volume_updated_listeners, self._volume)
+        if action == "nowPlayingUpdated" and len(action_node):
+            self._status = Status(action_node[0], self._lazy_decoding)
+            self._cache.updated('status')
+            self._run_listeners(self._status_updated_listeners, self._status)
+        if action == "presetsUpdated" and len(action_node):
+            self._presets = _parse_presets(action_node[0],
+                                           self._lazy_decoding)
+            self._cache.updated('presets')
+            self._run_listeners(self._presets_updated_listeners,
+                                self._presets)
+        if action == "zoneUpdated":
+            # The cached zone is stale until the deferred fetch is done
+            self._cache.invalidate('zone_status')
+            self._defer('zone_status', self._on_zone_updated)
+        if action == "infoUpdated":
+            # The configuration is stale until the deferred fetch is done
+            self._config = None
+            self._defer('device_info', self._on_info_updated)
+        if action in _PUSHED_UPDATES:
+            self._on_pushed_update(action_node, *_PUSHED_UPDATES[action])
+
+    def _on_pushed_update(self, update_element, event, tag, parse):
+        """Store and notify the state carried by an update.
+
+        Updates without state (sourcesUpdated, bassUpdated...) are followed
+        by a deferred fetch of the state.
+        """
+        element = update_element if tag is None else update_element.find(tag)
+        if element is None:
+            if event in _FETCHED_EVENTS:
+                self._cache.invalidate(event)
+                self._defer(event, lambda: self._on_fetched_update(event))
+            return
+        value = parse(element, self._lazy_decoding)
+        setattr(self, '_' + event, value)
+        self._cache.updated(event)
+        self._run_listeners(
+            getattr(self, '_%s_updated_listeners' % event), value)
+
+    async def _on_fetched_update(self, event):
+        await getattr(self, 'refresh_' + event)()
+        self._run_listeners(getattr(self, '_%s_updated_listeners' % event),
+                            getattr(self, '_' + event))
+
+    def _defer(self, key, coroutine_function):
+        """Schedule a follow-up fetch, once for all frames of the same key.
+
+        Frames received while the fetch is running schedule one more fetch.
+        """
+        task = self._deferred.get(key)
+        if task is not None and not task.done():
+            self._deferred_again.add(key)
+            return
+        self._deferred[key] = asyncio.ensure_future(
+            self._run_deferred(key, coroutine_function))
+
+    async def _run_deferred(self, key, coroutine_function):
+        while True:
+            try:
+                await coroutine_function()
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Deferred %s fetch failed", key)
+            if key not in self._deferred_again:
+                return
+            self._deferred_again.discard(key)
+
+    async def _on_zone_updated(self):
+        await self.refresh_zone_status()
+        self._run_listeners(self._zone_status_updated_listeners,
+                            self._zone_status)
+
+    async def _on_info_updated(self):
+        await self.refresh_config()
+        self._run_listeners(self._device_info_updated_listeners,
+                            self._config)
+
+    async def _resync(self):
+        """Fetch the states again after a reconnection.
+
+        Listeners are called with the states changed while disconnected.
+        """
+        refreshes = {
+            'status': self.refresh_status,
+            'volume': self.refresh_volume,
+            'presets': self.refresh_presets,
+            'zone_status': self.refresh_zone_status,
+            'sources': self.refresh_sources,
+            'bass': self.refresh_bass,
+            'group': self.refresh_group,
+        }
+        for event in self._resync_events():
+            if event not in refreshes:
+                # Only known by notifications
+                continue
+            previous = getattr(self, '_' + event)
+            try:
+                await refreshes[event]()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                _LOGGER.warning("Resync of %s failed on %s: %s", event,
+                                self._host, error)
+                continue
+            value = getattr(self, '_' + event)
+            if value != previous:
+                self._run_listeners(
+                    getattr(self, '_%s_updated_listeners' % event), value)
+        self._connection.resynced()
+        self._run_listeners(self._connection_listeners,
+                            ConnectionEvent.RESYNCED)
+
+    async def _handle_frame(self, message):
+        """Handle a notification, a bad frame or listener is only logged."""
+        try:
+            await self._on_message(message)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Error handling notification of %s",
+                              self._host)
+
+    async def _read_websocket(self):
+        url = "ws://{0}:{1}/".format(self._host, self._ws_port)
+        async with self._get_session().ws_connect(
+                url, protocols=('gabbo',),
+                heartbeat=self._ping_interval or None) as web_socket:
+            reconnected = self._connection.opened()
+            self._run_listeners(self._connection_listeners,
+                                ConnectionEvent.CONNECTED)
+            if reconnected:
+                self._defer('resync', self._resync)
+            try:
+                async for message in web_socket:
+                    if message.type == aiohttp.WSMsgType.TEXT:
+                        await self._handle_frame(message.data)
+                    elif message.type == aiohttp.WSMsgType.ERROR:
+                        _LOGGER.warning("Websocket error on %s: %s",
+                                        self._host, web_socket.exception())
+                        self._connection.failed(web_socket.exception())
+                        break
+            finally:
+                if self._connection.closed():
+                    self._run_listeners(self._connection_listeners,
+                                        ConnectionEvent.DISCONNECTED)
+
+    async def _read_notifications(self):
+        while True:
+            try:
+                await self._read_websocket()
+            except (aiohttp.ClientError, OSError) as error:
+                _LOGGER.warning("Websocket error on %s: %s", self._host,
+                                error)
+                self._connection.failed(error)
+            if not self._reconnect:
+                return
+            await asyncio.sleep(self._connection.next_delay())
+
+    def start_notification(self):
+        """Start Websocket connection in a task of the running loop.
+
+        The websocket is opened again after a disconnection if reconnect is
+        enabled.
+        """
+        if self._ws_task is None or self._ws_task.done():
+            self._ws_task = asyncio.ensure_future(self._read_notifications())
+        return self._ws_task
+
+    def stop_notification(self):
+        """Stop Websocket connection."""
+        if self._ws_task is not None:
+            self._ws_task.cancel()
+            self._ws_task = None
+
+    async def refresh_config(self):
+        """Refresh device configuration."""
+        self._config = Config(_parse_xml(await self._get("/info")))
+
+    async def _fetch(self, endpoint, action, parse):
+        """Fetch endpoint state and store it as attribute _<endpoint>.
+
+        The state is kept if the payload didn't change since last fetch.
+        """
+        content = await self._get(action)
+        payload_fingerprint = fingerprint(content)
+        if not self._cache.unchanged(endpoint, payload_fingerprint):
+            setattr(self, '_' + endpoint, parse(_parse_xml(content)))
+        self._cache.updated(endpoint, payload_fingerprint=payload_fingerprint)
+
+    async def refresh_status(self):
+        """Refresh status state."""
+        await self._fetch('status', "/now_playing",
+                          lambda root: Status(root, self._lazy_decoding))
+
+    async def refresh_volume(self):
+        """Refresh volume state."""
+        await self._fetch('volume', "/volume", Volume)
+
+    async def refresh_presets(self):
+        """Refresh presets."""
+        await self._fetch('presets', "/presets",
+                          lambda root: _parse_presets(root,
+                                                      self._lazy_decoding))
+
+    async def refresh_zone_status(self):
+        """Refresh Zone Status."""
+        await self._fetch('zone_status', "/getZone", _parse_zone_status)
+
+    async def refresh_sources(self):
+        """Refresh sources."""
+        await self._fetch('sources', "/sources", _parse_sources)
+
+    async def refresh_bass(self):
+        """Refresh bass."""
+        await self._fetch('bass', "/bass", Bass)
+
+    async def refresh_group(self):
+        """Refresh group (SoundTouch 10 only)."""
+        await self._fetch('group', "/getGroup", _parse_group)
+
+    @property
+    def host(self):
+        """Host of the device."""
+        return self._host
+
+    @property
+    def port(self):
+        """Return API port of the device."""
+        return self._port
+
+    @property
+    def dlna_port(self):
+        """Return DLNA port."""
+        return self._dlna_port
+
+    @property
+    def ws_port(self):
+        """Return Web Socket port."""
+        return self._ws_port
+
+    @property
+    def cache_stats(self):
+        """Return state cache hits and misses by endpoint."""
+        return self._cache.stats
+
+    @property
+    def skipped_parses(self):
+        """Return number of unchanged payloads not parsed by endpoint."""
+        return self._cache.skipped_parses
+
+    @property
+    def config(self):
+        """Get config object.
+
+        None until the configuration is fetched, and from an infoUpdated
+        notification until it is fetched again.
+        """
+        return self._config
+
+    async def status(self, refresh=True, max_age=None):
+        """Get status object.
+
+        :param refresh: Force refresh, else return old data.
+        :param max_age: Accept data up to max_age seconds old when
+            refreshing. Default to the device cache TTL
+        """
+        if not self._cache.lookup('status', self._status is not None,
+                                  refresh, max_age):
+            await self.refresh_status()
+        return self._status
+
+    async def volume(self, refresh=True, max_age=None):
+        """Get volume object.
+
+        :param refresh: Force refresh, else return old data.
+        :param max_age: Accept data up to max_age seconds old when
+            refreshing. Default to the device cache TTL
+        """
+        if not self._cache.lookup('volume', self._volume is not None,
+                                  refresh, max_age):
+            await self.refresh_volume()
+        return self._volume
+
+    async def zone_status(self, refresh=True, max_age=None):
+        """Get Zone Status.
+
+        :param refresh: Force refresh, else return old data.
+        :param max_age: Accept data up to max_age seconds old when
+            refreshing. Default to the device cache TTL
+        """
+        if not self._cache.lookup('zone_status', self._zone_status is not None,
+                                  refresh, max_age):
+            await self.refresh_zone_status()
+        return self._zone_status
+
+    async def presets(self, refresh=True, max_age=None):
+        """Presets.
+
+        :param refresh: Force refresh, else return old data.
+        :param max_age: Accept data up to max_age seconds old when
+            refreshing. Default to the device cache TTL
+        """
+        if not self._cache.lookup('presets', self._presets is not None,
+                                  refresh, max_age):
+            await self.refresh_presets()
+        return self._presets
+
+    async def sources(self, refresh=True, max_age=None):
+        """Get available sources.
+
+        :param refresh: Force refresh, else return old data.
+        :param max_age: Accept data up to max_age seconds old when
+            refreshing. Default to the device cache TTL
+        """
+        if not self._cache.lookup('sources', self._sources is not None,
+                                  refresh, max_age):
+            await self.refresh_sources()
+        return self._sources
+
+    async def bass(self, refresh=True, max_age=None):
+        """Get bass object.
+
+        :param refresh: Force refresh, else return old data.
+        :param max_age: Accept data up to max_age seconds old when
+            refreshing. Default to the device cache TTL
+        """
+        if not self._cache.lookup('bass', self._bass is not None, refresh,
+                                  max_age):
+            await self.refresh_bass()
+        return self._bass
+
+    async def group(self, refresh=True, max_age=None):
+        """Get SoundTouch 10 group. None without group.
+
+        :param refresh: Force refresh, else return old data.
+        :param max_age: Accept data up to max_age seconds old when
+            refreshing. Default to the device cache TTL
+        """
+        if not self._cache.lookup('group', self._group is not None, refresh,
+                                  max_age):
+            await self.refresh_group()
+        return self._group
+
+    def now_selection(self):
+        """Return the selected preset pushed by notification. None if unknown.
+
+        Only known while notifications are started.
+        """
+        return self._now_selection
+
+    def recents(self):
+        """Return recently played contents pushed by notification.
+
+        None if unknown. Only known while notifications are started.
+        """
+        return self._recents
+
+    def connection_state(self):
+        """Return network connection state pushed by notification.
+
+        None if unknown. Only known while notifications are started.
+        """
+        return self._connection_state
+
+    async def select_preset(self, preset):
+        """Play selected preset.
+
+        :param preset Selected preset.
+        """
+        await self._post('/select', preset.source_xml.encode('utf-8'))
+
+    async def select_content_item(self, source, source_account=None,
+                                  location=None, media_type=None):
+        """Select specified content.
+
+        :param source The source
+        :param source_account The source account
+        :param location The location
+        :param media_type The media type
+        """
+        await self._post('/select', _content_item_body(
+            source, source_account, location, media_type))
+
+    async def select_source_aux(self):
+        """Select AUX source."""
+        await self.select_content_item(Source.AUX, Source.AUX.value)
+
+    async def select_source_bluetooth(self):
+        """Select BLUETOOTH source."""
+        await self.select_content_item(Source.BLUETOOTH)
+
+    async def create_zone(self, slaves):
+        """Create a zone (multi-room) on a master and play on specified slaves.
+
+        :param slaves: List of slaves. Can not be empty
+        """
+        request_body = _zone_body(self, slaves, with_sender=True)
+        _LOGGER.info("Creating multi-room zone with master device %s",
+                     self.config.name)
+        await self._post("/setZone", request_body)
+
+    async def add_zone_slave(self, slaves):
+        """Add slave(s) to and existing zone (multi-room).
+
+        :param slaves: List of slaves. Can not be empty
+        """
+        if await self.zone_status() is None:
+            raise NoExistingZoneException()
+        request_body = _zone_body(self, slaves)
+        _LOGGER.info("Adding slaves to multi-room zone with master device %s",
+                     self.config.name)
+        await self._post("/addZoneSlave", request_body)
+
+    async def remove_zone_slave(self, slaves):
+        """Remove slave(s) from and existing zone (multi-room).
+
+        :param slaves: List of slaves to remove
+        """
+        if await self.zone_status() is None:
+            raise NoExistingZoneException()
+        request_body = _zone_body(self, slaves)
+        _LOGGER.info("Removing slaves from multi-room zone with master " +
+                     "device %s", self.config.name)
+        await self._post("/removeZoneSlave", request_body)
+
+    async def _send_key(self, key):
+        press, release = _key_bodies(key)
+        await self._post('/key', press)
+        await self._post('/key', release)
+
+    async def play_media(self, source, location, source_acc=None,
+                         media_type=Type.URI):
+        """Start music playback from a chosen source.
+
+        See SoundTouchDevice.play_media.
+        """
+        await self._post("/select", _play_media_body(source, location,
+                                                     source_acc, media_type))
+
+    async def play_url(self, url):
+        """Start music playback from an HTTP URL.
+
+        Warning: HTTPS is not supported.
+
+        :param url: HTTP URL to play.
+        """
+        dlna_url, body, headers = _play_url_request(self.host, self.dlna_port,
+                                                    url)
+        await self._request('POST', dlna_url, data=body, headers=headers)
+
+    async def set_volume(self, level):
+        """Set volume level: from 0 to 100."""
+        await self._post('/volume', '<volume>%s</volume>' % level)
+
+    async def mute(self):
+        """Mute/Un-mute volume."""
+        await self._send_key(Key.MUTE.value)
+
+    async def volume_up(self):
+        """Volume up."""
+        await self._send_key(Key.VOLUME_UP.value)
+
+    async def volume_down(self):
+        """Volume down."""
+        await self._send_key(Key.VOLUME_DOWN.value)
+
+    async def next_track(self):
+        """Switch to next track."""
+        await self._send_key(Key.NEXT_TRACK.value)
+
+    async def previous_track(self):
+        """Switch to previous track."""
+        await self._send_key(Key.PREV_TRACK.value)
+
+    async def pause(self):
+        """Pause."""
+        await self._send_key(Key.PAUSE.value)
+
+    async def play(self):
+        """Play."""
+        await self._send_key(Key.PLAY.value)
+
+    async def play_pause(self):
+        """Toggle play status."""
+        await self._send_key(Key.PLAY_PAUSE.value)
+
+    async def repeat_off(self):
+        """Turn off repeat."""
+        await self._send_key(Key.REPEAT_OFF.value)
+
+    async def repeat_one(self):
+        """Repeat one. Doesn't work."""
+        await self._send_key(Key.REPEAT_ONE.value)
+
+    async def repeat_all(self):
+        """Repeat all."""
+        await self._send_key(Key.REPEAT_ALL.value)
+
+    async def shuffle(self, shuffle):
+        """Shuffle on/off.
+
+        :param shuffle: Boolean on/off
+        """
+        if shuffle:
+            await self._send_key(Key.SHUFFLE_ON.value)
+        else:
+            await self._send_key(Key.SHUFFLE_OFF.value)
+
+    async def power_on(self):
+        """Power on device."""
+        if (await self.status()).source == STATE_STANDBY:
+            await self._send_key(Key.POWER.value)
+
+    async def power_off(self):
+        """Power off device."""
+        if (await self.status()).source != STATE_STANDBY:
+            await self._send_key(Key.POWER.value)
+
+    async def snapshot(self):
+        """Snapshot current playing media."""
+        status = await self.status(refresh=True)
+        if status and status.content_item:
+            self._snapshot = status.content_item
+
+    async def restore(self):
+        """Restore last snapshot."""
+        if self._snapshot:
+            await self.select_content_item(Source[self._snapshot.source],
+                                           self._snapshot.source_account,
+                                           self._snapshot.location,
+                                           self._snapshot.type)
@@ -0,0 +1,277 @@
+"""State cache of Bose Soundtouch devices."""
+
+import hashlib
+import logging
+from threading import Event, Lock
+
+try:
+    from time import monotonic
+except ImportError:  # Python 2.7
+    from time import time as monotonic
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def fingerprint(content):
+    """Return fingerprint of a raw payload (bytes)."""
+    return hashlib.sha1(content).digest()
+
+
+class StateCache(object):
+    """Freshness of the states (status, volume, ...) fetched from a device.
+
+    States are stored by the device, the cache records when each endpoint
+    was last updated and counts hits and misses.
+
+    In coherent mode, states obtained while the websocket is connected are
+    kept up to date by notifications: they are used whatever their age until
+    the websocket is disconnected.
+
+    The fingerprint of the last fetched payload of each endpoint is kept to
+    skip parsing of unchanged payloads.
+    """
+
+    def __init__(self, ttl=0, coherent=False):
+        """Create a new state cache.
+
+        :param ttl: Default max age in seconds of the cached states. Default 0
+            (always refresh)
+        :param coherent: Enable coherent mode. Default False
+        """
+        self._ttl = ttl
+        self._coherent_mode = coherent
+        self._timestamps = {}
+        self._coherent = set()
+        self._generation = 0
+        self._connected = False
+        self._hits = {}
+        self._misses = {}
+        self._fingerprints = {}
+        self._skipped = {}
+        self._lock = Lock()
+
+    @property
+    def ttl(self):
+        """Return default max age in seconds of the cached states."""
+        return self._ttl
+
+    @property
+    def interested(self):
+        """Return True if stored states may be used without refresh.
+
+        With a TTL or in coherent mode, states pushed by notifications are
+        worth parsing even without listener.
+        """
+        return self._ttl > 0 or self._coherent_mode
+
+    def connected(self):
+        """Record the websocket is connected."""
+        with self._lock:
+            self._generation += 1
+            self._connected = True
+            self._coherent.clear()
+
+    def disconnected(self):
+        """Record the websocket is disconnected: states are not coherent."""
+        with self._lock:
+            self._connected = False
+            self._coherent.clear()
+
+    def token(self):
+        """Return a token to get before fetching a state.
+
+        A state is coherent if the websocket stayed connected since the
+        token was taken.
+        """
+        with self._lock:
+            return self._generation if self._connected else None
+
+    def updated(self, endpoint, token=None, payload_fingerprint=None):
+        """Record endpoint state has just been updated.
+
+        :param endpoint: Endpoint name
+        :param token: Token taken before fetching (or receiving) the state
+        :param payload_fingerprint: Fingerprint of the fetched payload. None
+            if the state was not parsed from a fetched payload
+        """
+        with self._lock:
+            self._timestamps[endpoint] = monotonic()
+            self._fingerprints[endpoint] = payload_fingerprint
+            if self._coherent_mode and self._connected and \
+                    token == self._generation:
+                self._coherent.add(endpoint)
+            else:
+                self._coherent.discard(endpoint)
+
+    def invalidate(self, endpoint=None):
+        """Invalidate endpoint state or all states if endpoint is not set."""
+        with self._lock:
+            if endpoint is None:
+                self._timestamps.clear()
+                self._coherent.clear()
+                self._fingerprints.clear()
+            else:
+                self._timestamps.pop(endpoint, None)
+                self._coherent.discard(endpoint)
+                self._fingerprints.pop(endpoint, None)
+
+    def unchanged(self, endpoint, payload_fingerprint):
+        """Return True if the state was parsed from the same payload.
+
+        The parse of the payload can be skipped: skipped parses are counted.
+
+        :param endpoint: Endpoint name
+        :param payload_fingerprint: Fingerprint of the fetched payload
+        """
+        with self._lock:
+            if self._fingerprints.get(endpoint) != payload_fingerprint:
+                return False
+            self._skipped[endpoint] = self._skipped.get(endpoint, 0) + 1
+            return True
+
+    def is_coherent(self, endpoint):
+        """Return True if endpoint state is kept up to date by websocket."""
+        with self._lock:
+            return endpoint in self._coherent
+
+    def age(self, endpoint):
+        """Return age in seconds of the endpoint state. None if unknown."""
+        with self._lock:
+            timestamp = self._timestamps.get(endpoint)
+        return None if timestamp is None else monotonic() - timestamp
+
+    def lookup(self, endpoint, cached, refresh=True, max_age=None):
+        """Return True if the cached state of endpoint can be used.
+
+        :param endpoint: Endpoint name
+        :param cached: True if a state of the endpoint is stored
+        :param refresh: False to accept any stored state whatever its age
+        :param max_age: Max age in seconds of the state. Default to ttl, or
+            any age if the state is coherent
+        """
+        with self._lock:
+            timestamp = self._timestamps.get(endpoint)
+            usable = cached or timestamp is not None
+            if usable and refresh and not (max_age is None and
+                                           endpoint in self._coherent):
+                if max_age is None:
+                    max_age = self._ttl
+                usable = timestamp is not None and \
+                    monotonic() - timestamp < max_age
+            counters = self._hits if usable else self._misses
+            counters[endpoint] = counters.get(endpoint, 0) + 1
+        return usable
+
+    @property
+    def stats(self):
+        """Return hits and misses by endpoint."""
+        with self._lock:
+            return dict(
+                (endpoint, {'hits': self._hits.get(endpoint, 0),
+                            'misses': self._misses.get(endpoint, 0)})
+                for endpoint in set(self._hits) | set(self._misses))
+
+    @property
+    def skipped_parses(self):
+        """Return number of parses skipped by endpoint."""
+        with self._lock:
+            return dict(self._skipped)
+
+
+class _Call(object):
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Run a function once for all concurrent callers of the same key.
+
+    Callers arriving while the function is running wait for it and share its
+    result (or its exception) instead of running it again.
+    """
+
+    def __init__(self):
+        """Create a new single flight group."""
+        self._lock = Lock()
+        self._calls = {}
+
+    def do(self, key, function, *args, **kwargs):
+        """Run function or wait for the running call of the same key.
+
+        :param key: Call key (endpoint name)
+        :param function: Function to run
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error  # pylint: disable=raising-bad-type
+            return call.result
+        try:
+            call.result = function(*args, **kwargs)
+            return call.result
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+_PENDING = 'pending'
+_RUNNING = 'running'
+_RERUN = 'rerun'
+
+
+class DeferredCalls(object):
+    """Run functions in an executor, once for all requests of the same key.
+
+    Requests made before the call starts are merged into it. Requests made
+    while it is running are merged into a single new call, run once it ends.
+    """
+
+    def __init__(self, submit):
+        """Create a new deferred calls group.
+
+        :param submit: Function submitting a function to an executor
+        """
+        self._submit = submit
+        self._lock = Lock()
+        self._states = {}
+
+    def request(self, key, function):
+        """Request a call of function.
+
+        :param key: Call key
+        :param function: Function to call without argument
+        """
+        with self._lock:
+            state = self._states.get(key)
+            if state == _RUNNING:
+                self._states[key] = _RERUN
+            if state is not None:
+                return
+            self._states[key] = _PENDING
+        self._submit(self._run, key, function)
+
+    def _run(self, key, function):
+        with self._lock:
+            self._states[key] = _RUNNING
+        try:
+            function()
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Deferred %s call failed", key)
+        finally:
+            with self._lock:
+                rerun = self._states.pop(key) == _RERUN
+            if rerun:
+                self.request(key, function)
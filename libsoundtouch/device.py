@@ -3,170 +3,406 @@
 # pylint: disable=too-many-public-methods,too-many-instance-attributes,
 # pylint: disable=useless-super-delegation,too-many-lines
 
+import copy
 import logging
 import os
 import re
 import xml.etree.cElementTree as ET
-from xml.dom import minidom
-from threading import Thread
+from threading import Event, Lock, Thread
 
-import requests
 import websocket
 
 from libsoundtouch.utils import Source
-from .utils import Key, Type
+from .cache import DeferredCalls, SingleFlight, StateCache, fingerprint
+from .dispatch import DEFAULT_MAX_QUEUE_SIZE, Throttle
+from .events import EventStream
+from .reconnect import Connection, DEFAULT_PING_INTERVAL, \
+    DEFAULT_PING_TIMEOUT
+from .transport import Transport, DEFAULT_TIMEOUT, DEFAULT_POOL_SIZE
+from .utils import ConnectionEvent, DispatchPolicy, Key, Type
 
 STATE_STANDBY = 'STANDBY'
 
 _LOGGER = logging.getLogger(__name__)
 
 
-def _get_dom_attribute(xml_dom, attribute, default_value=None):
-    if attribute in xml_dom.attributes.keys():
-        return xml_dom.attributes[attribute].value
+_UPDATE_TYPE = re.compile(r'<updates\b[^>]*>\s*<([\w:]+)')
+
+_UPDATE_EVENTS = {
+    'volumeUpdated': 'volume',
+    'nowPlayingUpdated': 'status',
+    'presetsUpdated': 'presets',
+    'zoneUpdated': 'zone_status',
+    'infoUpdated': 'device_info',
+    'nowSelectionUpdated': 'now_selection',
+    'recentsUpdated': 'recents',
+    'sourcesUpdated': 'sources',
+    'bassUpdated': 'bass',
+    'connectionStateUpdated': 'connection_state',
+    'groupUpdated': 'group',
+}
+
+
+# Notifications of a state stored by the device
+_STATE_EVENTS = ('volume', 'status', 'presets', 'zone_status',
+                 'now_selection', 'recents', 'sources', 'bass',
+                 'connection_state', 'group')
+
+# States with an HTTP endpoint, fetched again when notified without value
+_FETCHED_EVENTS = ('sources', 'bass', 'group')
+
+
+def _update_type(message):
+    """Return update type (first child tag) of a notification, unparsed."""
+    match = _UPDATE_TYPE.search(message)
+    return match.group(1) if match else None
+
+
+def _parse_xml(content):
+    """Parse an XML payload (bytes) and return its root element."""
+    return ET.fromstring(content)
+
+
+def _child_elements(xml_element):
+    """Return the first child element of each tag in one pass."""
+    children = {}
+    for child in xml_element:
+        children.setdefault(child.tag, child)
+    return children
+
+
+def _get_element_value(xml_element, default_value=None):
+    if xml_element is not None and xml_element.text is not None:
+        return xml_element.text.strip()
     return default_value
 
 
-def _get_dom_element_attribute(xml_dom, element, attribute,
-                               default_value=None):
-    element = _get_dom_element(xml_dom, element)
-    if element is not None:
-        if attribute in element.attributes.keys():
-            return element.attributes[attribute].value
-        return None
+def _get_element_attribute(xml_element, attribute, default_value=None):
+    if xml_element is not None:
+        return xml_element.get(attribute)
+    return default_value
+
+
+def _key_bodies(key):
+    """Return press and release bodies of a key."""
+    return ('<key state="press" sender="Gabbo">%s</key>' % key,
+            '<key state="release" sender="Gabbo">%s</key>' % key)
+
+
+def _content_item_body(source, source_account=None, location=None,
+                       media_type=None):
+    attributes = {"source": source.value}
+    if source_account:
+        attributes["sourceAccount"] = source_account
+    if location:
+        attributes["location"] = location
+    if media_type:
+        attributes["type"] = media_type
+    root = ET.Element("ContentItem", attributes)
+    return ET.tostring(root).decode("UTF-8")
+
+
+def _play_media_body(source, location, source_acc=None, media_type=Type.URI):
+    return '<ContentItem source="%s" type="%s" sourceAccount="%s" ' \
+           'location="%s"><itemName>Select using API</itemName>' \
+           '</ContentItem>' % (source.value, media_type.value,
+                               source_acc if source_acc else '', location)
+
+
+def _zone_body(master, slaves, with_sender=False):
+    if len(slaves) <= 0:
+        raise NoSlavesException()
+    if with_sender:
+        request_body = '<zone master="%s" senderIPAddress="%s">' % (
+            master.config.device_id, master.config.device_ip)
     else:
-        return default_value
+        request_body = '<zone master="%s">' % master.config.device_id
+    for slave in slaves:
+        request_body += '<member ipaddress="%s">%s</member>' % (
+            slave.config.device_ip, slave.config.device_id)
+    request_body += '</zone>'
+    return request_body
+
+
+def _play_url_request(host, dlna_port, url):
+    """Return URL, body and headers of a DLNA play request."""
+    if not re.match(r'http://', url):
+        raise SoundtouchInvalidUrlException
+
+    action = "urn:schemas-upnp-org:service:AVTransport:1#SetAVTransportURI"
+    headers = {
+        "User-Agent": "libsoundtouch",
+        "Accept": "*/*",
+        "Content-Type": "text/xml; charset=\"utf-8\"",
+        "HOST": "{0}:{1}".format(host, dlna_port),
+        "SOAPACTION": action
+    }
+    template_file = os.path.join(os.path.dirname(__file__),
+                                 'templates/avt_transport_uri.xml')
+    with open(template_file, 'r') as template:
+        body = template.read().format(url)
+    return ("http://{0}:{1}/AVTransport/Control".format(host, dlna_port),
+            body, headers)
+
+
+def _parse_presets(presets_element, lazy=False):
+    return [Preset(preset, lazy) for preset in presets_element
+            if preset.tag == "preset"]
+
+
+def _parse_zone_status(zone_element):
+    if zone_element.find("member") is not None:
+        return ZoneStatus(zone_element)
+    return None
+
 
+def _parse_sources(sources_element):
+    return [SourceItem(item) for item in sources_element
+            if item.tag == "sourceItem"]
 
-def _get_dom_elements(xml_dom, element):
-    return xml_dom.getElementsByTagName(element)
 
+def _parse_recents(recents_element):
+    return [Recent(recent) for recent in recents_element
+            if recent.tag == "recent"]
 
-def _get_dom_element(xml_dom, element):
-    elements = _get_dom_elements(xml_dom, element)
-    if elements:
-        return elements[0]
+
+def _parse_group(group_element):
+    if group_element.get("id") is not None:
+        return Group(group_element)
     return None
 
 
-def _get_dom_element_value(xml_dom, element, default_value=None):
-    element = _get_dom_element(xml_dom, element)
-    if element is not None and element.firstChild is not None:
-        return element.firstChild.nodeValue.strip()
-    return default_value
+# Update types carrying a state: event, tag of the state element (None for
+# the update element itself) and parser taking the element and lazy flag
+_PUSHED_UPDATES = {
+    'nowSelectionUpdated': ('now_selection', 'preset',
+                            lambda element, lazy: Preset(element, lazy)),
+    'recentsUpdated': ('recents', 'recents',
+                       lambda element, lazy: _parse_recents(element)),
+    'sourcesUpdated': ('sources', 'sources',
+                       lambda element, lazy: _parse_sources(element)),
+    'bassUpdated': ('bass', 'bass', lambda element, lazy: Bass(element)),
+    'connectionStateUpdated': ('connection_state', None,
+                               lambda element, lazy: NetworkConnection(
+                                   element)),
+    'groupUpdated': ('group', 'group',
+                     lambda element, lazy: _parse_group(element)),
+}
 
 
 class WebSocketThread(Thread):
-    """Websocket thread."""
+    """Websocket thread.
+
+    With a reconnection delay function, the websocket is opened again after
+    each disconnection (or failed connection) until stop() is called.
+    """
 
-    def __init__(self, ws):
-        """Create new Websocket thread."""
+    def __init__(self, ws, next_delay=None, **run_options):
+        """Create new Websocket thread.
+
+        :param ws: WebSocketApp
+        :param next_delay: Function returning the delay in seconds before
+            the next connection attempt. No reconnection if not set
+        :param run_options: Options of WebSocketApp.run_forever
+        """
         Thread.__init__(self)
         self._ws = ws
+        self._next_delay = next_delay
+        self._run_options = run_options
+        self._stopped = Event()
 
     def run(self):
         """Start Websocket thread."""
-        self._ws.run_forever()
+        while True:
+            self._ws.run_forever(**self._run_options)
+            if self._next_delay is None or self._stopped.is_set():
+                return
+            if self._stopped.wait(self._next_delay()):
+                return
+
+    def stop(self):
+        """Close the websocket and stop reconnecting."""
+        self._stopped.set()
+        self._ws.close()
+
+
+class _DeltaListener(object):
+    """Listener called only when some of its fields changed.
+
+    The listener is called with the new value and a dict of the changed
+    fields. Changes of a list are indexed by item: preset id for presets,
+    recent id for recents, (source, source account) for sources. A removed
+    item is None.
+    """
+
+    def __init__(self, listener, fields):
+        self._listener = listener
+        self._fields = tuple(fields)
+        self._previous = None
+
+    def _changes(self, previous, value):
+        changes = {}
+        for field in self._fields:
+            new_value = getattr(value, field, None)
+            if getattr(previous, field, None) != new_value:
+                changes[field] = new_value
+        return changes
 
+    @staticmethod
+    def _key(item):
+        """Return the key of a list item."""
+        if isinstance(item, Recent):
+            return item.recent_id
+        if isinstance(item, SourceItem):
+            return item.source, item.source_account
+        return item.preset_id
+
+    def _items_changes(self, previous, items):
+        previous = dict((self._key(item), item) for item in previous)
+        changes = {}
+        for item in items:
+            key = self._key(item)
+            item_changes = self._changes(previous.pop(key, None), item)
+            if item_changes:
+                changes[key] = item_changes
+        for key in previous:
+            changes[key] = None
+        return changes
+
+    def __call__(self, value):
+        previous, self._previous = self._previous, value
+        if isinstance(value, list) or isinstance(previous, list):
+            changes = self._items_changes(previous or [], value or [])
+        else:
+            changes = self._changes(previous, value)
+        if changes:
+            return self._listener(value, changes)
+        return None
 
-class SoundTouchDevice:
-    """Bose SoundTouch Device."""
+    def __eq__(self, other):
+        # pylint: disable=protected-access
+        if isinstance(other, _DeltaListener):
+            other = other._listener
+        return self._listener == other
 
-    @staticmethod
-    def __run_listener(listeners, value):
-        """Run Listener with value."""
-        for listener in listeners:
-            listener(value)
+    def __ne__(self, other):
+        return not self == other
 
-    def _on_message(self, web_socket, message):
-        # pylint: disable=unused-argument
-        """Call when web socket is received."""
-        dom = minidom.parseString(message.encode('utf-8'))
-        if dom.firstChild.nodeName == "updates":
-            action_node = dom.firstChild.firstChild
-            action = action_node.nodeName
-            if action == "volumeUpdated":
-                self._volume = Volume(action_node.firstChild)
-                self.__run_listener(self._volume_updated_listeners,
-                                    self._volume)
-            if action == "nowPlayingUpdated":
-                self._status = Status(action_node)
-                self.__run_listener(self._status_updated_listeners,
-                                    self._status)
-            if action == "presetsUpdated" and action_node.hasChildNodes():
-                self._presets = []
-                for preset in _get_dom_elements(dom, "preset"):
-                    self._presets.append(Preset(preset))
-                self.__run_listener(self._presets_updated_listeners,
-                                    self._presets)
-            if action == "zoneUpdated":
-                self.__run_listener(self._zone_status_updated_listeners,
-                                    self.zone_status(True))
-            if action == "infoUpdated":
-                self.__init_config()
-                self.__run_listener(self._device_info_updated_listeners,
-                                    self._config)
+    def __hash__(self):
+        return hash(self._listener)
 
-    def __init__(self, host, port=8090, ws_port=8080, dlna_port=8091):
-        """Create a new Soundtouch device.
 
-        :param host: Host of the device
-        :param port: Port of the device. Default 8090
-        :param ws_port: Web socket port. Default 8080
+def _listener(listener, fields):
+    return _DeltaListener(listener, fields) if fields else listener
 
-        """
-        self._host = host
-        self._port = port
-        self._ws_port = ws_port
-        self._dlna_port = dlna_port
-        self.__init_config()
-        self._status = None
-        self._volume = None
-        self._zone_status = None
-        self._presets = None
-        self._ws_client = None
+
+class _NotificationListeners(object):
+    """Websocket notification listeners of a device."""
+
+    def _init_listeners(self):
         self._volume_updated_listeners = []
         self._status_updated_listeners = []
         self._presets_updated_listeners = []
         self._zone_status_updated_listeners = []
         self._device_info_updated_listeners = []
-        self._snapshot = None
+        self._connection_listeners = []
+        self._now_selection_updated_listeners = []
+        self._recents_updated_listeners = []
+        self._sources_updated_listeners = []
+        self._bass_updated_listeners = []
+        self._connection_state_updated_listeners = []
+        self._group_updated_listeners = []
+        self._ignored = {}
+
+    def add_volume_listener(self, listener, fields=None):
+        """Add a new volume updated listener.
+
+        See add_status_listener for fields.
+        """
+        self._volume_updated_listeners.append(_listener(listener, fields))
 
-    def __init_config(self):
-        response = requests.get(
-            "http://" + self._host + ":" + str(self._port) + "/info")
-        response.encoding = 'UTF-8'
-        dom = minidom.parseString(response.text.encode('utf-8'))
-        self._config = Config(dom)
-
-    def start_notification(self):
-        """Start Websocket connection."""
-        self._ws_client = websocket.WebSocketApp(
-            "ws://{0}:{1}/".format(self._host, self._ws_port),
-            on_message=self._on_message,
-            subprotocols=['gabbo'])
-        ws_thread = WebSocketThread(self._ws_client)
-        ws_thread.start()
+    def add_status_listener(self, listener, fields=None):
+        """Add a new status updated listener.
+
+        :param listener: Function called with the new value
+        :param fields: Names of the fields the listener is interested in
+            (track, play_status...). If set, the listener is only called when
+            one of them changed, with the new value and a dict of the changed
+            fields. Presets changes are indexed by preset id
+        """
+        self._status_updated_listeners.append(_listener(listener, fields))
+
+    def add_presets_listener(self, listener, fields=None):
+        """Add a new presets updated listener.
+
+        See add_status_listener for fields.
+        """
+        self._presets_updated_listeners.append(_listener(listener, fields))
+
+    def add_zone_status_listener(self, listener, fields=None):
+        """Add a new zone status updated listener.
 
-    def add_volume_listener(self, listener):
-        """Add a new volume updated listener."""
-        self._volume_updated_listeners.append(listener)
+        See add_status_listener for fields.
+        """
+        self._zone_status_updated_listeners.append(_listener(listener, fields))
+
+    def add_device_info_listener(self, listener, fields=None):
+        """Add a new device info updated listener.
 
-    def add_status_listener(self, listener):
-        """Add a new status updated listener."""
-        self._status_updated_listeners.append(listener)
+        See add_status_listener for fields.
+        """
+        self._device_info_updated_listeners.append(_listener(listener, fields))
 
-    def add_presets_listener(self, listener):
-        """Add a new presets updated listener."""
-        self._presets_updated_listeners.append(listener)
+    def add_now_selection_listener(self, listener, fields=None):
+        """Add a new now selection updated listener.
 
-    def add_zone_status_listener(self, listener):
-        """Add a new zone status updated listener."""
-        self._zone_status_updated_listeners.append(listener)
+        See add_status_listener for fields.
+        """
+        self._now_selection_updated_listeners.append(
+            _listener(listener, fields))
+
+    def add_recents_listener(self, listener, fields=None):
+        """Add a new recents updated listener.
+
+        See add_status_listener for fields.
+        """
+        self._recents_updated_listeners.append(_listener(listener, fields))
 
-    def add_device_info_listener(self, listener):
-        """Add a new device info updated listener."""
-        self._device_info_updated_listeners.append(listener)
+    def add_sources_listener(self, listener, fields=None):
+        """Add a new sources updated listener.
+
+        See add_status_listener for fields.
+        """
+        self._sources_updated_listeners.append(_listener(listener, fields))
+
+    def add_bass_listener(self, listener, fields=None):
+        """Add a new bass updated listener.
+
+        See add_status_listener for fields.
+        """
+        self._bass_updated_listeners.append(_listener(listener, fields))
+
+    def add_connection_state_listener(self, listener, fields=None):
+        """Add a new network connection state updated listener.
+
+        See add_status_listener for fields.
+        """
+        self._connection_state_updated_listeners.append(
+            _listener(listener, fields))
+
+    def add_group_listener(self, listener, fields=None):
+        """Add a new group updated listener.
+
+        See add_status_listener for fields.
+        """
+        self._group_updated_listeners.append(_listener(listener, fields))
+
+    def add_connection_listener(self, listener):
+        """Add a new websocket connection listener.
+
+        :param listener: Function called with a ConnectionEvent
+        """
+        self._connection_listeners.append(listener)
 
     def remove_volume_listener(self, listener):
         """Remove a new volume updated listener."""
@@ -193,6 +429,41 @@ class SoundTouchDevice:
         if listener in self._device_info_updated_listeners:
             self._device_info_updated_listeners.remove(listener)
 
+    def remove_now_selection_listener(self, listener):
+        """Remove a now selection updated listener."""
+        if listener in self._now_selection_updated_listeners:
+            self._now_selection_updated_listeners.remove(listener)
+
+    def remove_recents_listener(self, listener):
+        """Remove a recents updated listener."""
+        if listener in self._recents_updated_listeners:
+            self._recents_updated_listeners.remove(listener)
+
+    def remove_sources_listener(self, listener):
+        """Remove a sources updated listener."""
+        if listener in self._sources_updated_listeners:
+            self._sources_updated_listeners.remove(listener)
+
+    def remove_bass_listener(self, listener):
+        """Remove a bass updated listener."""
+        if listener in self._bass_updated_listeners:
+            self._bass_updated_listeners.remove(listener)
+
+    def remove_connection_state_listener(self, listener):
+        """Remove a network connection state updated listener."""
+        if listener in self._connection_state_updated_listeners:
+            self._connection_state_updated_listeners.remove(listener)
+
+    def remove_group_listener(self, listener):
+        """Remove a group updated listener."""
+        if listener in self._group_updated_listeners:
+            self._group_updated_listeners.remove(listener)
+
+    def remove_connection_listener(self, listener):
+        """Remove a websocket connection listener."""
+        if listener in self._connection_listeners:
+            self._connection_listeners.remove(listener)
+
     def clear_volume_listeners(self):
         """Clear volume updated listeners."""
         del self._volume_updated_listeners[:]
@@ -213,6 +484,34 @@ class SoundTouchDevice:
         """Clear device info updated listener.."""
         del self._device_info_updated_listeners[:]
 
+    def clear_now_selection_listeners(self):
+        """Clear now selection updated listeners."""
+        del self._now_selection_updated_listeners[:]
+
+    def clear_recents_listeners(self):
+        """Clear recents updated listeners."""
+        del self._recents_updated_listeners[:]
+
+    def clear_sources_listeners(self):
+        """Clear sources updated listeners."""
+        del self._sources_updated_listeners[:]
+
+    def clear_bass_listeners(self):
+        """Clear bass updated listeners."""
+        del self._bass_updated_listeners[:]
+
+    def clear_connection_state_listeners(self):
+        """Clear network connection state updated listeners."""
+        del self._connection_state_updated_listeners[:]
+
+    def clear_group_listeners(self):
+        """Clear group updated listeners."""
+        del self._group_updated_listeners[:]
+
+    def clear_connection_listeners(self):
+        """Clear websocket connection listeners."""
+        del self._connection_listeners[:]
+
     @property
     def volume_updated_listeners(self):
         """Return Volume Updated listeners."""
@@ -238,49 +537,577 @@ class SoundTouchDevice:
         """Return Device Info Updated listeners."""
         return self._device_info_updated_listeners
 
+    @property
+    def now_selection_updated_listeners(self):
+        """Return Now selection updated listeners."""
+        return self._now_selection_updated_listeners
+
+    @property
+    def recents_updated_listeners(self):
+        """Return Recents updated listeners."""
+        return self._recents_updated_listeners
+
+    @property
+    def sources_updated_listeners(self):
+        """Return Sources updated listeners."""
+        return self._sources_updated_listeners
+
+    @property
+    def bass_updated_listeners(self):
+        """Return Bass updated listeners."""
+        return self._bass_updated_listeners
+
+    @property
+    def connection_state_updated_listeners(self):
+        """Return Network connection state updated listeners."""
+        return self._connection_state_updated_listeners
+
+    @property
+    def group_updated_listeners(self):
+        """Return Group updated listeners."""
+        return self._group_updated_listeners
+
+    @property
+    def connection_listeners(self):
+        """Return websocket connection listeners."""
+        return self._connection_listeners
+
+    def events(self, types=None, max_size=DEFAULT_MAX_QUEUE_SIZE,
+               policy=DispatchPolicy.COALESCE, timeout=None):
+        """Return an EventStream iterating over the notifications.
+
+        :param types: Event types to read (volume, status, presets,
+            zone_status, device_info, connection). All types if not set
+        :param max_size: Max pending events. Default 100
+        :param policy: DispatchPolicy of the buffer. Default COALESCE
+        :param timeout: Max idle time in seconds: iteration ends when no
+            event is received within the timeout. Wait forever if not set
+        """
+        return EventStream([self], types, max_size, policy, timeout)
+
+    def aevents(self, types=None, max_size=DEFAULT_MAX_QUEUE_SIZE,
+                policy=DispatchPolicy.COALESCE, timeout=None):
+        """Return an AsyncEventStream to read with async for.
+
+        Require Python 3.5+. See events for the parameters.
+        """
+        from .aevents import AsyncEventStream
+        return AsyncEventStream([self], types, max_size, policy, timeout)
+
+    def _interested(self, event):
+        """Return True if event notifications have to be parsed.
+
+        Always True unless notifications are filtered: then only if a
+        listener or the cache uses event states.
+        """
+        return not self._filter_notifications or \
+            bool(getattr(self, '_%s_updated_listeners' % event)) or \
+            self._cache.interested
+
+    def _ignore(self, event):
+        """Drop the state of an event not parsed: it is no longer valid."""
+        setattr(self, '_' + event, None)
+        self._cache.invalidate(event)
+        self._ignored[event] = self._ignored.get(event, 0) + 1
+
+    @property
+    def ignored_notifications(self):
+        """Return number of notifications not parsed by type.
+
+        With filter_notifications, notifications without listener are not
+        parsed when the state cache is disabled.
+        """
+        return dict(self._ignored)
+
+    @property
+    def connection_stats(self):
+        """Return websocket connection state and counters.
+
+        state, connects, disconnects, retries (reconnection attempts),
+        resyncs, downtime (seconds) and last_error.
+        """
+        return self._connection.stats
+
+    def _resync_events(self):
+        """Return states to fetch again after a reconnection.
+
+        Only states with a listener or a stored value are fetched.
+        """
+        return [event for event in _STATE_EVENTS
+                if getattr(self, '_%s_updated_listeners' % event) or
+                getattr(self, '_' + event) is not None]
+
+
+class SoundTouchDevice(_NotificationListeners):
+    """Bose SoundTouch Device."""
+
+    def __run_listener(self, event, listeners, value):
+        """Run Listener with value."""
+        if self._dispatcher is not None:
+            self._dispatcher.dispatch(self, event, listeners, value)
+            return
+        for listener in listeners:
+            listener(value)
+
+    def _on_message(self, web_socket, message):
+        # pylint: disable=unused-argument
+        """Call when web socket is received."""
+        event = _UPDATE_EVENTS.get(_update_type(message))
+        if event in _STATE_EVENTS and not self._interested(event):
+            self._ignore(event)
+        elif self._throttle is None:
+            self._handle_message(message)
+        else:
+            self._throttle.submit(event, message)
+
+    def _handle_message(self, message):
+        token = self._cache.token()
+        root = _parse_xml(message.encode('utf-8'))
+        if root.tag == "updates" and len(root):
+            action_node = root[0]
+            action = action_node.tag
+            if action == "volumeUpdated" and len(action_node):
+                self._volume = Volume(action_node[0])
+                self._cache.updated('volume', token)
+                self.__run_listener('volume', self._volume_updated_listeners,
+                                    self._volume)
+            if action == "nowPlayingUpdated" and len(action_node):
+                self._status = Status(action_node[0], self._lazy_decoding)
+                self._cache.updated('status', token)
+                self.__run_listener('status', self._status_updated_listeners,
+                                    self._status)
+            if action == "presetsUpdated" and len(action_node):
+                self._presets = _parse_presets(action_node[0],
+                                               self._lazy_decoding)
+                self._cache.updated('presets', token)
+                self.__run_listener('presets',
+                                    self._presets_updated_listeners,
+                                    self._presets)
+            # Cached zone and info are stale until the deferred fetch is done
+            if action == "zoneUpdated":
+                self._cache.invalidate('zone_status')
+                self._deferred.request('zone_status', self._on_zone_updated)
+            if action == "infoUpdated":
+                # Fetched again on access of config if needed before
+                self._config = None
+                self._deferred.request('device_info', self._on_info_updated)
+            if action in _PUSHED_UPDATES:
+                self._on_pushed_update(token, action_node,
+                                       *_PUSHED_UPDATES[action])
+
+    def _on_pushed_update(self, token, update_element, event, tag, parse):
+        """Store and notify the state carried by an update.
+
+        Updates without state (sourcesUpdated, bassUpdated...) are followed
+        by a deferred fetch of the state.
+        """
+        element = update_element if tag is None else update_element.find(tag)
+        if element is None:
+            if event in _FETCHED_EVENTS:
+                self._cache.invalidate(event)
+                self._deferred.request(
+                    event, lambda: self._on_fetched_update(event))
+            return
+        value = parse(element, self._lazy_decoding)
+        setattr(self, '_' + event, value)
+        self._cache.updated(event, token)
+        self.__run_listener(
+            event, getattr(self, '_%s_updated_listeners' % event), value)
+
+    def _on_fetched_update(self, event):
+        getattr(self, 'refresh_' + event)()
+        self.__run_listener(
+            event, getattr(self, '_%s_updated_listeners' % event),
+            getattr(self, '_' + event))
+
+    def _on_zone_updated(self):
+        self.refresh_zone_status()
+        self.__run_listener('zone_status',
+                            self._zone_status_updated_listeners,
+                            self._zone_status)
+
+    def _on_info_updated(self):
+        config = self.refresh_config()
+        self.__run_listener('device_info',
+                            self._device_info_updated_listeners, config)
+
+    def __init__(self, host, port=8090, ws_port=8080, dlna_port=8091,
+                 session=None, timeout=DEFAULT_TIMEOUT,
+                 pool_size=DEFAULT_POOL_SIZE, transport=None, lazy=False,
+                 prefetch=False, cache_ttl=0, notification_cache=False,
+                 lazy_decoding=False, dispatcher=None, coalesce_windows=None,
+                 reconnect=True, backoff=None,
+                 ping_interval=DEFAULT_PING_INTERVAL,
+                 ping_timeout=DEFAULT_PING_TIMEOUT,
+                 filter_notifications=False, config=None):
+        """Create a new Soundtouch device.
+
+        :param host: Host of the device
+        :param port: Port of the device. Default 8090
+        :param ws_port: Web socket port. Default 8080
+        :param dlna_port: DLNA port. Default 8091
+        :param session: requests Session used for all HTTP calls. A new
+            keep-alive session is created if not set
+        :param timeout: HTTP timeout in seconds (or (connect, read) tuple).
+            Default 10
+        :param pool_size: Connection pool size of the created session.
+            Ignored if session is set. Default 4
+        :param transport: Transport shared with other devices (see
+            FleetTransport). session, timeout and pool_size are ignored if
+            set
+        :param lazy: Don't fetch the configuration now but on first access
+            of config. Default False
+        :param prefetch: Fetch the configuration in the background using the
+            transport executor. config waits for it. Default False
+        :param cache_ttl: Max age in seconds of the states returned by
+            status(), volume(), presets() and zone_status(). Default 0
+            (always refresh)
+        :param notification_cache: While the websocket is connected, serve
+            states kept up to date by notifications without HTTP request
+            whatever the cache TTL (see start_notification). Default False
+        :param lazy_decoding: Decode status and presets fields on first
+            access instead of when received. Default False
+        :param dispatcher: ListenerDispatcher running the notification
+            listeners. Listeners run in the websocket thread if not set
+        :param coalesce_windows: Coalescing window in seconds by notification
+            type (volume, status, presets, zone_status, device_info). Within
+            a window only the latest notification is parsed and delivered
+        :param reconnect: Open the websocket again when it is disconnected
+            and fetch the states again once reconnected. Default True
+        :param backoff: Backoff of the reconnection attempts. Default
+            Backoff() (1 second doubling up to 60 seconds)
+        :param ping_interval: Websocket ping interval in seconds to detect
+            dead connections. 0 to disable. Default 30
+        :param ping_timeout: Max time in seconds to wait for a pong.
+            Default 10
+        :param filter_notifications: Don't parse volume, status, presets and
+            zone notifications without listener when the state cache is
+            disabled: their stored state is dropped. Default False
+        :param config: Known configuration (see DeviceCache): not fetched
+            whatever lazy and prefetch
+
+        """
+        self._host = host
+        self._port = port
+        self._ws_port = ws_port
+        self._dlna_port = dlna_port
+        self._own_transport = transport is None
+        self._transport = transport if transport is not None else Transport(
+            session, timeout, pool_size)
+        self._status = None
+        self._volume = None
+        self._zone_status = None
+        self._presets = None
+        self._now_selection = None
+        self._recents = None
+        self._sources = None
+        self._bass = None
+        self._connection_state = None
+        self._group = None
+        self._cache = StateCache(cache_ttl, notification_cache)
+        self._lazy_decoding = lazy_decoding
+        self._filter_notifications = filter_notifications
+        self._requests = SingleFlight()
+        self._deferred = DeferredCalls(self._transport.submit)
+        self._ws_client = None
+        self._ws_thread = None
+        self._ws_hub = None
+        self._reconnect = reconnect
+        self._ping_interval = ping_interval
+        self._ping_timeout = ping_timeout
+        self._connection = Connection(backoff)
+        self._dispatcher = dispatcher
+        self._throttle = Throttle(coalesce_windows, self._handle_message) \
+            if coalesce_windows else None
+        self._ws_connected = False
+        self._init_listeners()
+        self._snapshot = None
+        self._config = config
+        self._config_lock = Lock()
+        if config is None:
+            if prefetch:
+                self.prefetch_config()
+            elif not lazy:
+                self.__init_config()
+
+    def __init_config(self):
+        response = self._get("/info")
+        self._config = Config(_parse_xml(response.content))
+
+    def load_config(self):
+        """Fetch the configuration if not already fetched.
+
+        Wait for the pending fetch if the configuration is being prefetched.
+        """
+        with self._config_lock:
+            if self._config is None:
+                self.__init_config()
+        return self._config
+
+    def refresh_config(self):
+        """Fetch the configuration again and return it."""
+        with self._config_lock:
+            self.__init_config()
+        return self._config
+
+    def prefetch_config(self):
+        """Fetch the configuration in the background.
+
+        Return a future of the configuration.
+        """
+        return self._transport.submit(self.load_config)
+
+    def _url(self, action):
+        return "http://" + self._host + ":" + str(self._port) + action
+
+    def _get(self, action):
+        return self._transport.get(self._url(action))
+
+    def _post(self, action, data, **kwargs):
+        return self._transport.post(self._url(action), data, **kwargs)
+
+    def close(self):
+        """Close HTTP connections opened by the device.
+
+        An injected session or transport is left open: its owner is in charge
+        of it.
+        """
+        if self._own_transport:
+            self._transport.close()
+
+    def _on_open(self, web_socket):
+        # pylint: disable=unused-argument
+        """Call when web socket is connected."""
+        _LOGGER.debug("Websocket connected to %s", self._host)
+        self._ws_connected = True
+        self._cache.connected()
+        reconnected = self._connection.opened()
+        self.__run_listener('connection', self._connection_listeners,
+                            ConnectionEvent.CONNECTED)
+        if reconnected:
+            self._deferred.request('resync', self._resync)
+
+    def _on_close(self, web_socket, *args):
+        # pylint: disable=unused-argument
+        """Call when web socket is closed."""
+        _LOGGER.debug("Websocket disconnected from %s", self._host)
+        self._ws_connected = False
+        self._cache.disconnected()
+        if self._connection.closed():
+            self.__run_listener('connection', self._connection_listeners,
+                                ConnectionEvent.DISCONNECTED)
+
+    def _on_error(self, web_socket, error):
+        # pylint: disable=unused-argument
+        """Call on web socket error."""
+        _LOGGER.warning("Websocket error on %s: %s", self._host, error)
+        self._connection.failed(error)
+
+    def _on_connection_lost(self, hub):
+        """Call by the hub when the websocket is lost: reconnect later."""
+        if not self._reconnect or self._ws_hub is not hub:
+            return
+        hub.schedule_reconnect(self, self._connection.next_delay())
+
+    def _reconnect_hub(self, hub):
+        """Open the websocket again, run by the hub connection thread."""
+        if self._ws_hub is not hub or hub.closed:
+            return
+        try:
+            hub.add(self)
+        except Exception as error:  # pylint: disable=broad-except
+            self._on_error(None, error)
+            self._on_connection_lost(hub)
+
+    def _resync(self):
+        """Fetch the states again after a reconnection.
+
+        Listeners are called with the states changed while disconnected.
+        """
+        refreshes = {
+            'status': self.refresh_status,
+            'volume': self.refresh_volume,
+            'presets': self.refresh_presets,
+            'zone_status': self.refresh_zone_status,
+            'sources': self.refresh_sources,
+            'bass': self.refresh_bass,
+            'group': self.refresh_group,
+        }
+        for event in self._resync_events():
+            if event not in refreshes:
+                # Only known by notifications
+                continue
+            previous = getattr(self, '_' + event)
+            try:
+                refreshes[event]()
+            except Exception as error:  # pylint: disable=broad-except
+                _LOGGER.warning("Resync of %s failed on %s: %s", event,
+                                self._host, error)
+                continue
+            value = getattr(self, '_' + event)
+            if value != previous:
+                self.__run_listener(
+                    event, getattr(self, '_%s_updated_listeners' % event),
+                    value)
+        self._connection.resynced()
+        self.__run_listener('connection', self._connection_listeners,
+                            ConnectionEvent.RESYNCED)
+
+    @property
+    def notification_connected(self):
+        """Return True if the websocket is connected."""
+        return self._ws_connected
+
+    def start_notification(self, hub=None):
+        """Start Websocket connection.
+
+        :param hub: NotificationHub reading the websocket. A thread is
+            started for the websocket of this device if not set
+
+        The websocket is opened again after a disconnection if reconnect is
+        enabled (see __init__).
+        """
+        if hub is not None:
+            self._ws_hub = hub
+            hub.add(self)
+            return
+        self._ws_client = websocket.WebSocketApp(
+            "ws://{0}:{1}/".format(self._host, self._ws_port),
+            on_open=self._on_open,
+            on_message=self._on_message,
+            on_error=self._on_error,
+            on_close=self._on_close,
+            subprotocols=['gabbo'])
+        run_options = {}
+        if self._ping_interval:
+            run_options = {'ping_interval': self._ping_interval,
+                           'ping_timeout': self._ping_timeout}
+        self._ws_thread = WebSocketThread(
+            self._ws_client,
+            self._connection.next_delay if self._reconnect else None,
+            **run_options)
+        self._ws_thread.start()
+
+    def stop_notification(self):
+        """Stop Websocket connection."""
+        if self._throttle is not None:
+            self._throttle.cancel()
+        if self._ws_hub is not None:
+            self._ws_hub.remove(self)
+            self._ws_hub = None
+        if self._ws_thread is not None:
+            self._ws_thread.stop()
+            self._ws_thread = None
+            self._ws_client = None
+
+    def _update(self, host, port, config=None):
+        """Change the address (new DHCP lease) and the configuration.
+
+        A started websocket is opened again on a new address.
+        """
+        if config is not None:
+            self._config = config
+        if (host, port) == (self._host, self._port):
+            return
+        hub = self._ws_hub
+        notifying = hub is not None or self._ws_thread is not None
+        if notifying:
+            self.stop_notification()
+        self._host = host
+        self._port = port
+        if notifying:
+            self.start_notification(hub)
+
     def refresh_status(self):
-        """Refresh status state."""
-        response = requests.get(
-            "http://" + self._host + ":" + str(self._port) + "/now_playing")
-        response.encoding = 'UTF-8'
-        dom = minidom.parseString(response.text.encode('utf-8'))
-        self._status = Status(dom)
+        """Refresh status state.
+
+        Concurrent calls share the same request.
+        """
+        self._requests.do('status', self._fetch_status)
+
+    def _fetch(self, endpoint, action, parse):
+        """Fetch endpoint state and store it as attribute _<endpoint>.
+
+        The state is kept if the payload didn't change since last fetch.
+        """
+        token = self._cache.token()
+        content = self._get(action).content
+        payload_fingerprint = fingerprint(content)
+        if not self._cache.unchanged(endpoint, payload_fingerprint):
+            setattr(self, '_' + endpoint, parse(_parse_xml(content)))
+        self._cache.updated(endpoint, token, payload_fingerprint)
+
+    def _fetch_status(self):
+        self._fetch('status', "/now_playing",
+                    lambda root: Status(root, self._lazy_decoding))
 
     def refresh_volume(self):
-        """Refresh volume state."""
-        response = requests.get(
-            "http://" + self._host + ":" + str(self._port) + "/volume")
-        dom = minidom.parseString(response.text)
-        self._volume = Volume(dom)
+        """Refresh volume state.
+
+        Concurrent calls share the same request.
+        """
+        self._requests.do('volume', self._fetch_volume)
+
+    def _fetch_volume(self):
+        self._fetch('volume', "/volume", Volume)
 
     def refresh_presets(self):
-        """Refresh presets."""
-        response = requests.get(
-            "http://" + self._host + ":" + str(self._port) + "/presets")
-        response.encoding = 'UTF-8'
-        dom = minidom.parseString(response.text.encode('utf-8'))
-        self._presets = []
-        for preset in _get_dom_elements(dom, "preset"):
-            self._presets.append(Preset(preset))
+        """Refresh presets.
+
+        Concurrent calls share the same request.
+        """
+        self._requests.do('presets', self._fetch_presets)
+
+    def _fetch_presets(self):
+        self._fetch('presets', "/presets",
+                    lambda root: _parse_presets(root, self._lazy_decoding))
 
     def refresh_zone_status(self):
-        """Refresh Zone Status."""
-        response = requests.get(
-            "http://" + self._host + ":" + str(self._port) + "/getZone")
-        dom = minidom.parseString(response.text)
-        if _get_dom_elements(dom, "member"):
-            self._zone_status = ZoneStatus(dom)
-        else:
-            self._zone_status = None
+        """Refresh Zone Status.
+
+        Concurrent calls share the same request.
+        """
+        self._requests.do('zone_status', self._fetch_zone_status)
+
+    def _fetch_zone_status(self):
+        self._fetch('zone_status', "/getZone", _parse_zone_status)
+
+    def refresh_sources(self):
+        """Refresh sources.
+
+        Concurrent calls share the same request.
+        """
+        self._requests.do('sources', self._fetch_sources)
+
+    def _fetch_sources(self):
+        self._fetch('sources', "/sources", _parse_sources)
+
+    def refresh_bass(self):
+        """Refresh bass.
+
+        Concurrent calls share the same request.
+        """
+        self._requests.do('bass', self._fetch_bass)
+
+    def _fetch_bass(self):
+        self._fetch('bass', "/bass", Bass)
+
+    def refresh_group(self):
+        """Refresh group (SoundTouch 10 only).
+
+        Concurrent calls share the same request.
+        """
+        self._requests.do('group', self._fetch_group)
+
+    def _fetch_group(self):
+        self._fetch('group', "/getGroup", _parse_group)
 
     def select_preset(self, preset):
         """Play selected preset.
 
         :param preset Selected preset.
         """
-        requests.post(
-            'http://' + self._host + ":" + str(self._port) + '/select',
-            preset.source_xml.encode('utf-8'))
+        self._post('/select', preset.source_xml.encode('utf-8'))
 
     def select_content_item(self, source, source_account=None, location=None,
                             media_type=None):
@@ -291,19 +1118,9 @@ class SoundTouchDevice:
         :param location The location
         :param media_type The media type
         """
-        attributes = {"source": source.value}
-        if source_account:
-            attributes["sourceAccount"] = source_account
-        if location:
-            attributes["location"] = location
-        if media_type:
-            attributes["type"] = media_type
-        root = ET.Element("ContentItem", attributes)
-
-        content = ET.tostring(root).decode("UTF-8")
-        requests.post(
-            'http://' + self._host + ":" + str(self._port) + '/select',
-            content)
+        content = _content_item_body(source, source_account, location,
+                                     media_type)
+        self._post('/select', content)
 
     def select_source_aux(self):
         """Select AUX source."""
@@ -314,26 +1131,10 @@ class SoundTouchDevice:
         self.select_content_item(Source.BLUETOOTH)
 
     def _create_zone(self, slaves):
-        if len(slaves) <= 0:
-            raise NoSlavesException()
-        request_body = '<zone master="%s" senderIPAddress="%s">' % (
-            self.config.device_id, self.config.device_ip
-        )
-        for slave in slaves:
-            request_body += '<member ipaddress="%s">%s</member>' % (
-                slave.config.device_ip, slave.config.device_id)
-        request_body += '</zone>'
-        return request_body
+        return _zone_body(self, slaves, with_sender=True)
 
     def _get_zone_request_body(self, slaves):
-        if len(slaves) <= 0:
-            raise NoSlavesException()
-        request_body = '<zone master="%s">' % self.config.device_id
-        for slave in slaves:
-            request_body += '<member ipaddress="%s">%s</member>' % (
-                slave.config.device_ip, slave.config.device_id)
-        request_body += '</zone>'
-        return request_body
+        return _zone_body(self, slaves)
 
     def create_zone(self, slaves):
         """Create a zone (multi-room) on a master and play on specified slaves.
@@ -344,9 +1145,7 @@ class SoundTouchDevice:
         request_body = self._create_zone(slaves)
         _LOGGER.info("Creating multi-room zone with master device %s",
                      self.config.name)
-        requests.post("http://" + self.host + ":" + str(
-            self.port) + "/setZone",
-                      request_body)
+        self._post("/setZone", request_body)
 
     def add_zone_slave(self, slaves):
         """
@@ -361,10 +1160,7 @@ class SoundTouchDevice:
         request_body = self._get_zone_request_body(slaves)
         _LOGGER.info("Adding slaves to multi-room zone with master device %s",
                      self.config.name)
-        requests.post(
-            "http://" + self.host + ":" + str(
-                self.port) + "/addZoneSlave",
-            request_body)
+        self._post("/addZoneSlave", request_body)
 
     def remove_zone_slave(self, slaves):
         """
@@ -382,18 +1178,13 @@ class SoundTouchDevice:
         request_body = self._get_zone_request_body(slaves)
         _LOGGER.info("Removing slaves from multi-room zone with master " +
                      "device %s", self.config.name)
-        requests.post(
-            "http://" + self.host + ":" + str(
-                self.port) + "/removeZoneSlave", request_body)
+        self._post("/removeZoneSlave", request_body)
 
     def _send_key(self, key):
         action = '/key'
-        press = '<key state="press" sender="Gabbo">%s</key>' % key
-        release = '<key state="release" sender="Gabbo">%s</key>' % key
-        requests.post('http://' + self._host + ":" +
-                      str(self._port) + action, press)
-        requests.post('http://' + self._host + ":" +
-                      str(self._port) + action, release)
+        press, release = _key_bodies(key)
+        self._post(action, press)
+        self._post(action, release)
 
     def play_media(self, source, location, source_acc=None,
                    media_type=Type.URI):
@@ -412,13 +1203,8 @@ class SoundTouchDevice:
             device.status().content_item.type
         """
         action = "/select"
-        play = '<ContentItem source="%s" type="%s" sourceAccount="%s" ' \
-               'location="%s"><itemName>Select using API</itemName>' \
-               '</ContentItem>' % (
-                   source.value, media_type.value,
-                   source_acc if source_acc else '', location)
-        requests.post('http://' + self._host + ":" +
-                      str(self._port) + action, play)
+        play = _play_media_body(source, location, source_acc, media_type)
+        self._post(action, play)
 
     def play_url(self, url):
         """
@@ -428,25 +1214,9 @@ class SoundTouchDevice:
 
         :param url: HTTP URL to play.
         """
-        if not re.match(r'http://', url):
-            raise SoundtouchInvalidUrlException
-
-        action = "urn:schemas-upnp-org:service:AVTransport:1#SetAVTransportURI"
-        headers = {
-            "User-Agent": "libsoundtouch",
-            "Accept": "*/*",
-            "Content-Type": "text/xml; charset=\"utf-8\"",
-            "HOST": "{0}:{1}".format(self.host, self.dlna_port),
-            "SOAPACTION": action
-        }
-        template_file = os.path.join(os.path.dirname(__file__),
-                                     'templates/avt_transport_uri.xml')
-        with open(template_file, 'r') as template:
-            body = template.read().format(url)
-            requests.post(
-                "http://{0}:{1}/AVTransport/Control".format(self.host,
-                                                            self.dlna_port),
-                data=body, headers=headers)
+        dlna_url, body, headers = _play_url_request(self.host, self.dlna_port,
+                                                    url)
+        self._transport.post(dlna_url, data=body, headers=headers)
 
     @property
     def host(self):
@@ -468,53 +1238,147 @@ class SoundTouchDevice:
         """Return Web Socket port."""
         return self._ws_port
 
+    @property
+    def cache_stats(self):
+        """Return state cache hits and misses by endpoint."""
+        return self._cache.stats
+
+    @property
+    def skipped_parses(self):
+        """Return number of unchanged payloads not parsed by endpoint."""
+        return self._cache.skipped_parses
+
+    @property
+    def coalesced_notifications(self):
+        """Return number of notifications dropped for a newer one by type."""
+        return self._throttle.dropped if self._throttle is not None else {}
+
+    @property
+    def transport(self):
+        """Return HTTP transport."""
+        return self._transport
+
     @property
     def config(self):
-        """Get config object."""
+        """Get config object.
+
+        The configuration is fetched on first access of a lazy device.
+        """
+        if self._config is None:
+            return self.load_config()
         return self._config
 
-    def status(self, refresh=True):
+    def status(self, refresh=True, max_age=None):
         """Get status object.
 
         :param refresh: Force refresh, else return old data.
+        :param max_age: Accept data up to max_age seconds old when
+            refreshing. Default to the device cache TTL
         """
-        if self._status is None or refresh:
+        if not self._cache.lookup('status', self._status is not None, refresh,
+                                  max_age):
             self.refresh_status()
         return self._status
 
-    def volume(self, refresh=True):
+    def volume(self, refresh=True, max_age=None):
         """Get volume object.
 
         :param refresh: Force refresh, else return old data.
+        :param max_age: Accept data up to max_age seconds old when
+            refreshing. Default to the device cache TTL
         """
-        if self._volume is None or refresh:
+        if not self._cache.lookup('volume', self._volume is not None, refresh,
+                                  max_age):
             self.refresh_volume()
         return self._volume
 
-    def zone_status(self, refresh=True):
+    def zone_status(self, refresh=True, max_age=None):
         """Get Zone Status.
 
         :param refresh: Force refresh, else return old data.
+        :param max_age: Accept data up to max_age seconds old when
+            refreshing. Default to the device cache TTL
         """
-        if self._zone_status is None or refresh:
+        if not self._cache.lookup('zone_status',
+                                  self._zone_status is not None, refresh,
+                                  max_age):
             self.refresh_zone_status()
         return self._zone_status
 
-    def presets(self, refresh=True):
+    def presets(self, refresh=True, max_age=None):
         """Presets.
 
         :param refresh: Force refresh, else return old data.
+        :param max_age: Accept data up to max_age seconds old when
+            refreshing. Default to the device cache TTL
         """
-        if self._presets is None or refresh:
+        if not self._cache.lookup('presets', self._presets is not None,
+                                  refresh, max_age):
             self.refresh_presets()
         return self._presets
 
+    def sources(self, refresh=True, max_age=None):
+        """Get available sources.
+
+        :param refresh: Force refresh, else return old data.
+        :param max_age: Accept data up to max_age seconds old when
+            refreshing. Default to the device cache TTL
+        """
+        if not self._cache.lookup('sources', self._sources is not None,
+                                  refresh, max_age):
+            self.refresh_sources()
+        return self._sources
+
+    def bass(self, refresh=True, max_age=None):
+        """Get bass object.
+
+        :param refresh: Force refresh, else return old data.
+        :param max_age: Accept data up to max_age seconds old when
+            refreshing. Default to the device cache TTL
+        """
+        if not self._cache.lookup('bass', self._bass is not None, refresh,
+                                  max_age):
+            self.refresh_bass()
+        return self._bass
+
+    def group(self, refresh=True, max_age=None):
+        """Get SoundTouch 10 group. None without group.
+
+        :param refresh: Force refresh, else return old data.
+        :param max_age: Accept data up to max_age seconds old when
+            refreshing. Default to the device cache TTL
+        """
+        if not self._cache.lookup('group', self._group is not None, refresh,
+                                  max_age):
+            self.refresh_group()
+        return self._group
+
+    def now_selection(self):
+        """Return the selected preset pushed by notification. None if unknown.
+
+        Only known while notifications are started.
+        """
+        return self._now_selection
+
+    def recents(self):
+        """Return recently played contents pushed by notification.
+
+        None if unknown. Only known while notifications are started.
+        """
+        return self._recents
+
+    def connection_state(self):
+        """Return network connection state pushed by notification.
+
+        None if unknown. Only known while notifications are started.
+        """
+        return self._connection_state
+
     def set_volume(self, level):
         """Set volume level: from 0 to 100."""
         action = '/volume'
         volume = '<volume>%s</volume>' % level
-        requests.post('http://' + self._host + ":" + str(self._port) + action,
-                      volume)
+        self._post(action, volume)
 
     def mute(self):
         """Mute/Un-mute volume."""
@@ -595,31 +1459,165 @@ class SoundTouchDevice:
                                      self._snapshot.type)
 
 
-class Config:
+class _Record(object):
+    """Immutable model: slotted fields compared and hashed by value.
+
+    Fields are set once, by the constructor.
+    """
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        """Set a field not already set."""
+        if hasattr(self, name):
+            raise AttributeError("%s is immutable" % type(self).__name__)
+        super(_Record, self).__setattr__(name, value)
+
+    def __delattr__(self, name):
+        """Refuse to delete a field."""
+        raise AttributeError("%s is immutable" % type(self).__name__)
+
+    def _values(self):
+        return tuple(getattr(self, field, None) for field in self.__slots__)
+
+    def __eq__(self, other):
+        """Return True if other is the same model with the same values."""
+        # pylint: disable=protected-access
+        return type(self) is type(other) and self._values() == other._values()
+
+    def __ne__(self, other):
+        """Return True if other is not equal."""
+        return not self == other
+
+    def __hash__(self):
+        """Return hash of the values."""
+        return hash((type(self), self._values()))
+
+
+class _LazyRecord(_Record):
+    """Record decoded from an XML element, optionally field by field.
+
+    Each field has a decoder taking the element and its children by tag. In
+    lazy mode the element is kept and a field is decoded on first access,
+    the element is released once every field is decoded. In eager mode
+    every field is decoded at once and the element is not kept.
+    """
+
+    __slots__ = ('_element', '_children', '_pending')
+
+    _decoders = {}
+
+    def _decode(self, element, lazy):
+        children = _child_elements(element)
+        if lazy:
+            self._element = element
+            self._children = children
+            self._pending = set(self.__slots__)
+            return
+        self._element = self._children = self._pending = None
+        for field in self.__slots__:
+            setattr(self, field, self._decoders[field](element, children))
+
+    def _get(self, field):
+        try:
+            return getattr(self, field)
+        except AttributeError:
+            pass
+        element, children = self._element, self._children
+        if children is None:
+            # Decoded and released by another thread
+            return getattr(self, field)
+        value = self._decoders[field](element, children)
+        object.__setattr__(self, field, value)
+        pending = self._pending
+        if pending is not None:
+            pending.discard(field)
+            if not pending:
+                for name in _LazyRecord.__slots__:
+                    object.__setattr__(self, name, None)
+        return value
+
+    @property
+    def decoded(self):
+        """Return True if every field is decoded."""
+        return self._children is None
+
+    def _values(self):
+        return tuple(self._get(field) for field in self.__slots__)
+
+
+def _decode_value(tag):
+    return lambda element, children: _get_element_value(children.get(tag))
+
+
+def _decode_attribute(attribute):
+    return lambda element, children: element.get(attribute)
+
+
+def _decode_int(value):
+    return int(value) if value is not None else None
+
+
+def _decode_image(element, children):
+    # pylint: disable=unused-argument
+    art = children.get("art")
+    if _get_element_attribute(art, "artImageStatus") == "IMAGE_PRESENT":
+        return _get_element_value(art)
+    return None
+
+
+def _decode_content_item(element, children):
+    # pylint: disable=unused-argument
+    content_item = children.get("ContentItem")
+    return ContentItem(content_item) if content_item is not None else None
+
+
+def _decode_preset_attribute(attribute):
+    return lambda element, children: children["ContentItem"].get(attribute)
+
+
+def _decode_preset_source_xml(element, children):
+    # pylint: disable=unused-argument
+    content_item = copy.copy(children["ContentItem"])
+    content_item.tail = None
+    return ET.tostring(content_item).decode("UTF-8")
+
+
+class Config(_Record):
     """Soundtouch device configuration."""
 
-    def __init__(self, xml_dom):
+    __slots__ = ('_id', '_name', '_type', '_networks', '_components',
+                 '_account_uuid', '_module_type', '_variant', '_variant_mode',
+                 '_country_code', '_region_code')
+
+    def __init__(self, info_element):
         """Create a new configuration.
 
-        :param xml_dom: Configuration XML DOM
-        """
-        self._id = _get_dom_element_attribute(xml_dom, "info", "deviceID")
-        self._name = _get_dom_element_value(xml_dom, "name")
-        self._type = _get_dom_element_value(xml_dom, "type")
-        self._account_uuid = _get_dom_element_value(xml_dom,
-                                                    "margeAccountUUID")
-        self._module_type = _get_dom_element_value(xml_dom, "moduleType")
-        self._variant = _get_dom_element_value(xml_dom, "variant")
-        self._variant_mode = _get_dom_element_value(xml_dom, "variantMode")
-        self._country_code = _get_dom_element_value(xml_dom, "countryCode")
-        self._region_code = _get_dom_element_value(xml_dom, "regionCode")
-        self._networks = []
-        for network in xml_dom.getElementsByTagName("networkInfo"):
-            self._networks.append(Network(network))
-        self._components = []
-        for components in _get_dom_elements(xml_dom, "components"):
-            for component in _get_dom_elements(components, "component"):
-                self._components.append(Component(component))
+        :param info_element: Configuration XML element (info)
+        """
+        children = {}
+        networks = []
+        components = []
+        for child in info_element:
+            if child.tag == "networkInfo":
+                networks.append(Network(child))
+            elif child.tag == "components":
+                components.extend(Component(component) for component in child
+                                  if component.tag == "component")
+            else:
+                children.setdefault(child.tag, child)
+        self._networks = tuple(networks)
+        self._components = tuple(components)
+        self._id = info_element.get("deviceID")
+        self._name = _get_element_value(children.get("name"))
+        self._type = _get_element_value(children.get("type"))
+        self._account_uuid = _get_element_value(
+            children.get("margeAccountUUID"))
+        self._module_type = _get_element_value(children.get("moduleType"))
+        self._variant = _get_element_value(children.get("variant"))
+        self._variant_mode = _get_element_value(children.get("variantMode"))
+        self._country_code = _get_element_value(children.get("countryCode"))
+        self._region_code = _get_element_value(children.get("regionCode"))
 
     @property
     def device_id(self):
@@ -693,17 +1691,20 @@ class Config:
         return network.mac_address if network else None
 
 
-class Network:
+class Network(_Record):
     """Soundtouch network configuration."""
 
-    def __init__(self, network_dom):
+    __slots__ = ('_type', '_mac_address', '_ip_address')
+
+    def __init__(self, network_element):
         """Create a new Network.
 
-        :param network_dom: Network configuration XML DOM
+        :param network_element: Network configuration XML element
         """
-        self._type = network_dom.attributes["type"].value
-        self._mac_address = _get_dom_element_value(network_dom, "macAddress")
-        self._ip_address = _get_dom_element_value(network_dom, "ipAddress")
+        children = _child_elements(network_element)
+        self._type = network_element.get("type")
+        self._mac_address = _get_element_value(children.get("macAddress"))
+        self._ip_address = _get_element_value(children.get("ipAddress"))
 
     @property
     def type(self):
@@ -721,20 +1722,21 @@ class Network:
         return self._ip_address
 
 
-class Component:
+class Component(_Record):
     """Soundtouch component."""
 
-    def __init__(self, component_dom):
+    __slots__ = ('_category', '_software_version', '_serial_number')
+
+    def __init__(self, component_element):
         """Create a new Component.
 
-        :param component_dom: Component XML DOM
+        :param component_element: Component XML element
         """
-        self._category = _get_dom_element_value(component_dom,
-                                                "componentCategory")
-        self._software_version = _get_dom_element_value(component_dom,
-                                                        "softwareVersion")
-        self._serial_number = _get_dom_element_value(component_dom,
-                                                     "serialNumber")
+        children = _child_elements(component_element)
+        self._category = _get_element_value(children.get("componentCategory"))
+        self._software_version = _get_element_value(
+            children.get("softwareVersion"))
+        self._serial_number = _get_element_value(children.get("serialNumber"))
 
     @property
     def category(self):
@@ -752,125 +1754,126 @@ class Component:
         return self._serial_number
 
 
-class Status:
+class Status(_LazyRecord):
     """Soundtouch device status."""
 
-    def __init__(self, xml_dom):
+    __slots__ = ('_source', '_content_item', '_track', '_artist', '_album',
+                 '_image', '_duration', '_position', '_play_status',
+                 '_shuffle_setting', '_repeat_setting', '_stream_type',
+                 '_track_id', '_station_name', '_description',
+                 '_station_location')
+
+    _decoders = {
+        '_source': _decode_attribute("source"),
+        '_content_item': _decode_content_item,
+        '_track': _decode_value("track"),
+        '_artist': _decode_value("artist"),
+        '_album': _decode_value("album"),
+        '_image': _decode_image,
+        '_duration': lambda element, children: _decode_int(
+            _get_element_attribute(children.get("time"), "total")),
+        '_position': lambda element, children: _decode_int(
+            _get_element_value(children.get("time"))),
+        '_play_status': _decode_value("playStatus"),
+        '_shuffle_setting': _decode_value("shuffleSetting"),
+        '_repeat_setting': _decode_value("repeatSetting"),
+        '_stream_type': _decode_value("streamType"),
+        '_track_id': _decode_value("trackID"),
+        '_station_name': _decode_value("stationName"),
+        '_description': _decode_value("description"),
+        '_station_location': _decode_value("stationLocation"),
+    }
+
+    def __init__(self, now_playing_element, lazy=False):
         """Create a new device status.
 
-        :param xml_dom: Status XML DOM
-        """
-        self._source = _get_dom_element_attribute(xml_dom, "nowPlaying",
-                                                  "source")
-        self._content_item = None
-        content_item = xml_dom.getElementsByTagName("ContentItem")
-        if content_item:
-            self._content_item = ContentItem(
-                _get_dom_element(xml_dom, "ContentItem"))
-        self._track = _get_dom_element_value(xml_dom, "track")
-        self._artist = _get_dom_element_value(xml_dom, "artist")
-        self._album = _get_dom_element_value(xml_dom, "album")
-        image_status = _get_dom_element_attribute(xml_dom, "art",
-                                                  "artImageStatus")
-        if image_status == "IMAGE_PRESENT":
-            self._image = _get_dom_element_value(xml_dom, "art")
-        else:
-            self._image = None
-
-        duration = _get_dom_element_attribute(xml_dom, "time", "total")
-        self._duration = int(duration) if duration is not None else None
-        position = _get_dom_element_value(xml_dom, "time")
-        self._position = int(position) if position is not None else None
-        self._play_status = _get_dom_element_value(xml_dom, "playStatus")
-        self._shuffle_setting = _get_dom_element_value(xml_dom,
-                                                       "shuffleSetting")
-        self._repeat_setting = _get_dom_element_value(xml_dom, "repeatSetting")
-        self._stream_type = _get_dom_element_value(xml_dom, "streamType")
-        self._track_id = _get_dom_element_value(xml_dom, "trackID")
-        self._station_name = _get_dom_element_value(xml_dom, "stationName")
-        self._description = _get_dom_element_value(xml_dom, "description")
-        self._station_location = _get_dom_element_value(xml_dom,
-                                                        "stationLocation")
+        :param now_playing_element: Status XML element (nowPlaying or
+            nowPlayingUpdated)
+        :param lazy: Decode each field on first access. Default False
+        """
+        if now_playing_element.tag != "nowPlaying":
+            now_playing_element = now_playing_element.find("nowPlaying")
+        self._decode(now_playing_element, lazy)
 
     @property
     def source(self):
         """Source."""
-        return self._source
+        return self._get('_source')
 
     @property
     def content_item(self):
         """Content item."""
-        return self._content_item
+        return self._get('_content_item')
 
     @property
     def track(self):
         """Track."""
-        return self._track
+        return self._get('_track')
 
     @property
     def artist(self):
         """Artist."""
-        return self._artist
+        return self._get('_artist')
 
     @property
     def album(self):
         """Album name."""
-        return self._album
+        return self._get('_album')
 
     @property
     def image(self):
         """Image URL."""
-        return self._image
+        return self._get('_image')
 
     @property
     def duration(self):
         """Duration."""
-        return self._duration
+        return self._get('_duration')
 
     @property
     def position(self):
         """Position."""
-        return self._position
+        return self._get('_position')
 
     @property
     def play_status(self):
         """Status."""
-        return self._play_status
+        return self._get('_play_status')
 
     @property
     def shuffle_setting(self):
         """Shuffle setting."""
-        return self._shuffle_setting
+        return self._get('_shuffle_setting')
 
     @property
     def repeat_setting(self):
         """Repeat setting."""
-        return self._repeat_setting
+        return self._get('_repeat_setting')
 
     @property
     def stream_type(self):
         """Stream type."""
-        return self._stream_type
+        return self._get('_stream_type')
 
     @property
     def track_id(self):
         """Track id."""
-        return self._track_id
+        return self._get('_track_id')
 
     @property
     def station_name(self):
         """Station name."""
-        return self._station_name
+        return self._get('_station_name')
 
     @property
     def description(self):
         """Description."""
-        return self._description
+        return self._get('_description')
 
     @property
     def station_location(self):
         """Station location."""
-        return self._station_location
+        return self._get('_station_location')
 
     def __repr__(self):
         """Return a String representation."""
@@ -885,21 +1888,24 @@ class Status:
         return 'Status(' + ",".join(fields) + ')'
 
 
-class ContentItem:
+class ContentItem(_Record):
     """Content item."""
 
-    def __init__(self, xml_dom):
+    __slots__ = ('_name', '_source', '_type', '_location', '_source_account',
+                 '_is_presetable')
+
+    def __init__(self, content_item_element):
         """Create a new content item.
 
-        :param xml_dom: Content item XML DOM
+        :param content_item_element: Content item XML element
         """
-        self._name = _get_dom_element_value(xml_dom, "itemName")
-        self._source = _get_dom_attribute(xml_dom, "source")
-        self._type = _get_dom_attribute(xml_dom, "type")
-        self._location = _get_dom_attribute(xml_dom, "location")
-        self._source_account = _get_dom_attribute(xml_dom, "sourceAccount")
-        self._is_presetable = _get_dom_attribute(xml_dom,
-                                                 "isPresetable") == 'true'
+        self._name = _get_element_value(content_item_element.find("itemName"))
+        self._source = content_item_element.get("source")
+        self._type = content_item_element.get("type")
+        self._location = content_item_element.get("location")
+        self._source_account = content_item_element.get("sourceAccount")
+        self._is_presetable = \
+            content_item_element.get("isPresetable") == 'true'
 
     @property
     def name(self):
@@ -940,17 +1946,21 @@ class ContentItem:
         return 'ContentItem(' + ",".join(formated_fields) + ')'
 
 
-class Volume:
+class Volume(_Record):
     """Volume configuration."""
 
-    def __init__(self, xml_dom):
+    __slots__ = ('_actual', '_target', '_muted')
+
+    def __init__(self, volume_element):
         """Create a new volume configuration.
 
-        :param xml_dom: Volume configuration XML DOM
+        :param volume_element: Volume configuration XML element
         """
-        self._actual = int(_get_dom_element_value(xml_dom, "actualvolume"))
-        self._target = int(_get_dom_element_value(xml_dom, "targetvolume"))
-        self._muted = _get_dom_element_value(xml_dom, "muteenabled") == "true"
+        children = _child_elements(volume_element)
+        self._actual = int(_get_element_value(children.get("actualvolume")))
+        self._target = int(_get_element_value(children.get("targetvolume")))
+        self._muted = _get_element_value(
+            children.get("muteenabled")) == "true"
 
     @property
     def actual(self):
@@ -968,70 +1978,72 @@ class Volume:
         return self._muted
 
 
-class Preset:
+class Preset(_LazyRecord):
     """Preset."""
 
-    def __init__(self, preset_dom):
+    __slots__ = ('_id', '_name', '_source', '_type', '_location',
+                 '_source_account', '_is_presetable', '_source_xml')
+
+    _decoders = {
+        '_id': _decode_attribute("id"),
+        '_name': lambda element, children: _get_element_value(
+            children["ContentItem"].find("itemName")),
+        '_source': _decode_preset_attribute("source"),
+        '_type': _decode_preset_attribute("type"),
+        '_location': _decode_preset_attribute("location"),
+        '_source_account': _decode_preset_attribute("sourceAccount"),
+        '_is_presetable': lambda element, children: children[
+            "ContentItem"].get("isPresetable") == "true",
+        '_source_xml': _decode_preset_source_xml,
+    }
+
+    def __init__(self, preset_element, lazy=False):
         """Create a preset configuration.
 
-        :param preset_dom: Preset configuration XML DOM
-        """
-        self._name = _get_dom_element_value(preset_dom, "itemName")
-        self._id = _get_dom_attribute(preset_dom, "id")
-        self._source = _get_dom_element_attribute(preset_dom, "ContentItem",
-                                                  "source")
-        self._type = _get_dom_element_attribute(preset_dom, "ContentItem",
-                                                "type")
-        self._location = _get_dom_element_attribute(preset_dom, "ContentItem",
-                                                    "location")
-        self._source_account = _get_dom_element_attribute(preset_dom,
-                                                          "ContentItem",
-                                                          "sourceAccount")
-        self._is_presetable = \
-            _get_dom_element_attribute(preset_dom,
-                                       "ContentItem",
-                                       "isPresetable") == "true"
-        self._source_xml = _get_dom_element(preset_dom, "ContentItem").toxml()
+        :param preset_element: Preset configuration XML element
+        :param lazy: Decode each field on first access. Default False
+        """
+        self._decode(preset_element, lazy)
 
     @property
     def name(self):
         """Name."""
-        return self._name
+        return self._get('_name')
 
     @property
     def preset_id(self):
         """Id."""
-        return self._id
+        return self._get('_id')
 
     @property
     def source(self):
         """Source."""
-        return self._source
+        return self._get('_source')
 
     @property
     def type(self):
         """Type."""
-        return self._type
+        return self._get('_type')
 
     @property
     def location(self):
         """Location."""
-        return self._location
+        return self._get('_location')
 
     @property
     def source_account(self):
         """Source account."""
-        return self._source_account
+        return self._get('_source_account')
 
     @property
     def is_presetable(self):
         """Return True if is presetable."""
-        return self._is_presetable
+        return self._get('_is_presetable')
 
     @property
     def source_xml(self):
         """XML source."""
-        return self._source_xml
+        return self._get('_source_xml')
 
     def __repr__(self):
         """Return a String representation."""
@@ -1043,23 +2055,21 @@ class Preset:
         return 'Preset(' + ",".join(formated_fields) + ')'
 
 
-class ZoneStatus:
+class ZoneStatus(_Record):
     """Zone Status."""
 
-    def __init__(self, zone_dom):
+    __slots__ = ('_master_id', '_master_ip', '_is_master', '_slaves')
+
+    def __init__(self, zone_element):
         """Create a new Zone status configuration.
 
-        :param zone_dom: Zone status configuration XML DOM
+        :param zone_element: Zone status configuration XML element
         """
-        self._master_id = _get_dom_element_attribute(zone_dom, "zone",
-                                                     "master")
-        self._master_ip = _get_dom_element_attribute(zone_dom, "zone",
-                                                     "senderIPAddress")
+        self._master_id = zone_element.get("master")
+        self._master_ip = zone_element.get("senderIPAddress")
         self._is_master = self._master_ip is None
-        members = _get_dom_elements(zone_dom, "member")
-        self._slaves = []
-        for member in members:
-            self._slaves.append(ZoneSlave(member))
+        self._slaves = tuple(ZoneSlave(member) for member in zone_element
+                             if member.tag == "member")
 
     @property
     def master_id(self):
@@ -1082,16 +2092,18 @@ class ZoneStatus:
         return self._slaves
 
 
-class ZoneSlave:
+class ZoneSlave(_Record):
     """Zone Slave."""
 
-    def __init__(self, member_dom):
+    __slots__ = ('_ip', '_role')
+
+    def __init__(self, member_element):
         """Create a new Zone slave configuration.
 
-        :param member_dom: Slave XML DOM
+        :param member_element: Slave XML element
         """
-        self._ip = _get_dom_attribute(member_dom, "ipaddress")
-        self._role = _get_dom_attribute(member_dom, "role")
+        self._ip = member_element.get("ipaddress")
+        self._role = member_element.get("role")
 
     @property
     def device_ip(self):
@@ -1104,6 +2116,231 @@ class ZoneSlave:
         return self._role
 
 
+class Bass(_Record):
+    """Bass configuration."""
+
+    __slots__ = ('_actual', '_target')
+
+    def __init__(self, bass_element):
+        """Create a new bass configuration.
+
+        :param bass_element: Bass configuration XML element
+        """
+        children = _child_elements(bass_element)
+        self._actual = _decode_int(_get_element_value(
+            children.get("actualbass")))
+        self._target = _decode_int(_get_element_value(
+            children.get("targetbass")))
+
+    @property
+    def actual(self):
+        """Actual bass level."""
+        return self._actual
+
+    @property
+    def target(self):
+        """Target bass level."""
+        return self._target
+
+
+class SourceItem(_Record):
+    """Source available on the device."""
+
+    __slots__ = ('_name', '_source', '_source_account', '_status',
+                 '_is_local', '_multiroom_allowed')
+
+    def __init__(self, source_item_element):
+        """Create a new source.
+
+        :param source_item_element: Source XML element (sourceItem)
+        """
+        self._name = _get_element_value(source_item_element)
+        self._source = source_item_element.get("source")
+        self._source_account = source_item_element.get("sourceAccount")
+        self._status = source_item_element.get("status")
+        self._is_local = source_item_element.get("isLocal") == "true"
+        self._multiroom_allowed = \
+            source_item_element.get("multiroomallowed") == "true"
+
+    @property
+    def name(self):
+        """Name."""
+        return self._name
+
+    @property
+    def source(self):
+        """Source."""
+        return self._source
+
+    @property
+    def source_account(self):
+        """Source account."""
+        return self._source_account
+
+    @property
+    def status(self):
+        """Status (READY, UNAVAILABLE)."""
+        return self._status
+
+    @property
+    def is_local(self):
+        """Return True if the source is local (AUX, Bluetooth...)."""
+        return self._is_local
+
+    @property
+    def multiroom_allowed(self):
+        """Return True if the source can be played in a zone."""
+        return self._multiroom_allowed
+
+
+class Recent(_Record):
+    """Recently played content."""
+
+    __slots__ = ('_id', '_device_id', '_utc_time', '_content_item')
+
+    def __init__(self, recent_element):
+        """Create a new recent content.
+
+        :param recent_element: Recent XML element
+        """
+        self._id = recent_element.get("id")
+        self._device_id = recent_element.get("deviceID")
+        self._utc_time = _decode_int(recent_element.get("utcTime"))
+        content_item = None
+        for child in recent_element:
+            if child.tag.lower() == "contentitem":
+                content_item = ContentItem(child)
+                break
+        self._content_item = content_item
+
+    @property
+    def recent_id(self):
+        """Id."""
+        return self._id
+
+    @property
+    def device_id(self):
+        """Id of the device which played the content."""
+        return self._device_id
+
+    @property
+    def utc_time(self):
+        """Time the content was played (seconds since epoch)."""
+        return self._utc_time
+
+    @property
+    def content_item(self):
+        """Played content item."""
+        return self._content_item
+
+
+class NetworkConnection(_Record):
+    """Network connection state of the device."""
+
+    __slots__ = ('_state', '_up', '_signal')
+
+    def __init__(self, connection_element):
+        """Create a new network connection state.
+
+        :param connection_element: Connection state XML element
+        """
+        self._state = connection_element.get("state")
+        self._up = connection_element.get("up") == "true"
+        self._signal = connection_element.get("signal")
+
+    @property
+    def state(self):
+        """State (NETWORK_WIFI_CONNECTED...)."""
+        return self._state
+
+    @property
+    def up(self):
+        """Return True if the network connection is up."""
+        return self._up
+
+    @property
+    def signal(self):
+        """Wi-Fi signal quality (EXCELLENT_SIGNAL, MARGINAL_SIGNAL...)."""
+        return self._signal
+
+
+class Group(_Record):
+    """Stereo pair group (SoundTouch 10)."""
+
+    __slots__ = ('_id', '_name', '_master_id', '_roles', '_status')
+
+    def __init__(self, group_element):
+        """Create a new group.
+
+        :param group_element: Group XML element
+        """
+        children = _child_elements(group_element)
+        self._id = group_element.get("id")
+        self._name = _get_element_value(children.get("name"))
+        self._master_id = _get_element_value(children.get("masterDeviceId"))
+        roles = children.get("roles")
+        self._roles = tuple(GroupRole(role) for role in roles
+                            if role.tag == "groupRole") \
+            if roles is not None else ()
+        self._status = _get_element_value(children.get("status"))
+
+    @property
+    def group_id(self):
+        """Id."""
+        return self._id
+
+    @property
+    def name(self):
+        """Name."""
+        return self._name
+
+    @property
+    def master_id(self):
+        """Master device id."""
+        return self._master_id
+
+    @property
+    def roles(self):
+        """Group members."""
+        return self._roles
+
+    @property
+    def status(self):
+        """Status (GROUP_OK...)."""
+        return self._status
+
+
+class GroupRole(_Record):
+    """Member of a group."""
+
+    __slots__ = ('_device_id', '_role', '_ip')
+
+    def __init__(self, role_element):
+        """Create a new group member.
+
+        :param role_element: Group role XML element
+        """
+        children = _child_elements(role_element)
+        self._device_id = _get_element_value(children.get("deviceId"))
+        self._role = _get_element_value(children.get("role"))
+        self._ip = _get_element_value(children.get("ipAddress"))
+
+    @property
+    def device_id(self):
+        """Member device id."""
+        return self._device_id
+
+    @property
+    def role(self):
+        """Role (LEFT, RIGHT)."""
+        return self._role
+
+    @property
+    def device_ip(self):
+        """Member ip."""
+        return self._ip
+
+
 class SoundtouchException(Exception):
     """Parent Soundtouch Exception."""
 
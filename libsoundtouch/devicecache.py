@@ -0,0 +1,223 @@
+"""On-disk cache of Bose Soundtouch devices."""
+
+import json
+import logging
+import os
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import Lock
+
+from requests.exceptions import RequestException
+
+from .device import Config, SoundTouchDevice
+
+try:
+    from os import replace
+except ImportError:  # Python 2.7
+    from os import rename as replace
+
+_LOGGER = logging.getLogger(__name__)
+
+# Config fields stored as XML child elements of info
+_CONFIG_VALUES = (
+    ('name', 'name'), ('type', 'type'), ('account_uuid', 'margeAccountUUID'),
+    ('module_type', 'moduleType'), ('variant', 'variant'),
+    ('variant_mode', 'variantMode'), ('country_code', 'countryCode'),
+    ('region_code', 'regionCode'))
+
+
+def _config_to_dict(config):
+    """Return a JSON serializable dict of a configuration."""
+    data = dict((field, getattr(config, field))
+                for field, _ in _CONFIG_VALUES)
+    data['device_id'] = config.device_id
+    data['networks'] = [
+        {'type': network.type, 'mac_address': network.mac_address,
+         'ip_address': network.ip_address} for network in config.networks]
+    data['components'] = [
+        {'category': component.category,
+         'software_version': component.software_version,
+         'serial_number': component.serial_number}
+        for component in config.components]
+    return data
+
+
+def _sub_element(parent, tag, value):
+    if value is not None:
+        ET.SubElement(parent, tag).text = value
+
+
+def _config_from_dict(data):
+    """Return the configuration of a dict made by _config_to_dict."""
+    info = ET.Element('info')
+    if data.get('device_id') is not None:
+        info.set('deviceID', data['device_id'])
+    for field, tag in _CONFIG_VALUES:
+        _sub_element(info, tag, data.get(field))
+    if data.get('components'):
+        components = ET.SubElement(info, 'components')
+        for component in data['components']:
+            element = ET.SubElement(components, 'component')
+            _sub_element(element, 'componentCategory',
+                         component.get('category'))
+            _sub_element(element, 'softwareVersion',
+                         component.get('software_version'))
+            _sub_element(element, 'serialNumber',
+                         component.get('serial_number'))
+    for network in data.get('networks', ()):
+        element = ET.SubElement(info, 'networkInfo')
+        if network.get('type') is not None:
+            element.set('type', network['type'])
+        _sub_element(element, 'macAddress', network.get('mac_address'))
+        _sub_element(element, 'ipAddress', network.get('ip_address'))
+    return Config(info)
+
+
+class DeviceCache(object):
+    """Devices and configurations stored in a JSON file by device id.
+
+    Devices are built from the file without any request, their
+    configuration is fetched again in the background: an entry whose device
+    id doesn't match the device found at its address is evicted. Entries of
+    unreachable devices are kept, a new address found by discovery replaces
+    the cached one.
+
+    ::
+
+        cache = DeviceCache('~/.soundtouch.json')
+        devices = discover_devices(expected_count=12, cache=cache)
+    """
+
+    def __init__(self, path):
+        """Create a new cache, loaded from the file if it exists.
+
+        :param path: Path of the JSON file
+        """
+        self._path = os.path.expanduser(path)
+        self._lock = Lock()
+        self._entries = self._load()
+        self._revalidations = []
+
+    def _load(self):
+        try:
+            with open(self._path) as cache_file:
+                entries = json.load(cache_file)
+        except (IOError, OSError, ValueError) as error:
+            _LOGGER.debug("Device cache %s not loaded: %s", self._path, error)
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _save(self):
+        """Write the entries to the file. Called with the lock held."""
+        temp_path = self._path + '.tmp'
+        try:
+            with open(temp_path, 'w') as cache_file:
+                json.dump(self._entries, cache_file, indent=1,
+                          sort_keys=True)
+            replace(temp_path, self._path)
+        except (IOError, OSError) as error:
+            _LOGGER.warning("Unable to write device cache %s: %s",
+                            self._path, error)
+
+    @property
+    def path(self):
+        """Return path of the JSON file."""
+        return self._path
+
+    def __len__(self):
+        """Return number of cached devices."""
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, device_id):
+        """Return True if the device is cached."""
+        with self._lock:
+            return device_id in self._entries
+
+    def put(self, device):
+        """Store a device and its configuration.
+
+        The configuration is fetched if not already fetched.
+        """
+        config = device.config
+        with self._lock:
+            self._entries[config.device_id] = {
+                'host': device.host, 'port': device.port,
+                'ws_port': device.ws_port, 'dlna_port': device.dlna_port,
+                'config': _config_to_dict(config)}
+            self._save()
+
+    def evict(self, device_id):
+        """Remove a device."""
+        with self._lock:
+            if self._entries.pop(device_id, None) is not None:
+                self._save()
+
+    def devices(self, transport=None, revalidate=True, max_workers=16):
+        """Return the cached devices, built without any request.
+
+        :param transport: Transport shared by the devices. Its executor
+            revalidates the devices if set
+        :param revalidate: Fetch the configurations again in the
+            background. Default True
+        :param max_workers: Max concurrent fetches if transport is not set.
+            Default 16
+        """
+        with self._lock:
+            entries = list(self._entries.items())
+        devices = []
+        for device_id, entry in entries:
+            try:
+                config = _config_from_dict(entry['config'])
+                device = SoundTouchDevice(
+                    entry['host'], entry['port'], entry['ws_port'],
+                    entry['dlna_port'], transport=transport, config=config)
+            except (KeyError, TypeError, AttributeError) as error:
+                _LOGGER.warning("Invalid device cache entry %s: %s",
+                                device_id, error)
+                self.evict(device_id)
+                continue
+            devices.append((device_id, device))
+        if revalidate and devices:
+            if transport is not None:
+                executor = transport.executor
+            else:
+                executor = ThreadPoolExecutor(
+                    max(1, min(max_workers, len(devices))))
+            futures = [executor.submit(self._revalidate, device_id, device)
+                       for device_id, device in devices]
+            if transport is None:
+                executor.shutdown(wait=False)
+            with self._lock:
+                self._revalidations = [future for future
+                                       in self._revalidations
+                                       if not future.done()] + futures
+        return [device for _, device in devices]
+
+    def _revalidate(self, device_id, device):
+        """Fetch the configuration of a cached device again.
+
+        Return True if the cached entry is still valid.
+        """
+        try:
+            config = device.refresh_config()
+        except RequestException as error:
+            _LOGGER.info("Cached device %s (host: %s) unreachable: %s",
+                         device_id, device.host, error)
+            return False
+        valid = config.device_id == device_id
+        if not valid:
+            _LOGGER.info("Cached device %s replaced by %s (host: %s)",
+                         device_id, config.device_id, device.host)
+            self.evict(device_id)
+        self.put(device)
+        return valid
+
+    def wait(self, timeout=None):
+        """Wait for the background revalidations.
+
+        :param timeout: Max time to wait in seconds. Wait forever if not set
+        """
+        with self._lock:
+            futures = list(self._revalidations)
+        wait(futures, timeout)
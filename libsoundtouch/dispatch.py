@@ -0,0 +1,262 @@
+"""Listener dispatch of Bose Soundtouch notifications."""
+
+import heapq
+import itertools
+import logging
+from collections import deque
+from threading import Condition, Lock, Thread
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import DispatchPolicy
+
+try:
+    from time import monotonic
+except ImportError:  # Python 2.7
+    from time import time as monotonic
+
+DEFAULT_MAX_QUEUE_SIZE = 100
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class _DeviceQueue(object):
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, host):
+        self.host = host
+        self.notifications = deque()
+        self.scheduled = False
+        self.max_depth = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.callbacks = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+
+class ListenerDispatcher(object):
+    """Run notification listeners outside of the websocket reader thread.
+
+    Notifications of each device are queued in a bounded queue and their
+    listeners run in order by an executor, a slow listener only delays the
+    listeners of its device.
+    """
+
+    def __init__(self, executor=None, max_workers=4,
+                 max_queue_size=DEFAULT_MAX_QUEUE_SIZE,
+                 policy=DispatchPolicy.COALESCE):
+        """Create a new listener dispatcher.
+
+        :param executor: concurrent.futures executor running the listeners.
+            A thread pool executor is created if not set
+        :param max_workers: Max threads of the created executor. Default 4
+        :param max_queue_size: Max pending notifications per device.
+            Default 100
+        :param policy: DispatchPolicy. Default COALESCE
+        """
+        self._own_executor = executor is None
+        self._executor = executor if executor is not None else \
+            ThreadPoolExecutor(max_workers)
+        self._max_queue_size = max_queue_size
+        self._policy = policy
+        self._queues = {}
+        self._lock = Lock()
+
+    @property
+    def policy(self):
+        """Return the queueing policy."""
+        return self._policy
+
+    def _enqueue(self, queue, notification):
+        notifications = queue.notifications
+        if self._policy == DispatchPolicy.COALESCE:
+            for index, pending in enumerate(notifications):
+                if pending[0] == notification[0]:
+                    notifications[index] = notification
+                    queue.coalesced += 1
+                    return
+        if len(notifications) >= self._max_queue_size:
+            queue.dropped += 1
+            if self._policy == DispatchPolicy.DROP_NEWEST:
+                return
+            notifications.popleft()
+        notifications.append(notification)
+        queue.max_depth = max(queue.max_depth, len(notifications))
+
+    def dispatch(self, device, event, listeners, value):
+        """Queue a notification and schedule its listeners.
+
+        :param device: Notified device
+        :param event: Notification type (volume, status...)
+        :param listeners: Listeners to call with value
+        :param value: New value
+        """
+        if not listeners:
+            return
+        with self._lock:
+            queue = self._queues.get(device)
+            if queue is None:
+                queue = self._queues[device] = _DeviceQueue(device.host)
+            self._enqueue(queue, (event, list(listeners), value))
+            schedule = not queue.scheduled
+            queue.scheduled = True
+        if schedule:
+            self._executor.submit(self._drain, queue)
+
+    def _drain(self, queue):
+        while True:
+            with self._lock:
+                if not queue.notifications:
+                    queue.scheduled = False
+                    return
+                event, listeners, value = queue.notifications.popleft()
+            for listener in listeners:
+                start = monotonic()
+                try:
+                    listener(value)
+                except Exception:  # pylint: disable=broad-except
+                    _LOGGER.exception("Error in %s listener of %s", event,
+                                      queue.host)
+                latency = monotonic() - start
+                with self._lock:
+                    queue.callbacks += 1
+                    queue.latency_total += latency
+                    queue.latency_max = max(queue.latency_max, latency)
+
+    @property
+    def metrics(self):
+        """Return queue and listener metrics by device host.
+
+        queue_depth and max_queue_depth are numbers of pending
+        notifications, latencies are listener durations in seconds.
+        """
+        with self._lock:
+            return dict((queue.host, {
+                'queue_depth': len(queue.notifications),
+                'max_queue_depth': queue.max_depth,
+                'dropped': queue.dropped,
+                'coalesced': queue.coalesced,
+                'callbacks': queue.callbacks,
+                'latency_avg': (queue.latency_total / queue.callbacks
+                                if queue.callbacks else 0.0),
+                'latency_max': queue.latency_max,
+            }) for queue in self._queues.values())
+
+    def close(self):
+        """Stop the created executor."""
+        if self._own_executor:
+            self._executor.shutdown(wait=False)
+
+
+class _Scheduler(object):
+    """Delayed calls run in deadline order by a single daemon thread."""
+
+    def __init__(self):
+        self._condition = Condition()
+        self._calls = []  # Heap of (deadline, sequence, function, args)
+        self._sequence = itertools.count()
+        self._thread = None
+
+    def call_later(self, delay, function, *args):
+        """Call function with args after delay seconds."""
+        with self._condition:
+            heapq.heappush(self._calls, (monotonic() + delay,
+                                         next(self._sequence), function,
+                                         args))
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name="Throttle")
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._calls or \
+                        self._calls[0][0] > monotonic():
+                    self._condition.wait(
+                        self._calls[0][0] - monotonic()
+                        if self._calls else None)
+                _, _, function, args = heapq.heappop(self._calls)
+            try:
+                function(*args)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error in delayed call")
+
+
+_SCHEDULER = _Scheduler()
+
+
+class Throttle(object):
+    """Latest-wins throttling of notifications by type.
+
+    The first notification of a type is handled at once and opens a window.
+    Notifications received within the window replace each other, the latest
+    one is handled when the window ends (and opens a new window). Trailing
+    notifications of all throttles are handled by one shared thread.
+    """
+
+    def __init__(self, windows, handler):
+        """Create a new throttle.
+
+        :param windows: Window duration in seconds by notification type.
+            Types without window are handled at once
+        :param handler: Function handling a notification
+        """
+        self._windows = dict(windows)
+        self._handler = handler
+        self._lock = Lock()
+        self._deadlines = {}
+        self._pending = {}
+        self._scheduled = set()
+        self._dropped = {}
+
+    @property
+    def dropped(self):
+        """Return number of notifications replaced by a newer one by type."""
+        with self._lock:
+            return dict(self._dropped)
+
+    def submit(self, kind, notification):
+        """Handle notification now or at the end of the window of its type.
+
+        :param kind: Notification type
+        :param notification: Notification passed to the handler
+        """
+        window = self._windows.get(kind)
+        if not window:
+            self._handler(notification)
+            return
+        now = monotonic()
+        with self._lock:
+            deadline = self._deadlines.get(kind, 0)
+            if now >= deadline and kind not in self._pending:
+                self._deadlines[kind] = now + window
+            else:
+                if kind in self._pending:
+                    self._dropped[kind] = self._dropped.get(kind, 0) + 1
+                self._pending[kind] = notification
+                if kind not in self._scheduled:
+                    self._scheduled.add(kind)
+                    _SCHEDULER.call_later(max(0, deadline - now),
+                                          self._flush, kind)
+                return
+        self._handler(notification)
+
+    def _flush(self, kind):
+        with self._lock:
+            self._scheduled.discard(kind)
+            notification = self._pending.pop(kind, None)
+            if notification is None:
+                return
+            self._deadlines[kind] = monotonic() + self._windows[kind]
+        try:
+            self._handler(notification)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Error handling %s notification", kind)
+
+    def cancel(self):
+        """Drop pending notifications."""
+        with self._lock:
+            self._pending.clear()
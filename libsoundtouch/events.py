@@ -0,0 +1,319 @@
+"""Event streams of Bose Soundtouch notifications."""
+
+from collections import deque
+from threading import Condition
+
+from .dispatch import DEFAULT_MAX_QUEUE_SIZE
+from .utils import DispatchPolicy
+
+try:
+    from time import monotonic
+except ImportError:  # Python 2.7
+    from time import time as monotonic
+
+
+class DeviceEvent(object):
+    """Notification of a device: new state of the device."""
+
+    __slots__ = ('_device', '_value')
+
+    type = None
+
+    def __init__(self, device, value):
+        """Create a new event.
+
+        :param device: Notified device
+        :param value: New value
+        """
+        self._device = device
+        self._value = value
+
+    @property
+    def device(self):
+        """Return notified device."""
+        return self._device
+
+    @property
+    def value(self):
+        """Return new value."""
+        return self._value
+
+    def __repr__(self):
+        """Return a String representation."""
+        return '%s(%s, %r)' % (type(self).__name__, self._device.host,
+                               self._value)
+
+
+class VolumeEvent(DeviceEvent):
+    """Volume updated. value is a Volume."""
+
+    __slots__ = ()
+
+    type = 'volume'
+
+
+class StatusEvent(DeviceEvent):
+    """Now playing updated. value is a Status."""
+
+    __slots__ = ()
+
+    type = 'status'
+
+
+class PresetsEvent(DeviceEvent):
+    """Presets updated. value is a list of Preset."""
+
+    __slots__ = ()
+
+    type = 'presets'
+
+
+class ZoneStatusEvent(DeviceEvent):
+    """Zone updated. value is a ZoneStatus or None without zone."""
+
+    __slots__ = ()
+
+    type = 'zone_status'
+
+
+class DeviceInfoEvent(DeviceEvent):
+    """Device information updated. value is a Config."""
+
+    __slots__ = ()
+
+    type = 'device_info'
+
+
+class ConnectionStateEvent(DeviceEvent):
+    """Websocket connection changed. value is a ConnectionEvent."""
+
+    __slots__ = ()
+
+    type = 'connection'
+
+
+class NowSelectionEvent(DeviceEvent):
+    """Selected preset updated. value is a Preset."""
+
+    __slots__ = ()
+
+    type = 'now_selection'
+
+
+class RecentsEvent(DeviceEvent):
+    """Recently played contents updated. value is a list of Recent."""
+
+    __slots__ = ()
+
+    type = 'recents'
+
+
+class SourcesEvent(DeviceEvent):
+    """Sources updated. value is a list of SourceItem."""
+
+    __slots__ = ()
+
+    type = 'sources'
+
+
+class BassEvent(DeviceEvent):
+    """Bass updated. value is a Bass."""
+
+    __slots__ = ()
+
+    type = 'bass'
+
+
+class NetworkConnectionEvent(DeviceEvent):
+    """Network connection changed. value is a NetworkConnection."""
+
+    __slots__ = ()
+
+    type = 'connection_state'
+
+
+class GroupEvent(DeviceEvent):
+    """Group updated. value is a Group or None without group."""
+
+    __slots__ = ()
+
+    type = 'group'
+
+
+# Event class by event type, devices have add_<type>_listener methods
+EVENT_TYPES = dict((event_class.type, event_class) for event_class in (
+    VolumeEvent, StatusEvent, PresetsEvent, ZoneStatusEvent,
+    DeviceInfoEvent, ConnectionStateEvent, NowSelectionEvent, RecentsEvent,
+    SourcesEvent, BassEvent, NetworkConnectionEvent, GroupEvent))
+
+
+class _StreamListener(object):
+    """Listener putting the events of a device into a stream."""
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, stream, device, event_class):
+        self._stream = stream
+        self._device = device
+        self._event_class = event_class
+
+    def __call__(self, value):
+        # pylint: disable=protected-access
+        self._stream._put(self._event_class(self._device, value))
+
+
+class _Stream(object):
+    """Bounded buffer of the events of devices, filled by listeners.
+
+    Listeners never wait: when the buffer is full, events are dropped
+    according to the policy. With COALESCE, a pending event is replaced by
+    a newer event of the same device and type.
+    """
+
+    def __init__(self, devices, types, max_size, policy, lock):
+        types = list(types) if types is not None else list(EVENT_TYPES)
+        for event_type in types:
+            if event_type not in EVENT_TYPES:
+                raise ValueError("Unknown event type: %s" % event_type)
+        self._max_size = max_size
+        self._policy = policy
+        self._lock = lock
+        self._events = deque()
+        self._dropped = 0
+        self._closed = False
+        self._listeners = []
+        for device in devices:
+            for event_type in types:
+                listener = _StreamListener(self, device,
+                                           EVENT_TYPES[event_type])
+                getattr(device, 'add_%s_listener' % event_type)(listener)
+                self._listeners.append((device, event_type, listener))
+
+    @property
+    def dropped(self):
+        """Return number of events dropped or replaced by the buffer."""
+        with self._lock:
+            return self._dropped
+
+    @property
+    def closed(self):
+        """Return True if the stream is closed."""
+        with self._lock:
+            return self._closed
+
+    def _wakeup(self):
+        """Wake up the consumer. Called with the lock held."""
+        raise NotImplementedError()
+
+    def _put(self, event):
+        with self._lock:
+            if self._closed:
+                return
+            events = self._events
+            if self._policy == DispatchPolicy.COALESCE:
+                for index, pending in enumerate(events):
+                    if type(pending) is type(event) and \
+                            pending.device is event.device:
+                        events[index] = event
+                        self._dropped += 1
+                        return
+            if len(events) >= self._max_size:
+                self._dropped += 1
+                if self._policy == DispatchPolicy.DROP_NEWEST:
+                    return
+                events.popleft()
+            events.append(event)
+            self._wakeup()
+
+    def close(self):
+        """Stop the stream: remove its listeners from the devices.
+
+        Pending events are dropped.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._events.clear()
+            self._wakeup()
+        for device, event_type, listener in self._listeners:
+            getattr(device, 'remove_%s_listener' % event_type)(listener)
+        del self._listeners[:]
+
+
+class EventStream(_Stream):
+    """Iterator over the events of one or more devices.
+
+    Events are typed (VolumeEvent, StatusEvent...) and buffered in a bounded
+    buffer until read. Iteration blocks until an event is received, the
+    stream is closed or, with a timeout, the stream stays idle for too long.
+
+    ::
+
+        with EventStream(devices, types=('volume',)) as events:
+            for event in events:
+                print(event.device.host, event.value.actual)
+    """
+
+    def __init__(self, devices, types=None, max_size=DEFAULT_MAX_QUEUE_SIZE,
+                 policy=DispatchPolicy.COALESCE, timeout=None):
+        """Create a new event stream.
+
+        :param devices: Devices (SoundTouchDevice or AsyncSoundTouchDevice)
+        :param types: Event types to read (volume, status, presets,
+            zone_status, device_info, connection, now_selection, recents,
+            sources, bass, connection_state, group). All types if not set
+        :param max_size: Max pending events. Default 100
+        :param policy: DispatchPolicy of the buffer. Default COALESCE
+        :param timeout: Max idle time in seconds: iteration ends when no
+            event is received within the timeout. Wait forever if not set
+        """
+        super(EventStream, self).__init__(devices, types, max_size, policy,
+                                          Condition())
+        self._timeout = timeout
+
+    def _wakeup(self):
+        self._lock.notify_all()
+
+    def get(self, timeout=None):
+        """Return next event, wait for it if needed.
+
+        Return None if the stream is closed or no event is received within
+        the timeout.
+
+        :param timeout: Max time to wait in seconds. Wait forever if not set
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._lock:
+            while not self._events:
+                if self._closed:
+                    return None
+                if deadline is None:
+                    self._lock.wait()
+                else:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        return None
+                    self._lock.wait(remaining)
+            return self._events.popleft()
+
+    def __iter__(self):
+        """Return the stream."""
+        return self
+
+    def __next__(self):
+        """Return next event."""
+        event = self.get(self._timeout)
+        if event is None:
+            raise StopIteration()
+        return event
+
+    next = __next__  # Python 2.7
+
+    def __enter__(self):
+        """Enter the context."""
+        return self
+
+    def __exit__(self, *args):
+        """Close the stream when leaving the context."""
+        self.close()
@@ -0,0 +1,397 @@
+"""Websocket notifications of many Bose Soundtouch devices."""
+
+import heapq
+import itertools
+import logging
+import socket
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, Thread
+
+try:
+    import selectors
+except ImportError:  # Python 2.7
+    import selectors2 as selectors
+
+import websocket
+from websocket import ABNF
+
+from .reconnect import DEFAULT_PING_INTERVAL, DEFAULT_PING_TIMEOUT
+
+try:
+    from time import monotonic
+except ImportError:  # Python 2.7
+    from time import time as monotonic
+
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 5
+
+_RECV_SIZE = 65536
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class _FrameReader(object):
+    """Websocket frames decoded from the bytes received so far.
+
+    Bytes are buffered until a frame is complete, so that reading a
+    partially received frame never blocks.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._fragments = None
+
+    def feed(self, data):
+        """Buffer received bytes."""
+        self._buffer.extend(data)
+
+    def _next_frame(self):
+        buf = self._buffer
+        if len(buf) < 2:
+            return None
+        offset = 2
+        length = buf[1] & 0x7f
+        if length == 126:
+            offset = 4
+            if len(buf) < offset:
+                return None
+            length = struct.unpack('!H', bytes(buf[2:4]))[0]
+        elif length == 127:
+            offset = 10
+            if len(buf) < offset:
+                return None
+            length = struct.unpack('!Q', bytes(buf[2:10]))[0]
+        mask = None
+        if buf[1] & 0x80:
+            mask = buf[offset:offset + 4]
+            offset += 4
+        if len(buf) < offset + length:
+            return None
+        payload = buf[offset:offset + length]
+        if mask is not None:
+            payload = bytearray(byte ^ mask[index % 4]
+                                for index, byte in enumerate(payload))
+        fin = buf[0] & 0x80
+        opcode = buf[0] & 0x0f
+        del buf[:offset + length]
+        return fin, opcode, bytes(payload)
+
+    def frames(self):
+        """Return (opcode, payload) of the complete frames.
+
+        Fragmented messages are returned once their last fragment is
+        received.
+        """
+        frames = []
+        while True:
+            frame = self._next_frame()
+            if frame is None:
+                return frames
+            fin, opcode, payload = frame
+            if opcode == ABNF.OPCODE_CONT:
+                if self._fragments is None:
+                    continue
+                self._fragments[1].append(payload)
+                if fin:
+                    opcode, fragments = self._fragments
+                    self._fragments = None
+                    frames.append((opcode, b''.join(fragments)))
+            elif not fin and opcode < ABNF.OPCODE_CLOSE:
+                self._fragments = (opcode, [payload])
+            else:
+                frames.append((opcode, payload))
+
+
+class NotificationHub(object):
+    """Websocket notifications of a fleet of Soundtouch devices.
+
+    One thread reads the websockets of all devices using a selector, so the
+    number of threads doesn't grow with the number of devices. Frames are
+    dispatched to the notification handling of each device. Sockets are
+    only read when data is available and bytes are buffered per websocket:
+    a slow device doesn't delay the notifications of the others.
+
+    Connections are opened in the thread calling add(). Idle websockets are
+    pinged, a websocket without any frame received within the ping timeout
+    is dropped. Pings and pongs are queued and written when the socket is
+    writable. Devices are told their websocket is lost to schedule its
+    reconnection: reconnections are opened one at a time by a single
+    connection thread.
+    """
+
+    def __init__(self, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT,
+                 ping_interval=DEFAULT_PING_INTERVAL,
+                 ping_timeout=DEFAULT_PING_TIMEOUT):
+        """Create a new notification hub.
+
+        :param connect_timeout: Websocket connection timeout in seconds.
+            Default 10
+        :param read_timeout: Socket timeout in seconds of the opened
+            websockets. Default 5
+        :param ping_interval: Idle time in seconds before pinging a
+            websocket. 0 to disable. Default 30
+        :param ping_timeout: Max time in seconds to wait for a pong.
+            Default 10
+        """
+        self._connect_timeout = connect_timeout
+        self._read_timeout = read_timeout
+        self._ping_interval = ping_interval
+        self._ping_timeout = ping_timeout
+        self._activity = {}
+        self._readers = {}
+        self._closed = False
+        self._selector = selectors.DefaultSelector()
+        self._lock = Lock()
+        self._connections = {}
+        self._pending = []
+        self._outgoing = {}  # Websocket: bytes to write
+        self._reconnects = []  # Heap of (deadline, sequence, device)
+        self._sequence = itertools.count()
+        self._connector = None
+        self._thread = None
+        self._running = False
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._selector.register(self._wakeup_reader, selectors.EVENT_READ)
+
+    @property
+    def closed(self):
+        """Return True if the hub is closed."""
+        with self._lock:
+            return self._closed
+
+    @property
+    def devices(self):
+        """Return devices with an open websocket."""
+        with self._lock:
+            return list(self._connections.values())
+
+    def _wakeup(self):
+        try:
+            self._wakeup_writer.send(b'\0')
+        except socket.error:
+            pass
+
+    def add(self, device):
+        """Open device websocket and read its notifications.
+
+        :param device: SoundTouchDevice
+        """
+        web_socket = websocket.create_connection(
+            "ws://{0}:{1}/".format(device.host, device.ws_port),
+            timeout=self._connect_timeout, subprotocols=['gabbo'])
+        web_socket.settimeout(self._read_timeout)
+        with self._lock:
+            if self._closed:
+                web_socket.close()
+                return
+        # pylint: disable=protected-access
+        device._on_open(web_socket)
+        with self._lock:
+            self._pending.append((web_socket, device))
+            if self._thread is None:
+                self._running = True
+                self._thread = Thread(target=self._run,
+                                      name="NotificationHub")
+                self._thread.daemon = True
+                self._thread.start()
+        self._wakeup()
+
+    def remove(self, device):
+        """Close device websocket and cancel its reconnection.
+
+        :param device: SoundTouchDevice
+        """
+        with self._lock:
+            self._pending.append((None, device))
+            self._reconnects = [entry for entry in self._reconnects
+                                if entry[2] is not device]
+            heapq.heapify(self._reconnects)
+        self._wakeup()
+
+    def schedule_reconnect(self, device, delay):
+        """Open device websocket again after a delay.
+
+        :param device: SoundTouchDevice
+        :param delay: Delay in seconds
+        """
+        with self._lock:
+            if self._closed:
+                return
+            heapq.heappush(self._reconnects, (monotonic() + delay,
+                                              next(self._sequence), device))
+        self._wakeup()
+
+    def close(self):
+        """Close all websockets and stop the hub thread."""
+        with self._lock:
+            self._running = False
+            self._closed = True
+            self._reconnects = []
+            thread = self._thread
+            connector = self._connector
+        self._wakeup()
+        if thread is not None:
+            thread.join()
+        if connector is not None:
+            # Pending connections are closed once opened
+            connector.shutdown(wait=False)
+        self._selector.close()
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
+
+    def _apply_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for web_socket, device in pending:
+            if web_socket is not None:
+                self._selector.register(web_socket.sock, selectors.EVENT_READ,
+                                        web_socket)
+                self._activity[web_socket] = [monotonic(), None]
+                self._readers[web_socket] = _FrameReader()
+                with self._lock:
+                    self._connections[web_socket] = device
+            else:
+                with self._lock:
+                    connections = [connection for connection, owner
+                                   in self._connections.items()
+                                   if owner is device]
+                for connection in connections:
+                    self._disconnect(connection)
+
+    def _disconnect(self, web_socket, lost=False):
+        with self._lock:
+            device = self._connections.pop(web_socket, None)
+        if device is None:
+            return
+        self._activity.pop(web_socket, None)
+        self._readers.pop(web_socket, None)
+        self._outgoing.pop(web_socket, None)
+        try:
+            self._selector.unregister(web_socket.sock)
+        except (KeyError, ValueError):
+            pass
+        try:
+            web_socket.close()
+        except Exception:  # pylint: disable=broad-except
+            pass
+        # pylint: disable=protected-access
+        device._on_close(web_socket)
+        if lost:
+            device._on_connection_lost(self)
+
+    def _read(self, web_socket):
+        # pylint: disable=protected-access
+        device = self._connections[web_socket]
+        try:
+            # The socket is readable: recv doesn't block
+            data = web_socket.sock.recv(_RECV_SIZE)
+        except Exception as error:  # pylint: disable=broad-except
+            device._on_error(web_socket, error)
+            self._disconnect(web_socket, lost=True)
+            return
+        if not data:
+            self._disconnect(web_socket, lost=True)
+            return
+        reader = self._readers[web_socket]
+        reader.feed(data)
+        for opcode, payload in reader.frames():
+            self._activity[web_socket] = [monotonic(), None]
+            if opcode == ABNF.OPCODE_CLOSE:
+                self._disconnect(web_socket, lost=True)
+                return
+            if opcode == ABNF.OPCODE_PING:
+                self._send(web_socket, ABNF.OPCODE_PONG, payload)
+            elif opcode == ABNF.OPCODE_TEXT:
+                try:
+                    device._on_message(web_socket, payload.decode('utf-8'))
+                except Exception:  # pylint: disable=broad-except
+                    _LOGGER.exception("Error handling notification of %s",
+                                      device.host)
+
+    def _keepalive(self):
+        """Ping idle websockets and drop the ones not answering."""
+        now = monotonic()
+        for web_socket, (last_frame, last_ping) in \
+                list(self._activity.items()):
+            if last_ping is not None and now - last_ping > self._ping_timeout:
+                # pylint: disable=protected-access
+                self._connections[web_socket]._on_error(
+                    web_socket, "ping timeout")
+                self._disconnect(web_socket, lost=True)
+            elif last_ping is None and \
+                    now - last_frame >= self._ping_interval:
+                self._send(web_socket, ABNF.OPCODE_PING)
+                self._activity[web_socket][1] = now
+
+    def _send(self, web_socket, opcode, payload=b''):
+        """Queue a frame, written once the socket is writable."""
+        outgoing = self._outgoing.get(web_socket)
+        if outgoing is None:
+            outgoing = self._outgoing[web_socket] = bytearray()
+            self._selector.modify(web_socket.sock, selectors.EVENT_READ |
+                                  selectors.EVENT_WRITE, web_socket)
+        outgoing.extend(ABNF.create_frame(payload, opcode).format())
+
+    def _write(self, web_socket):
+        outgoing = self._outgoing[web_socket]
+        try:
+            # The socket is writable: send doesn't block
+            sent = web_socket.sock.send(bytes(outgoing))
+        except Exception as error:  # pylint: disable=broad-except
+            # pylint: disable=protected-access
+            self._connections[web_socket]._on_error(web_socket, error)
+            self._disconnect(web_socket, lost=True)
+            return
+        del outgoing[:sent]
+        if not outgoing:
+            del self._outgoing[web_socket]
+            self._selector.modify(web_socket.sock, selectors.EVENT_READ,
+                                  web_socket)
+
+    def _reconnect_due(self):
+        """Start the due reconnections. Return delay until the next one."""
+        now = monotonic()
+        with self._lock:
+            while self._reconnects and self._reconnects[0][0] <= now:
+                device = heapq.heappop(self._reconnects)[2]
+                if self._connector is None:
+                    self._connector = ThreadPoolExecutor(1)
+                # pylint: disable=protected-access
+                self._connector.submit(device._reconnect_hub, self)
+            if not self._reconnects:
+                return None
+            return self._reconnects[0][0] - now
+
+    def _run(self):
+        keepalive = min(self._ping_interval, self._ping_timeout) / 2.0 \
+            if self._ping_interval else None
+        while True:
+            self._apply_pending()
+            with self._lock:
+                if not self._running:
+                    break
+            if self._ping_interval:
+                self._keepalive()
+            timeout = self._reconnect_due()
+            if keepalive is not None:
+                timeout = keepalive if timeout is None \
+                    else min(timeout, keepalive)
+            for key, events in self._selector.select(timeout):
+                if key.fileobj is self._wakeup_reader:
+                    try:
+                        while self._wakeup_reader.recv(4096):
+                            pass
+                    except socket.error:
+                        pass
+                    continue
+                if events & selectors.EVENT_WRITE and \
+                        key.data in self._outgoing:
+                    self._write(key.data)
+                if events & selectors.EVENT_READ and \
+                        key.data in self._connections:
+                    self._read(key.data)
+        for web_socket in list(self._connections):
+            self._disconnect(web_socket)
@@ -0,0 +1,140 @@
+"""Websocket reconnection of Bose Soundtouch devices."""
+
+import random
+from threading import Lock
+
+from .utils import ConnectionEvent
+
+try:
+    from time import monotonic
+except ImportError:  # Python 2.7
+    from time import time as monotonic
+
+DEFAULT_PING_INTERVAL = 30
+DEFAULT_PING_TIMEOUT = 10
+
+
+class Backoff(object):
+    """Jittered exponential delays between reconnection attempts.
+
+    The delay doubles (by default) after each failed attempt up to a
+    maximum. A random part is removed from each delay so that devices
+    disconnected at the same time (Wi-Fi outage) don't reconnect together.
+    """
+
+    def __init__(self, initial=1, maximum=60, factor=2, jitter=0.5):
+        """Create a new backoff.
+
+        :param initial: Delay in seconds before the first attempt. Default 1
+        :param maximum: Max delay in seconds. Default 60
+        :param factor: Delay multiplier after each attempt. Default 2
+        :param jitter: Max part of the delay randomly removed (0 to 1).
+            Default 0.5
+        """
+        self._initial = initial
+        self._maximum = maximum
+        self._factor = factor
+        self._jitter = jitter
+
+    def delay(self, attempt):
+        """Return delay in seconds before an attempt (counted from 0)."""
+        delay = min(self._maximum, self._initial * self._factor ** attempt)
+        return delay - delay * self._jitter * random.random()
+
+
+class Connection(object):
+    """Websocket connection state and counters of a device.
+
+    Record connections and disconnections, give reconnection delays and
+    tell when a connection is a reconnection, whose missed notifications
+    require a resync of the states.
+    """
+
+    def __init__(self, backoff=None):
+        """Create a new connection record.
+
+        :param backoff: Backoff of the reconnection attempts
+        """
+        self._backoff = backoff if backoff is not None else Backoff()
+        self._lock = Lock()
+        self._state = ConnectionEvent.DISCONNECTED
+        self._attempt = 0
+        self._connects = 0
+        self._disconnects = 0
+        self._retries = 0
+        self._resyncs = 0
+        self._down_since = None
+        self._downtime = 0.0
+        self._last_error = None
+
+    @property
+    def state(self):
+        """Return CONNECTED or DISCONNECTED."""
+        with self._lock:
+            return self._state
+
+    def opened(self):
+        """Record the websocket is connected.
+
+        Return True if it is a reconnection.
+        """
+        with self._lock:
+            self._state = ConnectionEvent.CONNECTED
+            self._attempt = 0
+            self._connects += 1
+            if self._down_since is not None:
+                self._downtime += monotonic() - self._down_since
+                self._down_since = None
+            return self._connects > 1
+
+    def closed(self):
+        """Record the websocket is closed.
+
+        Return True if it was connected.
+        """
+        with self._lock:
+            if self._state != ConnectionEvent.CONNECTED:
+                return False
+            self._state = ConnectionEvent.DISCONNECTED
+            self._disconnects += 1
+            self._down_since = monotonic()
+            return True
+
+    def failed(self, error):
+        """Record a connection error."""
+        with self._lock:
+            self._last_error = str(error)
+
+    def next_delay(self):
+        """Return delay in seconds before the next reconnection attempt."""
+        with self._lock:
+            delay = self._backoff.delay(self._attempt)
+            self._attempt += 1
+            self._retries += 1
+        return delay
+
+    def resynced(self):
+        """Record the states have been resynced after a reconnection."""
+        with self._lock:
+            self._resyncs += 1
+
+    @property
+    def stats(self):
+        """Return connection state and counters.
+
+        downtime is the time in seconds spent disconnected between a
+        disconnection and the next connection.
+        """
+        with self._lock:
+            downtime = self._downtime
+            if self._down_since is not None:
+                downtime += monotonic() - self._down_since
+            return {
+                'state': self._state.value,
+                'connects': self._connects,
+                'disconnects': self._disconnects,
+                'retries': self._retries,
+                'resyncs': self._resyncs,
+                'downtime': downtime,
+                'last_error': self._last_error,
+            }
@@ -0,0 +1,300 @@
+"""Live registry of Bose Soundtouch devices."""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition
+
+from requests.exceptions import RequestException
+from zeroconf import Zeroconf, ServiceBrowser
+
+from .device import SoundTouchDevice
+from .utils import RegistryEvent, SoundtouchDeviceListener
+
+try:
+    from time import monotonic
+except ImportError:  # Python 2.7
+    from time import time as monotonic
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_TYPE = "_soundtouch._tcp.local."
+
+
+class DeviceRegistry(object):
+    """Live index of the devices of the local network by id, name and IP.
+
+    Once started, the registry browses mDNS services until stopped: devices
+    are added when their service is announced, moved when their address
+    changes and removed when their service is withdrawn. A speaker is
+    indexed once by device id whatever the number of interfaces or services
+    it is seen on. Listeners are called with a RegistryEvent and the device.
+
+    ::
+
+        with DeviceRegistry() as registry:
+            registry.add_listener(lambda event, device: print(event, device))
+            registry.wait(expected_count=3, timeout=5)
+            kitchen = registry.by_name('Kitchen')[0]
+    """
+
+    def __init__(self, zeroconf=None, transport=None, max_workers=16):
+        """Create a new registry.
+
+        :param zeroconf: Zeroconf instance shared with other services. Left
+            open by stop(). The registry creates its own if not set
+        :param transport: Transport shared by the devices
+        :param max_workers: Max concurrent resolutions and configuration
+            fetches. Default 16
+        """
+        self._zeroconf = zeroconf
+        self._own_zeroconf = zeroconf is None
+        self._transport = transport
+        self._max_workers = max_workers
+        self._lock = Condition()
+        self._devices = {}  # Device id: device
+        self._by_name = {}  # Name: set of device ids
+        self._by_ip = {}  # Address: device id
+        self._services = {}  # Service name: device id
+        self._device_services = {}  # Device id: set of service names
+        self._listeners = []
+        self._executor = None
+        self._browser = None
+
+    def __enter__(self):
+        """Start the registry."""
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        """Stop the registry when leaving the context."""
+        self.stop()
+
+    def start(self):
+        """Start browsing the mDNS services."""
+        if self._browser is not None:
+            return
+        if self._zeroconf is None:
+            self._zeroconf = Zeroconf()
+        self._executor = ThreadPoolExecutor(self._max_workers)
+        listener = SoundtouchDeviceListener(self._on_service, self._executor,
+                                            self._on_service_removed)
+        _LOGGER.debug("Starting registry...")
+        self._browser = ServiceBrowser(self._zeroconf, SERVICE_TYPE,
+                                       listener)
+
+    def stop(self):
+        """Stop browsing. Indexed devices are kept."""
+        if self._browser is None:
+            return
+        self._browser.cancel()
+        self._browser = None
+        self._executor.shutdown(wait=False)
+        self._executor = None
+        if self._own_zeroconf:
+            self._zeroconf.close()
+            self._zeroconf = None
+        _LOGGER.debug("Registry stopped")
+
+    @property
+    def devices(self):
+        """Return indexed devices."""
+        with self._lock:
+            return list(self._devices.values())
+
+    def __len__(self):
+        """Return number of indexed devices."""
+        with self._lock:
+            return len(self._devices)
+
+    def __contains__(self, device_id):
+        """Return True if the device is indexed."""
+        with self._lock:
+            return device_id in self._devices
+
+    def __iter__(self):
+        """Iterate over a copy of the indexed devices."""
+        return iter(self.devices)
+
+    def get(self, device_id):
+        """Return device by id. None if unknown."""
+        with self._lock:
+            return self._devices.get(device_id)
+
+    def by_name(self, name):
+        """Return list of devices of a name."""
+        with self._lock:
+            return [self._devices[device_id]
+                    for device_id in self._by_name.get(name, ())]
+
+    def by_ip(self, ip_address):
+        """Return device by IP (of any of its interfaces). None if unknown."""
+        with self._lock:
+            device_id = self._by_ip.get(ip_address)
+            return self._devices.get(device_id) if device_id else None
+
+    def wait(self, expected_count=1, timeout=None):
+        """Wait for expected_count devices to be indexed.
+
+        Return True if they are indexed before the timeout.
+
+        :param expected_count: Number of devices to wait for. Default 1
+        :param timeout: Max time to wait in seconds. Wait forever if not set
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._lock:
+            while len(self._devices) < expected_count:
+                if deadline is None:
+                    self._lock.wait()
+                else:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._lock.wait(remaining)
+            return True
+
+    def add_listener(self, listener):
+        """Add a listener called with a RegistryEvent and the device."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Remove a listener."""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def clear_listeners(self):
+        """Clear listeners."""
+        del self._listeners[:]
+
+    @property
+    def listeners(self):
+        """Return listeners."""
+        return self._listeners
+
+    def _notify(self, event, device):
+        """Run listeners, a failing listener doesn't stop the others."""
+        for listener in list(self._listeners):
+            try:
+                listener(event, device)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error in registry listener")
+
+    def _unindex_name(self, device_id, name):
+        """Remove the name of a device. Called with the lock held."""
+        ids = self._by_name.get(name, set())
+        ids.discard(device_id)
+        if not ids:
+            self._by_name.pop(name, None)
+
+    def add(self, device, service=None):
+        """Index a device, fetching its configuration if needed.
+
+        A device already indexed with the same id is kept: its address is
+        updated if the new one is the address of the speaker (see
+        Config.device_ip), else the new address is indexed as one more
+        interface. Return the indexed device.
+
+        :param device: Device to index
+        :param service: mDNS service name of the device
+        """
+        # pylint: disable=protected-access
+        config = device.config
+        device_id = config.device_id
+        event = None
+        address = None  # New address of an indexed device
+        with self._lock:
+            if service is not None:
+                self._services[service] = device_id
+                self._device_services.setdefault(device_id, set()).add(
+                    service)
+            known = self._devices.get(device_id)
+            if known is None:
+                known = device
+                self._devices[device_id] = device
+                self._by_name.setdefault(config.name, set()).add(device_id)
+                event = RegistryEvent.ADDED
+            else:
+                moved = device.host != known.host and \
+                    device.host == config.device_ip
+                if known.config.name != config.name:
+                    self._unindex_name(device_id, known.config.name)
+                    self._by_name.setdefault(config.name, set()).add(
+                        device_id)
+                if moved:
+                    # The former address is no longer the speaker's one
+                    self._by_ip.pop(known.host, None)
+                    address = (device.host, device.port)
+                elif known.config != config:
+                    address = (known.host, known.port)
+            self._by_ip[device.host] = device_id
+            if address is None or address[0] == known.host:
+                self._by_ip[known.host] = device_id
+            self._lock.notify_all()
+        if address is not None:
+            # Restarts the notifications of a moved device: not run with the
+            # lock held
+            try:
+                known._update(address[0], address[1], config)
+                event = RegistryEvent.UPDATED
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Unable to update device %s (host: %s)",
+                                  config.name, address[0])
+        if event is not None:
+            _LOGGER.info("Device %s %s (host: %s)", config.name, event.value,
+                         known.host)
+            self._notify(event, known)
+        return known
+
+    def add_host(self, host, port=8090):
+        """Fetch the configuration of a host and index its device.
+
+        Return the indexed device.
+        """
+        return self.add(SoundTouchDevice(host, port,
+                                         transport=self._transport))
+
+    def remove(self, device_id):
+        """Remove a device. Return the removed device, None if unknown."""
+        with self._lock:
+            device = self._devices.pop(device_id, None)
+            if device is None:
+                return None
+            self._unindex_name(device_id, device.config.name)
+            for address in [address for address, known_id
+                            in self._by_ip.items() if known_id == device_id]:
+                del self._by_ip[address]
+            for service in self._device_services.pop(device_id, ()):
+                self._services.pop(service, None)
+        _LOGGER.info("Device %s removed (host: %s)", device.config.name,
+                     device.host)
+        self._notify(RegistryEvent.REMOVED, device)
+        return device
+
+    def _on_service(self, name, host, port):
+        """Service added or updated, run by the resolving threads."""
+        with self._lock:
+            device_id = self._by_ip.get(host)
+            known = self._devices.get(device_id)
+            if known is not None and known.port == port and \
+                    self._services.get(name) == device_id:
+                return
+        device = SoundTouchDevice(host, port, transport=self._transport,
+                                  lazy=True)
+        try:
+            device.load_config()
+        except RequestException as error:
+            _LOGGER.warning("Unable to fetch %s configuration (host: %s): "
+                            "%s", name, host, error)
+            return
+        self.add(device, name)
+
+    def _on_service_removed(self, name):
+        """Remove the device when its last service is removed."""
+        with self._lock:
+            device_id = self._services.pop(name, None)
+            services = self._device_services.get(device_id)
+            if services is None:
+                return
+            services.discard(name)
+            if services:
+                return
+        self.remove(device_id)
@@ -0,0 +1,201 @@
+"""Discovery of Bose Soundtouch devices by scanning an IPv4 network.
+
+Fallback for networks where mDNS is filtered.
+"""
+
+import errno
+import logging
+import socket
+import struct
+from concurrent.futures import ThreadPoolExecutor, wait, \
+    TimeoutError as FutureTimeoutError
+
+try:
+    import selectors
+except ImportError:  # Python 2.7
+    import selectors2 as selectors
+
+from .device import SoundTouchDevice
+
+try:
+    from time import monotonic
+except ImportError:  # Python 2.7
+    from time import time as monotonic
+
+DEFAULT_CONNECT_TIMEOUT = 0.5
+DEFAULT_MAX_CONNECTIONS = 256
+
+# connect_ex results of a connection in progress (10035 is WSAEWOULDBLOCK)
+_IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN, 10035)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _addresses(first, last):
+    """Yield the IPv4 addresses from first to last (integers)."""
+    value = first
+    while value <= last:
+        yield socket.inet_ntoa(struct.pack('!I', value))
+        value += 1
+
+
+def network_hosts(network):
+    """Return an iterator over the host addresses of an IPv4 network.
+
+    Addresses are generated on demand. Network and broadcast addresses are
+    left out, except for /31 and /32 networks.
+
+    :param network: CIDR notation (192.168.1.0/24) or single address
+    """
+    address, _, prefix = network.partition('/')
+    prefix = int(prefix) if prefix else 32
+    if not 0 <= prefix <= 32:
+        raise ValueError("Invalid network: %s" % network)
+    mask = (0xffffffff << (32 - prefix)) & 0xffffffff
+    first = struct.unpack('!I', socket.inet_aton(address))[0] & mask
+    last = first | (~mask & 0xffffffff)
+    if prefix < 31:
+        first += 1
+        last -= 1
+    return _addresses(first, last)
+
+
+def _connect(host, port):
+    """Start a non-blocking connection. Return the socket, None if refused."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    try:
+        result = sock.connect_ex((host, port))
+    except socket.error:
+        result = -1
+    if result == 0 or result in _IN_PROGRESS:
+        return sock
+    sock.close()
+    return None
+
+
+def scan_hosts(network, port=8090, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+               max_connections=DEFAULT_MAX_CONNECTIONS, rate=None):
+    """Probe the hosts of a network, yield each one accepting connections.
+
+    Connections are opened without blocking and watched by a selector: up
+    to max_connections are pending at the same time.
+
+    :param network: IPv4 network in CIDR notation (192.168.1.0/24)
+    :param port: Port to probe. Default 8090
+    :param connect_timeout: Max time in seconds to wait for each connection.
+        Default 0.5
+    :param max_connections: Max pending connections. Default 256
+    :param rate: Max connections opened per second. Not limited if not set
+    """
+    hosts = network_hosts(network)
+    host = next(hosts, None)  # Next host to probe
+    selector = selectors.DefaultSelector()
+    pending = {}  # Socket: (host, deadline)
+    started = 0
+    start = monotonic()
+    try:
+        while host is not None or pending:
+            now = monotonic()
+            # Open new connections within the concurrency and rate limits
+            while host is not None and len(pending) < max_connections:
+                if rate is not None and start + started / float(rate) > now:
+                    break
+                started += 1
+                sock = _connect(host, port)
+                if sock is not None:
+                    pending[sock] = (host, now + connect_timeout)
+                    selector.register(sock, selectors.EVENT_WRITE)
+                host = next(hosts, None)
+            wakeup = min([deadline for _, deadline in pending.values()] or
+                         [now + connect_timeout])
+            if rate is not None and host is not None and \
+                    len(pending) < max_connections:
+                wakeup = min(wakeup, start + started / float(rate))
+            for key, _ in selector.select(max(0, wakeup - now)):
+                sock = key.fileobj
+                address, _ = pending.pop(sock)
+                selector.unregister(sock)
+                connected = sock.getsockopt(socket.SOL_SOCKET,
+                                            socket.SO_ERROR) == 0
+                sock.close()
+                if connected:
+                    _LOGGER.debug("%s:%i is open", address, port)
+                    yield address
+            now = monotonic()
+            for sock, (_, deadline) in list(pending.items()):
+                if deadline <= now:
+                    del pending[sock]
+                    selector.unregister(sock)
+                    sock.close()
+    finally:
+        for sock in pending:
+            selector.unregister(sock)
+            sock.close()
+        selector.close()
+
+
+def scan_devices(network, port=8090, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 max_connections=DEFAULT_MAX_CONNECTIONS, rate=None,
+                 transport=None, max_workers=16, device_timeout=5,
+                 failures=None, registry=None):
+    """Discover devices by probing the hosts of an IPv4 network.
+
+    The configuration of each host accepting connections on the API port
+    is fetched while the scan goes on. Hosts that are not devices are left
+    out.
+
+    :param network: IPv4 network in CIDR notation (192.168.1.0/24)
+    :param port: API port of the devices. Default 8090
+    :param connect_timeout: Max time in seconds to wait for each connection.
+        Default 0.5
+    :param max_connections: Max pending connections. Default 256
+    :param rate: Max connections opened per second. Not limited if not set
+    :param transport: Transport shared by the devices. Its executor fetches
+        the configurations if set
+    :param max_workers: Max concurrent fetches if transport is not set.
+        Default 16
+    :param device_timeout: Max time in seconds to wait for the
+        configurations once the scan is done. Default 5
+    :param failures: Dict filled with the errors of the hosts left out, by
+        host
+    :param registry: DeviceRegistry the devices are added to. Devices
+        already indexed (found by mDNS or a previous scan) are returned
+        instead of new ones
+    """
+    if transport is not None:
+        executor = transport.executor
+    else:
+        executor = ThreadPoolExecutor(max_workers)
+    fetches = []
+    try:
+        for host in scan_hosts(network, port, connect_timeout,
+                               max_connections, rate):
+            known = registry.by_ip(host) if registry is not None else None
+            if known is not None and known.port == port:
+                fetches.append((known, None))
+                continue
+            device = SoundTouchDevice(host, port, transport=transport,
+                                      lazy=True)
+            fetches.append((device, executor.submit(device.load_config)))
+    finally:
+        if transport is None:
+            executor.shutdown(wait=False)
+    wait([future for _, future in fetches if future is not None],
+         device_timeout)
+    devices = []
+    for device, future in fetches:
+        if future is not None:
+            if not future.done():
+                error = FutureTimeoutError()
+            else:
+                error = future.exception()
+            if error is not None:
+                _LOGGER.info("%s is not a device: %s", device.host, error)
+                if failures is not None:
+                    failures[device.host] = error
+                continue
+            if registry is not None:
+                device = registry.add(device)
+        devices.append(device)
+    return devices
@@ -0,0 +1,256 @@
+"""HTTP transports used by Bose Soundtouch devices."""
+
+import logging
+import socket
+import time
+from threading import Condition, Lock
+
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from requests.compat import urlparse, urlunparse
+from requests.exceptions import ConnectTimeout
+
+try:
+    from time import monotonic
+except ImportError:  # Python 2.7
+    from time import time as monotonic
+
+DEFAULT_TIMEOUT = 10
+DEFAULT_POOL_SIZE = 4
+DEFAULT_MAX_WORKERS = 4
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def create_session(pool_size=DEFAULT_POOL_SIZE, pool_connections=2,
+                   pool_block=False):
+    """Create a keep-alive HTTP session.
+
+    Connections to the API and DLNA ports of the device are kept open and
+    reused between requests.
+
+    :param pool_size: Max number of connections kept open per host:port
+    :param pool_connections: Number of host:port pools kept. Default 2
+    :param pool_block: Wait for a free connection instead of opening a new
+        one when the pool of a host:port is exhausted. Default False
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections,
+                          pool_maxsize=pool_size, pool_block=pool_block)
+    session.mount('http://', adapter)
+    return session
+
+
+def _is_ip_address(host):
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(family, host)
+            return True
+        except (socket.error, ValueError):
+            pass
+    return False
+
+
+class _Budget(object):
+    """Semaphore whose acquire supports a timeout on Python 2.7 too."""
+
+    def __init__(self, value):
+        self._condition = Condition()
+        self._value = value
+
+    def acquire(self, blocking=True, timeout=None):
+        """Take a slot. Return False if none is free within the timeout."""
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._condition:
+            while self._value == 0:
+                if not blocking:
+                    return False
+                if deadline is None:
+                    self._condition.wait()
+                else:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._condition.wait(remaining)
+            self._value -= 1
+            return True
+
+    def release(self):
+        """Free a slot."""
+        with self._condition:
+            self._value += 1
+            self._condition.notify()
+
+
+class Transport(object):
+    """HTTP transport of one or several Soundtouch devices.
+
+    Own a keep-alive session and a lazily created thread pool executor.
+    """
+
+    def __init__(self, session=None, timeout=DEFAULT_TIMEOUT,
+                 pool_size=DEFAULT_POOL_SIZE,
+                 max_workers=DEFAULT_MAX_WORKERS):
+        """Create a new transport.
+
+        :param session: requests Session used for all HTTP calls. A new
+            keep-alive session is created if not set
+        :param timeout: HTTP timeout in seconds (or (connect, read) tuple).
+            Default 10
+        :param pool_size: Connection pool size of the created session.
+            Ignored if session is set. Default 4
+        :param max_workers: Max threads of the executor. Default 4
+        """
+        self._own_session = session is None
+        self._session = session if session is not None else create_session(
+            pool_size)
+        self._timeout = timeout
+        self._max_workers = max_workers
+        self._executor = None
+        self._executor_lock = Lock()
+
+    @property
+    def session(self):
+        """Return the HTTP session."""
+        return self._session
+
+    @property
+    def timeout(self):
+        """Return the HTTP timeout."""
+        return self._timeout
+
+    @property
+    def executor(self):
+        """Return the executor used for background work."""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self._max_workers)
+            return self._executor
+
+    def submit(self, function, *args, **kwargs):
+        """Run function in the executor and return its future."""
+        return self.executor.submit(function, *args, **kwargs)
+
+    def get(self, url, **kwargs):
+        """Send a GET request."""
+        kwargs.setdefault('timeout', self._timeout)
+        return self._session.get(url, **kwargs)
+
+    def post(self, url, *args, **kwargs):
+        """Send a POST request."""
+        kwargs.setdefault('timeout', self._timeout)
+        return self._session.post(url, *args, **kwargs)
+
+    def close(self):
+        """Stop the executor and close the created session.
+
+        An injected session is left open: its owner is in charge of it.
+        """
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        if self._own_session:
+            self._session.close()
+
+
+class FleetTransport(Transport):
+    """HTTP transport shared by a fleet of Soundtouch devices.
+
+    Socket and thread usage is bounded whatever the number of devices:
+
+    * at most max_connections requests are in flight at the same time, a
+      request waits for a free connection no longer than its (connect)
+      timeout,
+    * at most max_connections_per_host connections are opened to a
+      host:port and pools of the least recently used host:ports are closed
+      beyond max_hosts,
+    * host names are resolved once per dns_ttl,
+    * one executor is shared by all devices.
+    """
+
+    def __init__(self, max_connections=64, max_connections_per_host=2,
+                 timeout=DEFAULT_TIMEOUT, max_workers=16, dns_ttl=300,
+                 max_hosts=16):
+        """Create a new fleet transport.
+
+        :param max_connections: Global connection budget. Default 64
+        :param max_connections_per_host: Connection cap per host:port.
+            Default 2
+        :param timeout: HTTP timeout in seconds (or (connect, read) tuple).
+            Default 10
+        :param max_workers: Max threads of the shared executor. Default 16
+        :param dns_ttl: Host name resolution cache duration in seconds.
+            Default 300
+        :param max_hosts: Number of host:port connection pools kept, each
+            device uses two (API and DLNA ports). Default 16
+        """
+        session = create_session(pool_size=max_connections_per_host,
+                                 pool_connections=max_hosts, pool_block=True)
+        super(FleetTransport, self).__init__(session=session, timeout=timeout,
+                                             max_workers=max_workers)
+        self._own_session = True
+        self._budget = _Budget(max_connections)
+        self._dns_ttl = dns_ttl
+        self._dns_cache = {}
+        self._dns_lock = Lock()
+
+    def resolve(self, host):
+        """Resolve host name using the DNS cache.
+
+        :param host: Host name or IP address
+        """
+        if _is_ip_address(host):
+            return host
+        now = time.time()
+        with self._dns_lock:
+            cached = self._dns_cache.get(host)
+            if cached is not None and cached[1] > now:
+                return cached[0]
+        address = socket.gethostbyname(host)
+        with self._dns_lock:
+            self._dns_cache[host] = (address, now + self._dns_ttl)
+        _LOGGER.debug("%s resolved to %s", host, address)
+        return address
+
+    def _resolve_url(self, url, kwargs):
+        parsed = urlparse(url)
+        address = self.resolve(parsed.hostname)
+        if address == parsed.hostname:
+            return url
+        headers = dict(kwargs.get('headers') or {})
+        if not any(key.lower() == 'host' for key in headers):
+            headers['Host'] = parsed.netloc
+        kwargs['headers'] = headers
+        netloc = address
+        if parsed.port:
+            netloc += ":" + str(parsed.port)
+        return urlunparse(parsed._replace(netloc=netloc))
+
+    def _acquire(self, url, kwargs):
+        """Wait for a free connection of the budget, up to the timeout."""
+        timeout = kwargs.get('timeout', self._timeout)
+        if isinstance(timeout, tuple):
+            timeout = timeout[0]
+        if not self._budget.acquire(timeout=timeout):
+            raise ConnectTimeout("No free connection for %s within %ss" %
+                                 (url, timeout))
+
+    def get(self, url, **kwargs):
+        """Send a GET request within the connection budget."""
+        url = self._resolve_url(url, kwargs)
+        self._acquire(url, kwargs)
+        try:
+            return super(FleetTransport, self).get(url, **kwargs)
+        finally:
+            self._budget.release()
+
+    def post(self, url, *args, **kwargs):
+        """Send a POST request within the connection budget."""
+        url = self._resolve_url(url, kwargs)
+        self._acquire(url, kwargs)
+        try:
+            return super(FleetTransport, self).post(url, *args, **kwargs)
+        finally:
+            self._budget.release()
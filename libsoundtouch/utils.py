@@ -75,20 +75,78 @@ class Type(Enum):
     PLAYLIST = "playlist"
 
 
+class DispatchPolicy(Enum):
+    """Queueing policy of listener notifications.
+
+    COALESCE replaces the pending notification of the same type (volume,
+    status...) by the new one, and drops the oldest one when the queue is
+    full. DROP_OLDEST and DROP_NEWEST keep every notification until the
+    queue is full, then drop the oldest pending or the new notification.
+    """
+
+    COALESCE = "coalesce"
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+
+
+class ConnectionEvent(Enum):
+    """Websocket connection events notified to connection listeners.
+
+    RESYNCED is notified once the states have been fetched again after a
+    reconnection.
+    """
+
+    CONNECTED = "connected"
+    DISCONNECTED = "disconnected"
+    RESYNCED = "resynced"
+
+
+class RegistryEvent(Enum):
+    """Change of a DeviceRegistry.
+
+    UPDATED is notified when the address or the configuration of a device
+    changed.
+    """
+
+    ADDED = "added"
+    REMOVED = "removed"
+    UPDATED = "updated"
+
+
 class SoundtouchDeviceListener(object):
     """Message listener."""
 
-    def __init__(self, add_device_function):
+    def __init__(self, add_device_function, executor=None,
+                 remove_device_function=None):
         """Create a new message listener.
 
-        :param add_device_function: Callback function
+        :param add_device_function: Callback function called with the name,
+            host and port of added and updated services
+        :param executor: Executor resolving the services concurrently.
+            Services are resolved one by one by the browser thread if not
+            set
+        :param remove_device_function: Callback function called with the
+            name of removed services
         """
         self.add_device_function = add_device_function
+        self.remove_device_function = remove_device_function
+        self._executor = executor
 
     def remove_service(self, zeroconf, device_type, name):
-        # pylint: disable=unused-argument,no-self-use
+        # pylint: disable=unused-argument
         """Remove listener."""
         _LOGGER.info("Service %s removed", name)
+        if self.remove_device_function is not None:
+            self.remove_device_function(name.split(".")[0])
+
+    def update_service(self, zeroconf, device_type, name):
+        """Update device: its address may have changed.
+
+        :param zeroconf: MSDNS object
+        :param device_type: Service type
+        :param name: Device name
+        """
+        self.add_service(zeroconf, device_type, name)
 
     def add_service(self, zeroconf, device_type, name):
         """Add device.
@@ -97,7 +155,19 @@ class SoundtouchDeviceListener(object):
         :param device_type: Service type
         :param name: Device name
         """
+        if self._executor is not None:
+            self._executor.submit(self._resolve, zeroconf, device_type, name)
+        else:
+            self._resolve(zeroconf, device_type, name)
+
+    def _resolve(self, zeroconf, device_type, name):
         device_name = (name.split(".")[0])
-        info = zeroconf.get_service_info(device_type, name)
-        address = socket.inet_ntoa(info.address)
-        self.add_device_function(device_name, address, info.port)
+        try:
+            info = zeroconf.get_service_info(device_type, name)
+            if info is None:
+                _LOGGER.warning("Unable to resolve %s", name)
+                return
+            address = socket.inet_ntoa(info.address)
+            self.add_device_function(device_name, address, info.port)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Unable to add %s", name)
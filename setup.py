@@ -17,7 +17,9 @@ REQUIRES = [
     'requests>=2,<3',
     'enum-compat>=0.0.2',
     'websocket-client>=0.40.0',
-    'zeroconf>=0.19.1'
+    'zeroconf>=0.19.1',
+    'futures>=3.0.0;python_version<"3.2"',
+    'selectors2>=2.0.0;python_version<"3.4"'
 ]
 
 PROJECT_CLASSIFIERS = [
@@ -46,6 +48,9 @@ setup(
     zip_safe=True,
     platforms='any',
     install_requires=REQUIRES,
+    extras_require={
+        'async': ['aiohttp>=3.3;python_version>="3.5"'],
+    },
     test_suite='tests',
     keywords=['bose', 'soundtouch'],
     classifiers=PROJECT_CLASSIFIERS,
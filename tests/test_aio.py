@@ -0,0 +1,476 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import codecs
+import threading
+import time
+import unittest
+
+try:
+    from mock import mock
+except ImportError:
+    from unittest import mock
+
+try:
+    import aiohttp
+    from libsoundtouch.aio import AsyncSoundTouchDevice, \
+        async_soundtouch_device, async_discover_devices, async_iter_devices
+except ImportError:  # aiohttp is not installed
+    AsyncSoundTouchDevice = None
+from libsoundtouch.device import NoExistingZoneException, \
+    SoundTouchDevice
+from libsoundtouch.reconnect import Backoff
+from libsoundtouch.utils import ConnectionEvent
+
+
+def _read(path):
+    codecs_open = codecs.open(path, "r", "utf-8")
+    try:
+        return codecs_open.read()
+    finally:
+        codecs_open.close()
+
+
+ZONE_MASTER = """<?xml version="1.0" encoding="UTF-8" ?>
+<zone master="1111MASTER">
+    <member ipaddress="192.168.1.2" role="NORMAL">1111SLAVE</member>
+</zone>"""
+
+VOLUME = """<?xml version="1.0" encoding="UTF-8" ?>
+<volume deviceID="11223344">
+    <targetvolume>26</targetvolume>
+    <actualvolume>25</actualvolume>
+    <muteenabled>false</muteenabled>
+</volume>"""
+
+
+class MockResponse:
+    def __init__(self, body):
+        self._body = body
+
+    async def read(self):
+        return self._body
+
+    def release(self):
+        pass
+
+
+class MockMessage:
+    def __init__(self, data):
+        self.type = aiohttp.WSMsgType.TEXT
+        self.data = data
+
+
+class MockWebSocket:
+    """Fake aiohttp websocket yielding text messages then closing."""
+
+    def __init__(self, messages):
+        self._messages = list(messages)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._messages:
+            raise StopAsyncIteration
+        return MockMessage(self._messages.pop(0))
+
+
+def _mocked_service_browser(zc, search, listener):
+    service_info = mock.MagicMock()
+    service_info.port = 8090
+    mock_zeroconf = mock.MagicMock()
+    mock_zeroconf.get_service_info.return_value = service_info
+    # Same device seen twice (two interfaces)
+    listener.add_service(mock_zeroconf, '', 'device.tcp')
+    listener.add_service(mock_zeroconf, '', 'device.tcp')
+
+
+def _mocked_service_browser_hosts(*hosts):
+    def _browse(zc, search, listener):
+        for host in hosts:
+            service_info = mock.MagicMock()
+            service_info.address = host
+            service_info.port = 8090
+            mock_zeroconf = mock.MagicMock()
+            mock_zeroconf.get_service_info.return_value = service_info
+            listener.add_service(mock_zeroconf, '', host + '.tcp')
+    return _browse
+
+
+class MockSession:
+    """Fake aiohttp ClientSession answering by URL."""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = []
+        self.closed = False
+        self.websockets = []
+        self.delays = {}
+
+    def ws_connect(self, url, **kwargs):
+        if not self.websockets:
+            raise aiohttp.ClientConnectionError("Connection refused")
+        return MockWebSocket(self.websockets.pop(0))
+
+    async def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        await asyncio.sleep(self.delays.get(url, 0))
+        return MockResponse(self.responses.get(url, '').encode('utf-8'))
+
+    async def close(self):
+        self.closed = True
+
+
+@unittest.skipIf(AsyncSoundTouchDevice is None, "aiohttp is not installed")
+class TestAsyncSoundTouchDevice(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.session = MockSession({
+            'http://192.168.1.1:8090/info': _read(
+                "tests/data/device_info.xml"),
+            'http://192.168.1.1:8090/now_playing': _read(
+                "tests/data/spotify.xml"),
+            'http://192.168.1.1:8090/volume': VOLUME,
+            'http://192.168.1.1:8090/getZone': ZONE_MASTER,
+        })
+
+    def tearDown(self):
+        self.loop.close()
+
+    def _run(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def _device(self):
+        return self._run(async_soundtouch_device("192.168.1.1",
+                                                 session=self.session))
+
+    def test_init_device(self):
+        device = self._device()
+        self.assertEqual(len(self.session.calls), 1)
+        self.assertEqual(device.config.name, "Home")
+        self.assertEqual(device.config.device_ip, "192.168.1.1")
+        self._run(device.close())
+        self.assertFalse(self.session.closed)
+
+    def test_status(self):
+        device = self._device()
+        status = self._run(device.status())
+        self.assertEqual(status.source, "SPOTIFY")
+        self.assertEqual(status.track, "Nothing Else Matters (Live)")
+        self.assertIs(self._run(device.status(refresh=False)), status)
+        self.assertEqual(len(self.session.calls), 2)
+
+    def test_volume(self):
+        device = self._device()
+        volume = self._run(device.volume())
+        self.assertEqual(volume.actual, 25)
+        self.assertEqual(volume.target, 26)
+        self._run(device.set_volume(10))
+        self.assertEqual(self.session.calls[-1],
+                         ('POST', 'http://192.168.1.1:8090/volume',
+                          {'data': '<volume>10</volume>'}))
+
+    def test_zone_status(self):
+        device = self._device()
+        zone_status = self._run(device.zone_status())
+        self.assertTrue(zone_status.is_master)
+        self.assertEqual(zone_status.slaves[0].device_ip, "192.168.1.2")
+
+    def test_add_zone_slave_without_zone(self):
+        device = self._device()
+        self.session.responses['http://192.168.1.1:8090/getZone'] = \
+            '<zone />'
+        self.assertRaises(NoExistingZoneException, self._run,
+                          device.add_zone_slave([device]))
+
+    def test_play(self):
+        device = self._device()
+        self._run(device.play())
+        self.assertEqual([call[2]['data'] for call in self.session.calls[1:]],
+                         ['<key state="press" sender="Gabbo">PLAY</key>',
+                          '<key state="release" sender="Gabbo">PLAY</key>'])
+
+    def test_play_url(self):
+        device = self._device()
+        self._run(device.play_url("http://fqdn/file.mp3"))
+        method, url, kwargs = self.session.calls[-1]
+        self.assertEqual(url, "http://192.168.1.1:8091/AVTransport/Control")
+        self.assertEqual(kwargs['headers']['HOST'], '192.168.1.1:8091')
+        self.assertIn("http://fqdn/file.mp3", kwargs['data'])
+
+    def test_ws_notifications(self):
+        device = self._device()
+        volumes = []
+        zones = []
+        device.add_volume_listener(volumes.append)
+        device.add_zone_status_listener(zones.append)
+        self._run(device._on_message(_read("tests/data/ws_volume.xml")))
+        self.assertEqual(volumes[0].actual, 21)
+        self._run(device._on_message(_read("tests/data/ws_zone.xml")))
+        self._run(asyncio.sleep(0.01))
+        self.assertEqual(zones[0].master_id, "1111MASTER")
+
+    def test_ws_update_types(self):
+        device = self._device()
+        self.session.responses['http://192.168.1.1:8090/bass'] = \
+            '<bass><targetbass>-3</targetbass><actualbass>-2</actualbass>' \
+            '</bass>'
+        recents = []
+        basses = []
+        groups = []
+        device.add_recents_listener(recents.append)
+        device.add_bass_listener(basses.append)
+        device.add_group_listener(groups.append)
+        self._run(device._on_message(_read("tests/data/ws_recents.xml")))
+        self.assertEqual(recents[0][0].content_item.name, "Clarity")
+        self.assertIs(device.recents(), recents[0])
+        self._run(device._on_message(_read("tests/data/ws_group.xml")))
+        self.assertEqual(groups[0].roles[1].device_ip, "192.168.1.2")
+        self._run(device._on_message(
+            _read("tests/data/ws_connection_state.xml")))
+        self.assertTrue(device.connection_state().up)
+        # bassUpdated doesn't carry the bass: fetched
+        self._run(device._on_message(_read("tests/data/ws_bass.xml")))
+        self._run(asyncio.sleep(0.01))
+        self.assertEqual(basses[0].actual, -2)
+        self.assertEqual(self.session.calls[-1][1],
+                         'http://192.168.1.1:8090/bass')
+
+    @mock.patch('socket.inet_ntoa', return_value='192.168.1.1')
+    @mock.patch('zeroconf.ServiceBrowser.__init__', return_value=None,
+                side_effect=_mocked_service_browser)
+    def test_discover_devices(self, mocked_service_browser,
+                              mocked_inet_ntoa):
+        start = time.time()
+        devices = self._run(async_discover_devices(
+            timeout=5, session=self.session, expected_count=1))
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual([device.config.name for device in devices],
+                         ["Home"])
+
+    @mock.patch('socket.inet_ntoa', return_value='192.168.1.1')
+    @mock.patch('zeroconf.ServiceBrowser.__init__', return_value=None,
+                side_effect=_mocked_service_browser)
+    def test_iter_devices(self, mocked_service_browser, mocked_inet_ntoa):
+        async def _discover():
+            found = []
+            async for device in async_iter_devices(timeout=0.2,
+                                                   session=self.session):
+                found.append(device.host)
+            return found
+
+        self.assertEqual(self._run(_discover()), ["192.168.1.1"])
+
+    @mock.patch('socket.inet_ntoa', side_effect=lambda address: address)
+    @mock.patch('zeroconf.ServiceBrowser.__init__', return_value=None)
+    def test_discover_devices_concurrent(self, mocked_service_browser,
+                                         mocked_inet_ntoa):
+        mocked_service_browser.side_effect = _mocked_service_browser_hosts(
+            "192.168.1.1", "192.168.1.2", "192.168.1.3")
+        info = _read("tests/data/device_info.xml")
+        for host, delay in (("192.168.1.1", 0.3), ("192.168.1.2", 0.3),
+                            ("192.168.1.3", 2)):
+            url = 'http://%s:8090/info' % host
+            self.session.responses[url] = info
+            self.session.delays[url] = delay
+        failures = {}
+        start = time.time()
+        devices = self._run(async_discover_devices(
+            timeout=1, session=self.session, device_timeout=0.6,
+            failures=failures))
+        self.assertLess(time.time() - start, 1.5)
+        self.assertEqual(sorted(device.host for device in devices),
+                         ["192.168.1.1", "192.168.1.2"])
+        self.assertEqual(list(failures), ["192.168.1.3"])
+
+    @mock.patch('socket.inet_ntoa', side_effect=lambda address: address)
+    @mock.patch('zeroconf.ServiceBrowser.__init__', return_value=None)
+    def test_discover_devices_invalid(self, mocked_service_browser,
+                                      mocked_inet_ntoa):
+        # 192.168.1.4 answers with an empty body: not a device
+        mocked_service_browser.side_effect = _mocked_service_browser_hosts(
+            "192.168.1.4", "192.168.1.1")
+        failures = {}
+        devices = self._run(async_discover_devices(
+            timeout=0.5, session=self.session, failures=failures))
+        self.assertEqual([device.host for device in devices],
+                         ["192.168.1.1"])
+        self.assertEqual(list(failures), ["192.168.1.4"])
+
+    def test_ws_reconnect(self):
+        device = AsyncSoundTouchDevice("192.168.1.1", session=self.session,
+                                       backoff=Backoff(0.01, 0.01))
+        events = []
+        volumes = []
+        device.add_connection_listener(events.append)
+        device.add_volume_listener(volumes.append)
+        # A bad frame doesn't end the notifications
+        self.session.websockets = [
+            ['<updates', _read("tests/data/ws_volume.xml")], []]
+
+        async def _notifications():
+            device.start_notification()
+            while ConnectionEvent.RESYNCED not in events:
+                await asyncio.sleep(0.01)
+            device.stop_notification()
+
+        self._run(asyncio.wait_for(_notifications(), 2))
+        self.assertEqual(events[:3], [ConnectionEvent.CONNECTED,
+                                      ConnectionEvent.DISCONNECTED,
+                                      ConnectionEvent.CONNECTED])
+        self.assertEqual([volume.actual for volume in volumes], [21, 25])
+        self.assertEqual(device.connection_stats['resyncs'], 1)
+
+    def test_ws_notification_errors(self):
+        device = self._device()
+        volumes = []
+
+        def failing_listener(volume):
+            raise ValueError("listener bug")
+
+        device.add_volume_listener(failing_listener)
+        device.add_volume_listener(volumes.append)
+        self.session.websockets = [
+            ['<updates', _read("tests/data/ws_volume.xml")]]
+        device._reconnect = False
+
+        async def _notifications():
+            await device.start_notification()
+
+        self._run(_notifications())
+        self.assertEqual(volumes[0].actual, 21)
+
+    def test_ws_zone_notification_cache(self):
+        device = AsyncSoundTouchDevice("192.168.1.1", session=self.session,
+                                       cache_ttl=60)
+        zones = []
+        device.add_zone_status_listener(zones.append)
+        self.assertTrue(self._run(device.zone_status()).is_master)
+        self.session.responses['http://192.168.1.1:8090/getZone'] = \
+            '<zone />'
+        self._run(device._on_message(_read("tests/data/ws_zone.xml")))
+        self._run(asyncio.sleep(0.01))
+        # The notification bypasses the cache TTL
+        self.assertEqual(zones, [None])
+        self.assertEqual(len(self.session.calls), 2)
+        self.assertIsNone(self._run(device.zone_status()))
+        self.assertEqual(len(self.session.calls), 2)
+
+    def test_ws_info_notification(self):
+        device = self._device()
+        infos = []
+        device.add_device_info_listener(infos.append)
+        self.assertEqual(device.config.name, "Home")
+        self.session.responses['http://192.168.1.1:8090/info'] = _read(
+            "tests/data/device_info.xml").replace("Home", "Kitchen")
+        with mock.patch.object(device, '_defer'):
+            self._run(device._on_message(_read("tests/data/ws_info.xml")))
+            # Stale until fetched again
+            self.assertIsNone(device.config)
+        self._run(device._on_message(_read("tests/data/ws_info.xml")))
+        self._run(asyncio.sleep(0.01))
+        self.assertEqual(device.config.name, "Kitchen")
+        self.assertIs(infos[0], device.config)
+
+    def test_cache_ttl(self):
+        device = AsyncSoundTouchDevice("192.168.1.1", session=self.session,
+                                       cache_ttl=60)
+        volume = self._run(device.volume())
+        self.assertIs(self._run(device.volume()), volume)
+        self.assertEqual(len(self.session.calls), 1)
+        self._run(device.volume(max_age=0))
+        self.assertEqual(len(self.session.calls), 2)
+        self.assertEqual(device.cache_stats,
+                         {'volume': {'hits': 1, 'misses': 2}})
+
+    def test_skip_unchanged_payload(self):
+        device = self._device()
+        status = self._run(device.status())
+        self.assertIs(self._run(device.status()), status)
+        self.assertEqual(device.skipped_parses, {'status': 1})
+        self.session.responses['http://192.168.1.1:8090/now_playing'] = \
+            _read("tests/data/radio.xml")
+        self.assertEqual(self._run(device.status()).source,
+                         "INTERNET_RADIO")
+        self.assertEqual(device.skipped_parses, {'status': 1})
+
+    def test_lazy_decoding(self):
+        device = AsyncSoundTouchDevice("192.168.1.1", session=self.session,
+                                       lazy_decoding=True)
+        status = self._run(device.status())
+        self.assertFalse(status.decoded)
+        self.assertEqual(status.source, "SPOTIFY")
+        self.assertEqual(status.track, "Nothing Else Matters (Live)")
+        statuses = []
+        device.add_status_listener(statuses.append)
+        self._run(device._on_message(_read("tests/data/ws_status.xml")))
+        self.assertFalse(statuses[0].decoded)
+        self.assertEqual(statuses[0].track, "Devil We Know")
+
+    def test_ws_zone_notification_storm(self):
+        device = AsyncSoundTouchDevice("192.168.1.1", session=self.session)
+        zones = []
+        device.add_zone_status_listener(zones.append)
+
+        async def _storm():
+            for _ in range(10):
+                await device._on_message(_read("tests/data/ws_zone.xml"))
+            while device._deferred['zone_status'].done() is False:
+                await asyncio.sleep(0.01)
+
+        self._run(_storm())
+        # One fetch for the first frame, one for all the others
+        self.assertEqual(len(self.session.calls), 2)
+        self.assertEqual(len(zones), 2)
+
+    def test_ws_ignored_notifications(self):
+        device = AsyncSoundTouchDevice("192.168.1.1", session=self.session)
+        self._run(device._on_message(_read("tests/data/ws_volume.xml")))
+        self.assertEqual(self._run(device.volume(refresh=False)).actual, 21)
+        self.assertEqual(device.ignored_notifications, {})
+        device = AsyncSoundTouchDevice("192.168.1.1", session=self.session,
+                                       filter_notifications=True)
+        self._run(device._on_message(_read("tests/data/ws_volume.xml")))
+        self.assertEqual(device.ignored_notifications, {'volume': 1})
+        self.assertEqual(self._run(device.volume(refresh=False)).actual, 25)
+        self.assertEqual(len(self.session.calls), 1)
+
+    def test_aevents(self):
+        device = self._device()
+
+        async def _read_events():
+            events = []
+            async with device.aevents(types=('volume',),
+                                      timeout=0.1) as stream:
+                await device._on_message(_read("tests/data/ws_volume.xml"))
+                async for event in stream:
+                    events.append(event)
+            return events
+
+        events = self._run(_read_events())
+        self.assertEqual([event.value.actual for event in events], [21])
+        self.assertEqual(device.volume_updated_listeners, [])
+
+    def test_aevents_thread(self):
+        # Listeners of a SoundTouchDevice run in the websocket thread
+        device = SoundTouchDevice("192.168.1.1", lazy=True)
+        message = _read("tests/data/ws_volume.xml")
+
+        async def _read_events():
+            stream = device.aevents(types=('volume',))
+            thread = threading.Thread(target=device._on_message,
+                                      args=(None, message))
+            thread.start()
+            event = await asyncio.wait_for(stream.__anext__(), 2)
+            thread.join()
+            stream.close()
+            return event
+
+        self.assertEqual(self._run(_read_events()).value.actual, 21)
@@ -1,12 +1,26 @@
 # -*- coding: utf-8 -*-
 
+import os
+import shutil
+import socket
+import tempfile
 import unittest
 import time
+from threading import Event, Thread, active_count, current_thread, \
+    enumerate as enumerate_threads
 
 import libsoundtouch
 from libsoundtouch.device import NoSlavesException, NoExistingZoneException, \
     Preset, Config, SoundTouchDevice, SoundtouchInvalidUrlException
-from libsoundtouch.utils import Source, Type
+from libsoundtouch.devicecache import DeviceCache
+from libsoundtouch.dispatch import ListenerDispatcher
+from libsoundtouch.events import EventStream, StatusEvent, VolumeEvent
+from libsoundtouch.hub import NotificationHub, _FrameReader
+from libsoundtouch.reconnect import Backoff
+from libsoundtouch.scan import network_hosts, scan_devices, scan_hosts
+from libsoundtouch.transport import FleetTransport
+from libsoundtouch.utils import ConnectionEvent, DispatchPolicy, \
+    RegistryEvent, Source, Type
 import logging
 import codecs
 
@@ -16,8 +30,12 @@ except ImportError:
     from unittest import mock
     from unittest.mock import Mock
 
+import xml.etree.ElementTree as ET
 from xml.dom import minidom
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from requests.exceptions import ConnectTimeout as RequestsConnectTimeout
 from requests.models import Response
+from websocket import ABNF
 import zeroconf
 
 
@@ -33,20 +51,7 @@ class MockResponse(Response):
 
 class MockDevice(SoundTouchDevice):
     def __init__(self, host, port=8090):
-        self._host = host
-        self._port = port
-        self._zone_status = None
-        self._config = None
-        self._status = None
-        self._volume = None
-        self._presets = None
-        self._ws_port = 8080
-        self._dlna_port = 8091
-        self._volume_updated_listeners = []
-        self._status_updated_listeners = []
-        self._presets_updated_listeners = []
-        self._zone_status_updated_listeners = []
-        self._device_info_updated_listeners = []
+        SoundTouchDevice.__init__(self, host, port, lazy=True)
 
     def set_base_config(self, ip, id):
         xml = """<?xml version="1.0" encoding="UTF-8" ?>
@@ -56,9 +61,7 @@ class MockDevice(SoundTouchDevice):
         <ipAddress>%s</ipAddress>
     </networkInfo>
 </info>""" % (id, id, ip)
-        dom = minidom.parseString(xml)
-        self._config = Config(dom)
-        pass
+        self._config = Config(ET.fromstring(xml.encode('utf-8')))
 
 
 class MockPreset(Preset):
@@ -66,6 +69,71 @@ class MockPreset(Preset):
         self._source_xml = _source_xml
 
 
+class MockWebSocket(object):
+    """Mock websocket: pushed messages are sent as frames to its socket."""
+
+    def __init__(self, *args, **kwargs):
+        self.sock, self._peer = socket.socketpair()
+        self.closed = False
+        self._reader = _FrameReader()
+        self._sent = []
+
+    def settimeout(self, timeout):
+        pass
+
+    def push(self, message):
+        if message is None:
+            # Connection reset
+            self._peer.close()
+            return
+        self.push_bytes(ABNF(1, 0, 0, 0, ABNF.OPCODE_TEXT, 0,
+                             message.encode('utf-8')).format())
+
+    def push_bytes(self, data):
+        self._peer.send(data)
+
+    def sent(self):
+        """Return (opcode, payload) of the frames sent so far."""
+        self._peer.settimeout(0.1)
+        try:
+            while True:
+                data = self._peer.recv(4096)
+                if not data:
+                    break
+                self._reader.feed(data)
+        except socket.error:
+            pass
+        self._sent.extend(self._reader.frames())
+        return self._sent
+
+    def close(self):
+        self.closed = True
+        self.sock.close()
+        self._peer.close()
+
+
+def _volume_message(volume):
+    return '<updates deviceID="XXXX"><volumeUpdated><volume>' \
+           '<targetvolume>%d</targetvolume><actualvolume>%d</actualvolume>' \
+           '<muteenabled>false</muteenabled></volume></volumeUpdated>' \
+           '</updates>' % (volume, volume)
+
+
+def _read(path):
+    codecs_open = codecs.open(path, "r", "utf-8")
+    try:
+        return codecs_open.read()
+    finally:
+        codecs_open.close()
+
+
+def _wait_for(condition, timeout=2):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
 def _mocked_device_info(*args, **kwargs):
     if args[0] == 'http://192.168.1.1:8090/info':
         codecs_open = codecs.open("tests/data/device_info.xml", "r", "utf-8")
@@ -75,6 +143,28 @@ def _mocked_device_info(*args, **kwargs):
             codecs_open.close()
 
 
+def _mocked_device_info_of(url, *args, **kwargs):
+    """Device info whose device id is the host of the url."""
+    host = url.split("/")[2].split(":")[0]
+    return MockResponse(_read("tests/data/device_info.xml").replace(
+        "00112233445566", host))
+
+
+def _mocked_info(device_id, device_ip=None):
+    """Device info of device_id whose ip is device_ip or the url host."""
+    def _get(url, *args, **kwargs):
+        ip = device_ip or url.split("/")[2].split(":")[0]
+        return MockResponse("""<?xml version="1.0" encoding="UTF-8" ?>
+<info deviceID="%s">
+    <name>Kitchen</name>
+    <networkInfo type="SMSC">
+        <macAddress>%s</macAddress>
+        <ipAddress>%s</ipAddress>
+    </networkInfo>
+</info>""" % (device_id, device_id, ip))
+    return _get
+
+
 def _mocked_device_info_utf8(*args, **kwargs):
     if args[0] == 'http://192.168.1.1:8090/info':
         codecs_open = codecs.open("tests/data/device_info_utf8.xml", "r",
@@ -364,6 +454,34 @@ def _mocked_zone_status_none(*args, **kwargs):
 <zone />""")
 
 
+def _mocked_bass(*args, **kwargs):
+    if (args[0] == "http://192.168.1.1:8090/bass"):
+        return MockResponse("""<?xml version="1.0" encoding="UTF-8" ?>
+<bass deviceID="XXXX">
+    <targetbass>-3</targetbass>
+    <actualbass>-2</actualbass>
+</bass>""")
+
+
+def _mocked_sources(*args, **kwargs):
+    if (args[0] == "http://192.168.1.1:8090/sources"):
+        return MockResponse("""<?xml version="1.0" encoding="UTF-8" ?>
+<sources deviceID="XXXX">
+    <sourceItem source="AUX" sourceAccount="AUX" status="READY"
+                isLocal="true" multiroomallowed="true">AUX IN</sourceItem>
+    <sourceItem source="SPOTIFY" sourceAccount="user" status="READY"
+                isLocal="false" multiroomallowed="true">user</sourceItem>
+    <sourceItem source="BLUETOOTH" status="UNAVAILABLE" isLocal="true"
+                multiroomallowed="true" />
+</sources>""")
+
+
+def _mocked_group_none(*args, **kwargs):
+    if (args[0] == "http://192.168.1.1:8090/getGroup"):
+        return MockResponse("""<?xml version="1.0" encoding="UTF-8" ?>
+<group />""")
+
+
 def _mocked_presets(*args, **kwargs):
     if (args[0] == "http://192.168.1.1:8090/presets"):
         return MockResponse("""<?xml version="1.0" encoding="UTF-8" ?>
@@ -453,6 +571,18 @@ def _mocked_service_browser(zc, search, listener):
     listener.add_service(mock_zeroconf, '', 'device.tcp')
 
 
+def _mocked_service_browser_hosts(*hosts):
+    def _browse(zc, search, listener):
+        for host in hosts:
+            service_info = mock.MagicMock()
+            service_info.address = host
+            service_info.port = 8090
+            mock_zeroconf = mock.MagicMock()
+            mock_zeroconf.get_service_info.return_value = service_info
+            listener.add_service(mock_zeroconf, '', host + '.tcp')
+    return _browse
+
+
 def _mocked_select_bluetooth(*args, **kwargs):
     if args[0] != "http://192.168.1.1:8090/select" or args[1] not in [
         '<ContentItem source="BLUETOOTH" />'
@@ -485,7 +615,7 @@ class TestLibSoundTouch(unittest.TestCase):
         """Stop everything that was started."""
         logging.disable(logging.NOTSET)
 
-    @mock.patch('requests.get', side_effect=_mocked_device_info)
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
     def test_init_device(self, mocked_device_info):
         device = libsoundtouch.soundtouch_device("192.168.1.1")
         self.assertEqual(mocked_device_info.call_count, 1)
@@ -518,7 +648,7 @@ class TestLibSoundTouch(unittest.TestCase):
              device.config.components],
             ['13.0.9.29919.1889959 epdbuild.trunk.cepeswbldXXX', None])
 
-    @mock.patch('requests.get', side_effect=_mocked_device_info_utf8)
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info_utf8)
     def test_init_device_utf8(self, mocked_device_info):
         device = libsoundtouch.soundtouch_device("192.168.1.1")
         self.assertEqual(mocked_device_info.call_count, 1)
@@ -551,7 +681,8 @@ class TestLibSoundTouch(unittest.TestCase):
              device.config.components],
             ['13.0.9.29919.1889959 epdbuild.trunk.cepeswbldXXX', None])
 
-    @mock.patch('requests.get', side_effect=_mocked_device_info_without_values)
+    @mock.patch('requests.Session.get',
+                side_effect=_mocked_device_info_without_values)
     def test_init_device_with_none_values(self, mocked_device_info):
         device = libsoundtouch.soundtouch_device("192.168.1.1")
         self.assertEqual(mocked_device_info.call_count, 1)
@@ -565,7 +696,116 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertIsNone(device.config.country_code)
         self.assertIsNone(device.config.region_code)
 
-    @mock.patch('requests.get', side_effect=_mocked_status_spotify)
+    def test_init_device_with_session(self):
+        session = Mock()
+        session.get.side_effect = _mocked_device_info
+        device = SoundTouchDevice("192.168.1.1", session=session, timeout=3)
+        self.assertEqual(session.get.call_count, 1)
+        self.assertEqual(session.get.call_args[1]['timeout'], 3)
+        self.assertEqual(device.config.name, "Home")
+        device.play()
+        self.assertEqual(session.post.call_count, 2)
+        self.assertEqual(session.post.call_args[1]['timeout'], 3)
+        device.close()
+        self.assertEqual(session.close.call_count, 0)
+
+    @mock.patch('requests.Session.close')
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
+    def test_close_device(self, mocked_device_info, mocked_close):
+        device = libsoundtouch.soundtouch_device("192.168.1.1")
+        device.close()
+        self.assertEqual(mocked_close.call_count, 1)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
+    def test_fleet_transport(self, mocked_device_info):
+        transport = FleetTransport(max_connections=4,
+                                   max_connections_per_host=1)
+        device1 = libsoundtouch.soundtouch_device("192.168.1.1",
+                                                  transport=transport)
+        device2 = libsoundtouch.soundtouch_device("192.168.1.1",
+                                                  transport=transport)
+        self.assertIs(device1.transport, transport)
+        self.assertIs(device2.transport, transport)
+        self.assertEqual(mocked_device_info.call_count, 2)
+        self.assertEqual(device2.config.name, "Home")
+        device1.close()
+        self.assertIsNotNone(transport.executor)
+        transport.close()
+
+    @mock.patch('socket.gethostbyname', return_value='192.168.1.1')
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
+    def test_fleet_transport_dns_cache(self, mocked_device_info,
+                                       mocked_gethostbyname):
+        transport = FleetTransport()
+        libsoundtouch.soundtouch_device("speaker.local", transport=transport)
+        device = libsoundtouch.soundtouch_device("speaker.local",
+                                                 transport=transport)
+        self.assertEqual(mocked_gethostbyname.call_count, 1)
+        self.assertEqual(mocked_device_info.call_args[1]['headers']['Host'],
+                         "speaker.local:8090")
+        self.assertEqual(device.host, "speaker.local")
+        transport.close()
+
+    def test_fleet_transport_budget(self):
+        transport = FleetTransport(max_connections=1)
+        transport._session = Mock()
+
+        def _mocked_get(*args, **kwargs):
+            # Budget is exhausted while the request is in flight
+            self.assertFalse(transport._budget.acquire(False))
+
+        transport._session.get.side_effect = _mocked_get
+        transport.get("http://192.168.1.1:8090/volume")
+        self.assertTrue(transport._budget.acquire(False))
+        # Budget exhausted: waits no longer than the request timeout
+        self.assertRaises(RequestsConnectTimeout, transport.get,
+                          "http://192.168.1.1:8090/volume", timeout=0.1)
+        self.assertEqual(transport._session.get.call_count, 1)
+
+    def test_fleet_transport_pools(self):
+        transport = FleetTransport(max_hosts=4)
+        adapter = transport.session.get_adapter("http://192.168.1.1:8090/")
+        self.assertEqual(adapter._pool_connections, 4)
+        transport.close()
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
+    def test_init_lazy_device(self, mocked_device_info):
+        device = SoundTouchDevice("192.168.1.1", lazy=True)
+        self.assertEqual(mocked_device_info.call_count, 0)
+        self.assertEqual(device.host, "192.168.1.1")
+        self.assertEqual(device.config.name, "Home")
+        self.assertEqual(device.config.device_id, "00112233445566")
+        self.assertEqual(mocked_device_info.call_count, 1)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
+    def test_init_prefetch_device(self, mocked_device_info):
+        device = SoundTouchDevice("192.168.1.1", prefetch=True)
+        self.assertEqual(device.config.name, "Home")
+        self.assertEqual(device.prefetch_config().result(1).name, "Home")
+        self.assertEqual(mocked_device_info.call_count, 1)
+        device.close()
+
+    @mock.patch('requests.Session.get')
+    def test_soundtouch_devices(self, mocked_device_info):
+        def _mocked_get(*args, **kwargs):
+            if args[0] == 'http://192.168.1.3:8090/info':
+                raise Exception("Unreachable")
+            if args[0] == 'http://192.168.1.4:8090/info':
+                time.sleep(2)
+            return _mocked_device_info('http://192.168.1.1:8090/info')
+
+        mocked_device_info.side_effect = _mocked_get
+        start = time.time()
+        devices = libsoundtouch.soundtouch_devices(
+            ["192.168.1.1", ("192.168.1.2", 8090), "192.168.1.3",
+             "192.168.1.4"], timeout=0.5)
+        self.assertLess(time.time() - start, 1.5)
+        self.assertEqual(mocked_device_info.call_count, 4)
+        self.assertEqual([device.host for device in devices],
+                         ["192.168.1.1", "192.168.1.2"])
+        self.assertEqual(devices[1].config.name, "Home")
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_status_spotify)
     def test_status_spotify(self, mocked_device_status):
         device = MockDevice("192.168.1.1")
         status = device.status()
@@ -604,7 +844,61 @@ class TestLibSoundTouch(unittest.TestCase):
                          "Metallica")
         self.assertEqual(mocked_device_status.call_count, 3)
 
-    @mock.patch('requests.get', side_effect=_mocked_status_spotify_utf8)
+    @mock.patch('requests.Session.get', side_effect=_mocked_status_spotify)
+    def test_status_cache(self, mocked_device_status):
+        device = SoundTouchDevice("192.168.1.1", lazy=True, cache_ttl=60)
+        status = device.status()
+        self.assertIs(device.status(), status)
+        self.assertIs(device.status(max_age=30), status)
+        self.assertEqual(mocked_device_status.call_count, 1)
+        # Same payload: the existing status is kept
+        self.assertIs(device.status(max_age=0), status)
+        self.assertEqual(mocked_device_status.call_count, 2)
+        self.assertEqual(device.skipped_parses, {'status': 1})
+        self.assertEqual(device.cache_stats,
+                         {'status': {'hits': 2, 'misses': 2}})
+
+    @mock.patch('requests.Session.get')
+    def test_status_single_flight(self, mocked_device_status):
+        def _mocked_get(*args, **kwargs):
+            time.sleep(0.2)
+            return _mocked_status_spotify(*args, **kwargs)
+
+        mocked_device_status.side_effect = _mocked_get
+        device = MockDevice("192.168.1.1")
+        statuses = []
+        threads = [Thread(target=lambda: statuses.append(device.status()))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(mocked_device_status.call_count, 1)
+        self.assertEqual(len(statuses), 5)
+        for status in statuses:
+            self.assertIs(status, statuses[0])
+        device.status()
+        self.assertEqual(mocked_device_status.call_count, 2)
+
+    @mock.patch('requests.Session.get', side_effect=Exception("Timeout"))
+    def test_volume_single_flight_error(self, mocked_volume):
+        device = MockDevice("192.168.1.1")
+        self.assertRaises(Exception, device.volume)
+        self.assertRaises(Exception, device.volume)
+        self.assertEqual(mocked_volume.call_count, 2)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_none)
+    def test_zone_status_cache(self, mocked_zone_status):
+        device = SoundTouchDevice("192.168.1.1", lazy=True)
+        self.assertIsNone(device.zone_status())
+        self.assertIsNone(device.zone_status(max_age=60))
+        self.assertIsNone(device.zone_status(refresh=False))
+        self.assertEqual(mocked_zone_status.call_count, 1)
+        device.zone_status()
+        self.assertEqual(mocked_zone_status.call_count, 2)
+
+    @mock.patch('requests.Session.get',
+                side_effect=_mocked_status_spotify_utf8)
     def test_status_spotify_utf8(self, mocked_device_status):
         device = MockDevice("192.168.1.1")
         status = device.status()
@@ -612,7 +906,7 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(status.track, u'Música Urbana')
         self.assertEqual(mocked_device_status.call_count, 1)
 
-    @mock.patch('requests.get', side_effect=_mocked_status_radio)
+    @mock.patch('requests.Session.get', side_effect=_mocked_status_radio)
     def test_status_radio(self, mocked_device_status):
         device = MockDevice("192.168.1.1")
         status = device.status()
@@ -632,7 +926,8 @@ class TestLibSoundTouch(unittest.TestCase):
                          "MP3 64 kbps Paris France, Radio du sport")
         self.assertEqual(status.station_location, "Paris France")
 
-    @mock.patch('requests.get', side_effect=_mocked_status_radio_non_ascii)
+    @mock.patch('requests.Session.get',
+                side_effect=_mocked_status_radio_non_ascii)
     def test_status_radio_non_ascii(self, mocked_device_status):
         device = MockDevice("192.168.1.1")
         status = device.status()
@@ -650,7 +945,8 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(status.station_name, "France Info")
         self.assertEqual(status.station_location, "Paris France")
 
-    @mock.patch('requests.get', side_effect=_mocked_status_stored_music)
+    @mock.patch('requests.Session.get',
+                side_effect=_mocked_status_stored_music)
     def test_status_stored_music(self, mocked_device_status):
         device = MockDevice("192.168.1.1")
         status = device.status()
@@ -660,7 +956,7 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(status.content_item.location, "27$2745")
         self.assertIsNone(status.image)
 
-    @mock.patch('requests.get', side_effect=_mocked_status_standby)
+    @mock.patch('requests.Session.get', side_effect=_mocked_status_standby)
     def test_status_standby(self, mocked_device_status):
         device = MockDevice("192.168.1.1")
         status = device.status()
@@ -668,7 +964,8 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(status.source, "STANDBY")
         self.assertEqual(status.content_item.source, "STANDBY")
 
-    @mock.patch('requests.get', side_effect=_mocked_status_spotify_buffering)
+    @mock.patch('requests.Session.get',
+                side_effect=_mocked_status_spotify_buffering)
     def test_status_buffering(self, mocked_device_status):
         device = MockDevice("192.168.1.1")
         status = device.status()
@@ -677,7 +974,34 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(status.play_status, "BUFFERING_STATE")
         self.assertIsNone(status.content_item)
 
-    @mock.patch('requests.get', side_effect=_mocked_volume)
+    @mock.patch('requests.Session.get', side_effect=_mocked_status_radio)
+    def test_status_record(self, mocked_device_status):
+        status = MockDevice("192.168.1.1").status()
+        other = MockDevice("192.168.1.1").status()
+        self.assertEqual(mocked_device_status.call_count, 2)
+        self.assertIsNot(status, other)
+        self.assertEqual(status, other)
+        self.assertEqual(hash(status), hash(other))
+        self.assertEqual(len({status, other}), 1)
+        self.assertFalse(hasattr(status, '__dict__'))
+        with self.assertRaises(AttributeError):
+            status._track = "Track"
+        with self.assertRaises(AttributeError):
+            del status._track
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_status_radio)
+    def test_status_lazy_decoding(self, mocked_device_status):
+        device = SoundTouchDevice("192.168.1.1", lazy=True,
+                                  lazy_decoding=True)
+        status = device.status()
+        self.assertEqual(status.source, "INTERNET_RADIO")
+        self.assertEqual(status.play_status, "PLAY_STATE")
+        self.assertFalse(status.decoded)
+        self.assertEqual(status, MockDevice("192.168.1.1").status())
+        self.assertTrue(status.decoded)
+        self.assertEqual(status.station_name, "RMC Info Talk Sport")
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_volume)
     def test_volume(self, mocked_volume):
         device = MockDevice("192.168.1.1")
         volume = device.volume()
@@ -686,45 +1010,47 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(volume.target, 26)
         self.assertEqual(volume.muted, False)
 
-    @mock.patch('requests.post', side_effect=_mocked_play)
+    @mock.patch('requests.Session.post', side_effect=_mocked_play)
     def test_play(self, mocked_play):
         device = MockDevice("192.168.1.1")
         device.play()
         self.assertEqual(mocked_play.call_count, 2)
 
-    @mock.patch('requests.post',
+    @mock.patch('requests.Session.post',
                 side_effect=_mocked_play_media_without_account)
     def test_play_media_without_account(self, mocked_play_media):
         device = MockDevice("192.168.1.1")
         device.play_media(Source.INTERNET_RADIO, "4712")
         self.assertEqual(mocked_play_media.call_count, 1)
 
-    @mock.patch('requests.post', side_effect=_mocked_play_media_with_account)
+    @mock.patch('requests.Session.post',
+                side_effect=_mocked_play_media_with_account)
     def test_play_media_with_account(self, mocked_play_media):
         device = MockDevice("192.168.1.1")
         device.play_media(Source.SPOTIFY, "uri_track", "spot_user_id")
         self.assertEqual(mocked_play_media.call_count, 1)
 
-    @mock.patch('requests.post', side_effect=_mocked_play_media_with_type)
+    @mock.patch('requests.Session.post',
+                side_effect=_mocked_play_media_with_type)
     def test_play_media_with_type(self, mocked_play_media):
         device = MockDevice("192.168.1.1")
         device.play_media(Source.LOCAL_MUSIC, "album:1", "account_id",
                           Type.ALBUM)
         self.assertEqual(mocked_play_media.call_count, 1)
 
-    @mock.patch('requests.post', side_effect=_mocked_pause)
+    @mock.patch('requests.Session.post', side_effect=_mocked_pause)
     def test_pause(self, mocked_pause):
         device = MockDevice("192.168.1.1")
         device.pause()
         self.assertEqual(mocked_pause.call_count, 2)
 
-    @mock.patch('requests.post', side_effect=_mocked_play_pause)
+    @mock.patch('requests.Session.post', side_effect=_mocked_play_pause)
     def test_play_plause(self, mocked_play_pause):
         device = MockDevice("192.168.1.1")
         device.play_pause()
         self.assertEqual(mocked_play_pause.call_count, 2)
 
-    @mock.patch('requests.post', side_effect=_mocked_play_url)
+    @mock.patch('requests.Session.post', side_effect=_mocked_play_url)
     def test_play_url(self, mocked_play_url):
         device = MockDevice("192.168.1.1")
         device.play_url("http://fqdn/file.mp3")
@@ -737,7 +1063,7 @@ class TestLibSoundTouch(unittest.TestCase):
 
     @mock.patch('libsoundtouch.SoundTouchDevice.refresh_status',
                 side_effect=None)
-    @mock.patch('requests.post', side_effect=_mocked_power)
+    @mock.patch('requests.Session.post', side_effect=_mocked_power)
     def test_power_on(self, mocked_power, refresh):
         device = MockDevice("192.168.1.1")
         device._status = Mock()
@@ -748,7 +1074,7 @@ class TestLibSoundTouch(unittest.TestCase):
 
     @mock.patch('libsoundtouch.SoundTouchDevice.refresh_status',
                 side_effect=None)
-    @mock.patch('requests.post', side_effect=_mocked_power)
+    @mock.patch('requests.Session.post', side_effect=_mocked_power)
     def test_power_on_if_already_on(self, mocked_power, refresh):
         device = MockDevice("192.168.1.1")
         device._status = Mock()
@@ -759,7 +1085,7 @@ class TestLibSoundTouch(unittest.TestCase):
 
     @mock.patch('libsoundtouch.SoundTouchDevice.refresh_status',
                 side_effect=None)
-    @mock.patch('requests.post', side_effect=_mocked_power)
+    @mock.patch('requests.Session.post', side_effect=_mocked_power)
     def test_power_off(self, mocked_power, refresh):
         device = MockDevice("192.168.1.1")
         device._status = Mock()
@@ -770,7 +1096,7 @@ class TestLibSoundTouch(unittest.TestCase):
 
     @mock.patch('libsoundtouch.SoundTouchDevice.refresh_status',
                 side_effect=None)
-    @mock.patch('requests.post', side_effect=_mocked_power)
+    @mock.patch('requests.Session.post', side_effect=_mocked_power)
     def test_power_off_if_already_off(self, mocked_power, refresh):
         device = MockDevice("192.168.1.1")
         device._status = Mock()
@@ -779,73 +1105,73 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(mocked_power.call_count, 0)
         self.assertEqual(refresh.call_count, 1)
 
-    @mock.patch('requests.post', side_effect=_mocked_set_volume)
+    @mock.patch('requests.Session.post', side_effect=_mocked_set_volume)
     def test_set_volume(self, mocked_set_volume):
         device = MockDevice("192.168.1.1")
         device.set_volume(10)
         self.assertEqual(mocked_set_volume.call_count, 1)
 
-    @mock.patch('requests.post', side_effect=_mocked_volume_up)
+    @mock.patch('requests.Session.post', side_effect=_mocked_volume_up)
     def test_volume_up(self, mocked_volume_up):
         device = MockDevice("192.168.1.1")
         device.volume_up()
         self.assertEqual(mocked_volume_up.call_count, 2)
 
-    @mock.patch('requests.post', side_effect=_mocked_volume_down)
+    @mock.patch('requests.Session.post', side_effect=_mocked_volume_down)
     def test_volume_down(self, mocked_volume_down):
         device = MockDevice("192.168.1.1")
         device.volume_down()
         self.assertEqual(mocked_volume_down.call_count, 2)
 
-    @mock.patch('requests.post', side_effect=_mocked_next_track)
+    @mock.patch('requests.Session.post', side_effect=_mocked_next_track)
     def test_next_track(self, mocked_next_track):
         device = MockDevice("192.168.1.1")
         device.next_track()
         self.assertEqual(mocked_next_track.call_count, 2)
 
-    @mock.patch('requests.post', side_effect=_mocked_previous_track)
+    @mock.patch('requests.Session.post', side_effect=_mocked_previous_track)
     def test_previous_track(self, mocked_previous_track):
         device = MockDevice("192.168.1.1")
         device.previous_track()
         self.assertEqual(mocked_previous_track.call_count, 2)
 
-    @mock.patch('requests.post', side_effect=_mocked_mute)
+    @mock.patch('requests.Session.post', side_effect=_mocked_mute)
     def test_mute(self, mocked_mute):
         device = MockDevice("192.168.1.1")
         device.mute()
         self.assertEqual(mocked_mute.call_count, 2)
 
-    @mock.patch('requests.post', side_effect=_mocked_repeat_one)
+    @mock.patch('requests.Session.post', side_effect=_mocked_repeat_one)
     def test_repeat_one(self, mocked_repeat_one):
         device = MockDevice("192.168.1.1")
         device.repeat_one()
         self.assertEqual(mocked_repeat_one.call_count, 2)
 
-    @mock.patch('requests.post', side_effect=_mocked_repeat_all)
+    @mock.patch('requests.Session.post', side_effect=_mocked_repeat_all)
     def test_repeat_all(self, mocked_repeat_all):
         device = MockDevice("192.168.1.1")
         device.repeat_all()
         self.assertEqual(mocked_repeat_all.call_count, 2)
 
-    @mock.patch('requests.post', side_effect=_mocked_repeat_off)
+    @mock.patch('requests.Session.post', side_effect=_mocked_repeat_off)
     def test_repeat_off(self, mocked_repeat_off):
         device = MockDevice("192.168.1.1")
         device.repeat_off()
         self.assertEqual(mocked_repeat_off.call_count, 2)
 
-    @mock.patch('requests.post', side_effect=_mocked_shuffle_on)
+    @mock.patch('requests.Session.post', side_effect=_mocked_shuffle_on)
     def test_shuffle_on(self, mocked_shuffle):
         device = MockDevice("192.168.1.1")
         device.shuffle(True)
         self.assertEqual(mocked_shuffle.call_count, 2)
 
-    @mock.patch('requests.post', side_effect=_mocked_shuffle_off)
+    @mock.patch('requests.Session.post', side_effect=_mocked_shuffle_off)
     def test_shuffle_off(self, mocked_shuffle):
         device = MockDevice("192.168.1.1")
         device.shuffle(False)
         self.assertEqual(mocked_shuffle.call_count, 2)
 
-    @mock.patch('requests.get', side_effect=_mocked_presets)
+    @mock.patch('requests.Session.get', side_effect=_mocked_presets)
     def test_presets(self, mocked_presets):
         device = MockDevice("192.168.1.1")
         presets = device.presets()
@@ -861,14 +1187,36 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(presets[0].is_presetable, True)
         self.assertIsNotNone(presets[0].source_xml)
 
-    @mock.patch('requests.post', side_effect=_mocked_select_preset)
+    @mock.patch('requests.Session.get', side_effect=_mocked_presets)
+    def test_presets_lazy_decoding(self, mocked_presets):
+        device = SoundTouchDevice("192.168.1.1", lazy=True,
+                                  lazy_decoding=True)
+        presets = device.presets()
+        eager = MockDevice("192.168.1.1").presets()
+        self.assertEqual(presets[0].name, "Zedd")
+        self.assertFalse(presets[0].decoded)
+        self.assertEqual(presets[0].source_xml, eager[0].source_xml)
+        self.assertEqual(presets, eager)
+        self.assertTrue(all(preset.decoded for preset in presets))
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_presets)
+    def test_presets_eager_decoding(self, mocked_presets):
+        preset = MockDevice("192.168.1.1").presets()[0]
+        # Eager decoding keeps no reference to the XML elements
+        self.assertTrue(preset.decoded)
+        self.assertFalse(any(isinstance(getattr(preset, slot), ET.Element)
+                             for cls in type(preset).__mro__
+                             for slot in getattr(cls, '__slots__', ())))
+        self.assertTrue(preset.source_xml.startswith('<ContentItem '))
+
+    @mock.patch('requests.Session.post', side_effect=_mocked_select_preset)
     def test_select_preset(self, mocked_select_preset):
         device = MockDevice("192.168.1.1")
         preset = MockPreset("<xml>source</xml>")
         device.select_preset(preset)
         self.assertEqual(mocked_select_preset.call_count, 1)
 
-    @mock.patch('requests.get', side_effect=_mocked_zone_status_master)
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_master)
     def test_zone_status_master(self, mocked_zone_status):
         device = MockDevice("192.168.1.1")
         zone_status = device.zone_status()
@@ -880,7 +1228,7 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(zone_status.slaves[0].device_ip, "192.168.1.2")
         self.assertEqual(zone_status.slaves[0].role, "NORMAL")
 
-    @mock.patch('requests.get', side_effect=_mocked_zone_status_slave)
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_slave)
     def test_zone_status_slave(self, mocked_zone_status):
         device = MockDevice("192.168.1.2")
         zone_status = device.zone_status()
@@ -892,14 +1240,14 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(zone_status.slaves[0].device_ip, "192.168.1.2")
         self.assertEqual(zone_status.slaves[0].role, "NORMAL")
 
-    @mock.patch('requests.get', side_effect=_mocked_zone_status_none)
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_none)
     def test_zone_status_none(self, mocked_zone_status):
         device = MockDevice("192.168.1.1")
         zone_status = device.zone_status()
         self.assertEqual(mocked_zone_status.call_count, 1)
         self.assertIsNone(zone_status)
 
-    @mock.patch('requests.post', side_effect=_mocked_create_zone)
+    @mock.patch('requests.Session.post', side_effect=_mocked_create_zone)
     def test_create_zone(self, mocked_create_zone):
         device = MockDevice("192.168.1.1")
         device.set_base_config("192.168.1.1", "1111MASTER")
@@ -913,8 +1261,8 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertRaises(NoSlavesException, device.create_zone,
                           [])
 
-    @mock.patch('requests.post', side_effect=_mocked_remove_slaves)
-    @mock.patch('requests.get', side_effect=_mocked_zone_status_master)
+    @mock.patch('requests.Session.post', side_effect=_mocked_remove_slaves)
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_master)
     def test_remove_zone_slaves(self, mocked_remove_slave, mocked_zone_status):
         device = MockDevice("192.168.1.1")
         device.set_base_config("192.168.1.1", "1111MASTER")
@@ -924,7 +1272,7 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(mocked_zone_status.call_count, 1)
         self.assertEqual(mocked_remove_slave.call_count, 1)
 
-    @mock.patch('requests.get', side_effect=_mocked_zone_status_master)
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_master)
     def test_remove_zone_slave_without_slaves(self, mocked_zone_status):
         device = MockDevice("192.168.1.1")
         self.assertRaises(NoSlavesException,
@@ -932,7 +1280,7 @@ class TestLibSoundTouch(unittest.TestCase):
                           [])
         self.assertEqual(mocked_zone_status.call_count, 1)
 
-    @mock.patch('requests.get', side_effect=_mocked_zone_status_none)
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_none)
     def test_remove_zone_slave_without_zone(self, mocked_zone_status):
         device = MockDevice("192.168.1.1")
         self.assertRaises(NoExistingZoneException,
@@ -940,8 +1288,8 @@ class TestLibSoundTouch(unittest.TestCase):
                           [])
         self.assertEqual(mocked_zone_status.call_count, 1)
 
-    @mock.patch('requests.post', side_effect=_mocked_add_slaves)
-    @mock.patch('requests.get', side_effect=_mocked_zone_status_master)
+    @mock.patch('requests.Session.post', side_effect=_mocked_add_slaves)
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_master)
     def test_add_zone_slaves(self, mocked_add_slaves, mocked_zone_status):
         device = MockDevice("192.168.1.1")
         device.set_base_config("192.168.1.1", "1111MASTER")
@@ -951,14 +1299,14 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(mocked_zone_status.call_count, 1)
         self.assertEqual(mocked_add_slaves.call_count, 1)
 
-    @mock.patch('requests.get', side_effect=_mocked_zone_status_master)
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_master)
     def test_add_zone_slaves_without_master(self, mocked_zone_status):
         device = MockDevice("192.168.1.1")
         self.assertRaises(NoSlavesException,
                           device.add_zone_slave, [])
         self.assertEqual(mocked_zone_status.call_count, 1)
 
-    @mock.patch('requests.get', side_effect=_mocked_zone_status_none)
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_none)
     def test_add_zone_slaves_without_zone(self, mocked_zone_status):
         device = MockDevice("192.168.1.1")
         self.assertRaises(NoExistingZoneException,
@@ -969,8 +1317,65 @@ class TestLibSoundTouch(unittest.TestCase):
     def test_ws_start(self, ws_run_forever):
         device = MockDevice("192.168.1.1")
         device.start_notification()
-        time.sleep(1)  # Wait thread start
-        self.assertEqual(ws_run_forever.call_count, 1)
+        self.assertTrue(_wait_for(lambda: ws_run_forever.call_count))
+        device.stop_notification()
+        ws_run_forever.assert_called_with(ping_interval=30, ping_timeout=10)
+
+    def test_backoff(self):
+        backoff = Backoff(initial=1, maximum=8, jitter=0.5)
+        for attempt, delay in enumerate((1, 2, 4, 8, 8)):
+            self.assertTrue(delay / 2.0 <= backoff.delay(attempt) <= delay)
+        self.assertEqual(Backoff(initial=2, jitter=0).delay(1), 4)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_volume)
+    def test_ws_reconnect(self, mocked_volume):
+        device = SoundTouchDevice("192.168.1.1", lazy=True,
+                                  backoff=Backoff(0.01, 0.01))
+        events = []
+        volumes = []
+        device.add_connection_listener(events.append)
+        device.add_volume_listener(volumes.append)
+
+        def _run_forever(**kwargs):
+            # Connection dropped right after being opened
+            device._on_open(None)
+            device._on_close(None)
+
+        with mock.patch('websocket.WebSocketApp.run_forever',
+                        side_effect=_run_forever):
+            device.start_notification()
+            # Keeps the program running until stopped
+            self.assertFalse(device._ws_thread.daemon)
+            self.assertTrue(_wait_for(
+                lambda: ConnectionEvent.RESYNCED in events))
+            device.stop_notification()
+        self.assertEqual(events[:3], [ConnectionEvent.CONNECTED,
+                                      ConnectionEvent.DISCONNECTED,
+                                      ConnectionEvent.CONNECTED])
+        # Resync fetched the volume and notified the listener once
+        self.assertEqual(volumes[0].actual, 25)
+        self.assertEqual(len(volumes), 1)
+        stats = device.connection_stats
+        self.assertGreaterEqual(stats['connects'], 2)
+        self.assertGreaterEqual(stats['retries'], 1)
+        self.assertGreaterEqual(stats['resyncs'], 1)
+
+    def test_resync_events(self):
+        device = SoundTouchDevice("192.168.1.1", lazy=True, cache_ttl=10)
+        device.add_volume_listener(lambda volume: None)
+        device._status = mock.MagicMock()
+        # States neither stored nor listened to are not fetched again
+        self.assertEqual(device._resync_events(), ['volume', 'status'])
+
+    @mock.patch('websocket.WebSocketApp.run_forever')
+    def test_ws_no_reconnect(self, ws_run_forever):
+        device = SoundTouchDevice("192.168.1.1", lazy=True, reconnect=False,
+                                  ping_interval=0)
+        device.start_notification()
+        self.assertTrue(_wait_for(lambda: ws_run_forever.call_count))
+        time.sleep(0.1)
+        ws_run_forever.assert_called_once_with()
+        device.stop_notification()
 
     def test_ws_listeners(self):
         device = MockDevice("192.168.1.1")
@@ -1041,6 +1446,458 @@ class TestLibSoundTouch(unittest.TestCase):
         finally:
             codecs_open.close()
 
+    def test_ws_status_notification_fields(self):
+        device = MockDevice("192.168.1.1")
+        calls = []
+        device.add_status_listener(
+            lambda status, changes: calls.append(changes),
+            fields=('track', 'play_status'))
+        codecs_open = codecs.open("tests/data/ws_status.xml", "r", "utf-8")
+        try:
+            content = codecs_open.read()
+        finally:
+            codecs_open.close()
+        device._on_message(None, content)
+        self.assertEqual(calls, [{'track': "Devil We Know",
+                                  'play_status': "PLAY_STATE"}])
+        # Position tick: no change of the listened fields
+        device._on_message(None, content.replace(">30</time>",
+                                                 ">31</time>"))
+        self.assertEqual(len(calls), 1)
+        device._on_message(None, content.replace("PLAY_STATE",
+                                                 "PAUSE_STATE"))
+        self.assertEqual(calls[1], {'play_status': "PAUSE_STATE"})
+
+    def test_ws_presets_notification_fields(self):
+        device = MockDevice("192.168.1.1")
+        calls = []
+
+        def listener(presets, changes):
+            calls.append(changes)
+
+        device.add_presets_listener(listener, fields=('name',))
+        codecs_open = codecs.open("tests/data/ws_presets.xml", "r", "utf-8")
+        try:
+            content = codecs_open.read()
+        finally:
+            codecs_open.close()
+        device._on_message(None, content)
+        self.assertEqual(sorted(calls[0]), ['1', '2', '3'])
+        device._on_message(None, content)
+        self.assertEqual(len(calls), 1)
+        device._on_message(None, content.replace("Zedd", "Daft Punk"))
+        self.assertEqual(calls[1], {'1': {'name': "Daft Punk"}})
+        device.remove_presets_listener(listener)
+        self.assertEqual(device.presets_updated_listeners, [])
+
+    def test_ws_recents_notification_fields(self):
+        device = MockDevice("192.168.1.1")
+        calls = []
+
+        def listener(recents, changes):
+            calls.append(changes)
+
+        device.add_recents_listener(listener, fields=('utc_time',))
+        content = _read("tests/data/ws_recents.xml")
+        device._on_message(None, content)
+        self.assertEqual(sorted(calls[0]), ['2487502', '2487503'])
+        device._on_message(None, content)
+        self.assertEqual(len(calls), 1)
+        device._on_message(None, content.replace("1480000000", "1480000001"))
+        self.assertEqual(calls[1], {'2487503': {'utc_time': 1480000001}})
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_sources)
+    def test_ws_sources_notification_fields(self, mocked_sources):
+        device = MockDevice("192.168.1.1")
+        calls = []
+
+        def listener(sources, changes):
+            calls.append(changes)
+
+        device.add_sources_listener(listener, fields=('status',))
+        device._on_message(None, _read("tests/data/ws_sources.xml"))
+        self.assertTrue(_wait_for(lambda: calls))
+        self.assertEqual(len(calls[0]), 3)
+        self.assertTrue(all(isinstance(key, tuple) for key in calls[0]))
+
+    @mock.patch('websocket.create_connection', side_effect=MockWebSocket)
+    def test_notification_hub(self, mocked_create_connection):
+        hub = NotificationHub()
+        devices = [MockDevice("192.168.1.%d" % i) for i in range(1, 11)]
+        volumes = []
+        devices[0].add_volume_listener(volumes.append)
+        devices[0].start_notification(hub=hub)
+        threads = active_count()
+        for device in devices[1:]:
+            device.start_notification(hub=hub)
+        self.assertEqual(mocked_create_connection.call_count, 10)
+        self.assertEqual(active_count(), threads)
+        self.assertTrue(all(device.notification_connected
+                            for device in devices))
+        self.assertTrue(_wait_for(lambda: len(hub.devices) == 10))
+        codecs_open = codecs.open("tests/data/ws_volume.xml", "r", "utf-8")
+        try:
+            content = codecs_open.read()
+        finally:
+            codecs_open.close()
+        web_socket = next(ws for ws, device in hub._connections.items()
+                          if device is devices[0])
+        web_socket.push(content)
+        self.assertTrue(_wait_for(lambda: volumes))
+        self.assertEqual(volumes[0].actual, 21)
+        devices[0].stop_notification()
+        self.assertTrue(_wait_for(lambda: web_socket.closed))
+        self.assertFalse(devices[0].notification_connected)
+        hub.close()
+        self.assertFalse(any(device.notification_connected
+                             for device in devices))
+
+    @mock.patch('websocket.create_connection', side_effect=MockWebSocket)
+    def test_notification_hub_partial_frames(self, mocked_create_connection):
+        hub = NotificationHub()
+        slow, fast = [SoundTouchDevice("192.168.1.%d" % i, lazy=True)
+                      for i in (1, 2)]
+        volumes = []
+        slow.add_volume_listener(lambda volume: volumes.append(
+            ('slow', volume.actual)))
+        fast.add_volume_listener(lambda volume: volumes.append(
+            ('fast', volume.actual)))
+        slow.start_notification(hub=hub)
+        fast.start_notification(hub=hub)
+        self.assertTrue(_wait_for(lambda: len(hub.devices) == 2))
+        sockets = dict((device, ws) for ws, device in hub._connections.items())
+        frame = ABNF(1, 0, 0, 0, ABNF.OPCODE_TEXT, 0,
+                     _volume_message(10).encode('utf-8')).format()
+        # Half a frame of the slow device doesn't block the fast one
+        sockets[slow].push_bytes(frame[:20])
+        sockets[fast].push(_volume_message(20))
+        self.assertTrue(_wait_for(lambda: volumes == [('fast', 20)]))
+        sockets[slow].push_bytes(frame[20:])
+        self.assertTrue(_wait_for(lambda: len(volumes) == 2))
+        # Fragmented message with a ping between the fragments
+        message = _volume_message(30).encode('utf-8')
+        sockets[slow].push_bytes(
+            ABNF(0, 0, 0, 0, ABNF.OPCODE_TEXT, 0, message[:10]).format() +
+            ABNF(1, 0, 0, 0, ABNF.OPCODE_PING, 0, b'ka').format() +
+            ABNF(1, 0, 0, 0, ABNF.OPCODE_CONT, 0, message[10:]).format())
+        self.assertEqual(sockets[slow].sent(), [(ABNF.OPCODE_PONG, b'ka')])
+        self.assertTrue(_wait_for(lambda: len(volumes) == 3))
+        self.assertEqual(volumes, [('fast', 20), ('slow', 10), ('slow', 30)])
+        hub.close()
+
+    @mock.patch('websocket.create_connection', side_effect=MockWebSocket)
+    def test_notification_hub_reconnect(self, mocked_create_connection):
+        hub = NotificationHub()
+        device = SoundTouchDevice("192.168.1.1", lazy=True,
+                                  backoff=Backoff(0.01, 0.01))
+        events = []
+        device.add_connection_listener(events.append)
+        device.start_notification(hub=hub)
+        self.assertTrue(_wait_for(lambda: len(hub.devices) == 1))
+        web_socket = next(iter(hub._connections))
+        web_socket.push(None)  # Connection reset
+        self.assertTrue(_wait_for(
+            lambda: ConnectionEvent.RESYNCED in events))
+        self.assertTrue(device.notification_connected)
+        self.assertEqual(events, [ConnectionEvent.CONNECTED,
+                                  ConnectionEvent.DISCONNECTED,
+                                  ConnectionEvent.CONNECTED,
+                                  ConnectionEvent.RESYNCED])
+        device.stop_notification()
+        hub.close()
+        self.assertEqual(mocked_create_connection.call_count, 2)
+
+    def test_notification_hub_reconnect_schedule(self):
+        hub = NotificationHub()
+        devices = [SoundTouchDevice("192.168.1.%d" % i, lazy=True,
+                                    backoff=Backoff(0.05, 0.05))
+                   for i in range(1, 6)]
+        threads = []
+
+        def _connect(*args, **kwargs):
+            threads.append(current_thread())
+            return MockWebSocket()
+
+        with mock.patch('websocket.create_connection',
+                        side_effect=_connect):
+            for device in devices:
+                device.start_notification(hub=hub)
+            self.assertTrue(_wait_for(lambda: len(hub.devices) == 5))
+            for web_socket in list(hub._connections):
+                web_socket.push(None)  # Connection reset
+            self.assertTrue(_wait_for(lambda: len(threads) == 10 and all(
+                device.notification_connected for device in devices)))
+        # Reconnected one at a time by a single thread
+        self.assertEqual(len(set(threads[5:])), 1)
+        self.assertNotIn(current_thread(), threads[5:])
+        devices[0].stop_notification()
+        hub.close()
+
+    @mock.patch('websocket.create_connection', side_effect=MockWebSocket)
+    def test_notification_hub_ping(self, mocked_create_connection):
+        hub = NotificationHub(ping_interval=0.05, ping_timeout=5)
+        device = SoundTouchDevice("192.168.1.1", lazy=True)
+        device.start_notification(hub=hub)
+        self.assertTrue(_wait_for(lambda: len(hub.devices) == 1))
+        web_socket = next(iter(hub._connections))
+        self.assertTrue(_wait_for(lambda: (ABNF.OPCODE_PING, b'')
+                                  in web_socket.sent()))
+        self.assertTrue(device.notification_connected)
+        hub.close()
+
+    def test_events(self):
+        device = MockDevice("192.168.1.1")
+        events = device.events(types=('volume', 'status'), timeout=0.1)
+        self.assertEqual(len(device.volume_updated_listeners), 1)
+        device._on_message(None, _volume_message(10))
+        codecs_open = codecs.open("tests/data/ws_status.xml", "r", "utf-8")
+        try:
+            device._on_message(None, codecs_open.read())
+        finally:
+            codecs_open.close()
+        codecs_open = codecs.open("tests/data/ws_presets.xml", "r", "utf-8")
+        try:
+            device._on_message(None, codecs_open.read())
+        finally:
+            codecs_open.close()
+        received = list(events)
+        self.assertEqual([type(event) for event in received],
+                         [VolumeEvent, StatusEvent])
+        self.assertIs(received[0].device, device)
+        self.assertEqual(received[0].value.actual, 10)
+        self.assertEqual(received[1].type, 'status')
+        events.close()
+        self.assertEqual(device.volume_updated_listeners, [])
+        self.assertIsNone(events.get())
+        self.assertRaises(ValueError, device.events, types=('treble',))
+
+    def test_events_fleet(self):
+        devices = [MockDevice("192.168.1.%d" % i) for i in (1, 2)]
+        with EventStream(devices, types=('volume',)) as events:
+            def _push():
+                for volume in range(3):
+                    for device in devices:
+                        device._on_message(None, _volume_message(volume))
+
+            thread = Thread(target=_push)
+            thread.start()
+            thread.join()
+            first = next(events)
+            self.assertEqual(first.value.actual, 2)
+            self.assertEqual(next(events).device, devices[1])
+            # Pending events of a device are coalesced
+            self.assertEqual(events.dropped, 4)
+            self.assertIsNone(events.get(timeout=0.01))
+        self.assertTrue(events.closed)
+        self.assertEqual(devices[0].volume_updated_listeners, [])
+
+    def test_events_bounded(self):
+        device = MockDevice("192.168.1.1")
+        for policy, expected in ((DispatchPolicy.DROP_OLDEST, [2, 3]),
+                                 (DispatchPolicy.DROP_NEWEST, [0, 1])):
+            events = device.events(types=('volume',), max_size=2,
+                                   policy=policy, timeout=0)
+            for volume in range(4):
+                device._on_message(None, _volume_message(volume))
+            self.assertEqual([event.value.actual for event in events],
+                             expected)
+            self.assertEqual(events.dropped, 2)
+            events.close()
+
+    def _dispatch_volumes(self, dispatcher, count):
+        device = SoundTouchDevice("192.168.1.1", lazy=True,
+                                  dispatcher=dispatcher)
+        started = Event()
+        release = Event()
+        volumes = []
+
+        def listener(volume):
+            started.set()
+            release.wait(2)
+            volumes.append(volume.actual)
+
+        device.add_volume_listener(listener)
+        for volume in range(count):
+            device._on_message(None, _volume_message(volume))
+            # First listener call is running and blocked
+            started.wait(2)
+        self.assertEqual(volumes, [])
+        release.set()
+        return volumes
+
+    def test_dispatcher_coalesce(self):
+        dispatcher = ListenerDispatcher()
+        volumes = self._dispatch_volumes(dispatcher, 5)
+        self.assertTrue(_wait_for(lambda: len(volumes) == 2))
+        self.assertEqual(volumes, [0, 4])
+        metrics = dispatcher.metrics['192.168.1.1']
+        self.assertEqual(metrics['queue_depth'], 0)
+        self.assertEqual(metrics['max_queue_depth'], 1)
+        self.assertEqual(metrics['coalesced'], 3)
+        self.assertEqual(metrics['dropped'], 0)
+        self.assertTrue(_wait_for(
+            lambda: dispatcher.metrics['192.168.1.1']['callbacks'] == 2))
+        self.assertGreater(metrics['latency_max'], 0)
+        dispatcher.close()
+
+    def test_dispatcher_drop_newest(self):
+        dispatcher = ListenerDispatcher(max_queue_size=2,
+                                        policy=DispatchPolicy.DROP_NEWEST)
+        volumes = self._dispatch_volumes(dispatcher, 5)
+        self.assertTrue(_wait_for(lambda: len(volumes) == 3))
+        self.assertEqual(volumes, [0, 1, 2])
+        self.assertEqual(dispatcher.metrics['192.168.1.1']['dropped'], 2)
+        dispatcher.close()
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_volume)
+    def test_ws_ignored_notifications(self, mocked_volume):
+        device = MockDevice("192.168.1.1")
+        # Pushed states are stored by default
+        device._on_message(None, _volume_message(21))
+        self.assertEqual(device.volume(refresh=False).actual, 21)
+        self.assertEqual(mocked_volume.call_count, 0)
+        self.assertEqual(device.ignored_notifications, {})
+        device = SoundTouchDevice("192.168.1.1", lazy=True,
+                                  filter_notifications=True)
+        volume = device.volume()
+        with mock.patch('libsoundtouch.device._parse_xml') as mocked_parse:
+            device._on_message(None, _volume_message(21))
+            self.assertEqual(mocked_parse.call_count, 0)
+        self.assertEqual(device.ignored_notifications, {'volume': 1})
+        # Stored state is dropped: it is fetched again
+        self.assertIsNot(device.volume(refresh=False), volume)
+        self.assertEqual(mocked_volume.call_count, 2)
+        device.add_volume_listener(lambda volume: None)
+        device._on_message(None, _volume_message(21))
+        self.assertEqual(device.volume(refresh=False).actual, 21)
+        self.assertEqual(device.ignored_notifications, {'volume': 1})
+
+    def test_ws_coalesce_windows_threads(self):
+        devices = [SoundTouchDevice("192.168.1.%d" % i, lazy=True,
+                                    coalesce_windows={'volume': 0.1})
+                   for i in range(1, 6)]
+        volumes = []
+        for device in devices:
+            device.add_volume_listener(lambda volume: volumes.append(
+                volume.actual))
+            for volume in range(3):
+                device._on_message(None, _volume_message(volume))
+        self.assertTrue(_wait_for(lambda: len(volumes) == 10))
+        self.assertEqual(sorted(volumes), [0] * 5 + [2] * 5)
+        # Trailing notifications of all devices share one thread
+        self.assertEqual(len([thread for thread in enumerate_threads()
+                              if thread.name == "Throttle"]), 1)
+
+    def test_ws_coalesce_windows(self):
+        device = SoundTouchDevice("192.168.1.1", lazy=True,
+                                  coalesce_windows={'volume': 0.2})
+        volumes = []
+        statuses = []
+        device.add_volume_listener(lambda volume: volumes.append(
+            volume.actual))
+        device.add_status_listener(statuses.append)
+        with mock.patch('libsoundtouch.device.Volume',
+                        wraps=libsoundtouch.device.Volume) as mocked_volume:
+            for volume in range(5):
+                device._on_message(None, _volume_message(volume))
+            # First notification is delivered at once
+            self.assertEqual(volumes, [0])
+            codecs_open = codecs.open("tests/data/ws_status.xml", "r",
+                                      "utf-8")
+            try:
+                device._on_message(None, codecs_open.read())
+            finally:
+                codecs_open.close()
+            self.assertEqual(len(statuses), 1)
+            # Latest one at the end of the window, others are not parsed
+            self.assertTrue(_wait_for(lambda: len(volumes) == 2))
+            self.assertEqual(volumes, [0, 4])
+            self.assertEqual(mocked_volume.call_count, 2)
+        self.assertEqual(device.coalesced_notifications, {'volume': 3})
+        self.assertEqual(device.volume(refresh=False).actual, 4)
+        device.stop_notification()
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_volume)
+    def test_ws_notification_cache(self, mocked_volume):
+        device = SoundTouchDevice("192.168.1.1", lazy=True,
+                                  notification_cache=True)
+        self.assertFalse(device.notification_connected)
+        device._on_open(None)
+        self.assertTrue(device.notification_connected)
+        codecs_open = codecs.open("tests/data/ws_volume.xml", "r", "utf-8")
+        try:
+            device._on_message(None, codecs_open.read())
+        finally:
+            codecs_open.close()
+        # Pushed state is served without HTTP request
+        self.assertEqual(device.volume().actual, 21)
+        self.assertEqual(mocked_volume.call_count, 0)
+        # Explicit max age is still honored
+        self.assertEqual(device.volume(max_age=0).actual, 25)
+        self.assertEqual(mocked_volume.call_count, 1)
+        # State fetched while connected is kept up to date by notifications
+        self.assertEqual(device.volume().actual, 25)
+        self.assertEqual(mocked_volume.call_count, 1)
+        # Fallback to HTTP when websocket is disconnected
+        device._on_close(None)
+        self.assertFalse(device.notification_connected)
+        device.volume()
+        self.assertEqual(mocked_volume.call_count, 2)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_master)
+    def test_ws_zone_notification_cache(self, mocked_zone_status):
+        device = SoundTouchDevice("192.168.1.1", lazy=True,
+                                  notification_cache=True)
+        device._on_open(None)
+        device.zone_status()
+        device.zone_status()
+        self.assertEqual(mocked_zone_status.call_count, 1)
+        # The coherent zone is dropped when the frame arrives, before the
+        # deferred fetch
+        with mock.patch.object(device._deferred, 'request') as request:
+            device._on_message(None, '<updates deviceID="XXXX">'
+                                     '<zoneUpdated /></updates>')
+            self.assertEqual(request.call_count, 1)
+        device.zone_status()
+        self.assertEqual(mocked_zone_status.call_count, 2)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_volume)
+    def test_volume_skip_unchanged_payload(self, mocked_volume):
+        device = MockDevice("192.168.1.1")
+        volume = device.volume()
+        self.assertIs(device.volume(), volume)
+        self.assertEqual(mocked_volume.call_count, 2)
+        self.assertEqual(device.skipped_parses, {'volume': 1})
+        # A pushed state replaces the fetched one: next payload is parsed
+        device.add_volume_listener(lambda volume: None)
+        codecs_open = codecs.open("tests/data/ws_volume.xml", "r", "utf-8")
+        try:
+            device._on_message(None, codecs_open.read())
+        finally:
+            codecs_open.close()
+        self.assertEqual(device.volume(refresh=False).actual, 21)
+        self.assertEqual(device.volume().actual, 25)
+        self.assertEqual(device.skipped_parses, {'volume': 1})
+        # A different payload is parsed
+        mocked_volume.side_effect = lambda *args, **kwargs: MockResponse(
+            "<volume><targetvolume>30</targetvolume>"
+            "<actualvolume>30</actualvolume>"
+            "<muteenabled>false</muteenabled></volume>")
+        self.assertEqual(device.volume().actual, 30)
+        self.assertEqual(device.skipped_parses, {'volume': 1})
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_volume)
+    def test_ws_notification_cache_disabled(self, mocked_volume):
+        device = MockDevice("192.168.1.1")
+        device._on_open(None)
+        codecs_open = codecs.open("tests/data/ws_volume.xml", "r", "utf-8")
+        try:
+            device._on_message(None, codecs_open.read())
+        finally:
+            codecs_open.close()
+        self.assertEqual(device.volume().actual, 25)
+        self.assertEqual(mocked_volume.call_count, 1)
+
     def test_ws_volume_notification(self):
         device = MockDevice("192.168.1.1")
         self.listener_called = False
@@ -1080,50 +1937,208 @@ class TestLibSoundTouch(unittest.TestCase):
         finally:
             codecs_open.close()
 
-    @mock.patch('requests.get', side_effect=_mocked_zone_status_master)
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_master)
     def test_ws_zone_notification(self, mocked_zone_status):
         device = MockDevice("192.168.1.1")
         self.listener_called = False
         self.zone = None
 
         def listener(status_msg):
-            self.listener_called = True
             self.zone = status_msg
+            self.listener_called = True
 
         device.add_zone_status_listener(listener)
         codecs_open = codecs.open("tests/data/ws_zone.xml", "r", "utf-8")
         try:
             content = codecs_open.read()
             device._on_message(None, content)
-            self.assertTrue(self.listener_called)
+            self.assertTrue(_wait_for(lambda: self.listener_called))
             self.assertEqual(mocked_zone_status.call_count, 1)
             self.assertTrue(self.zone.is_master)
             self.assertEqual(self.zone.master_id, "1111MASTER")
         finally:
             codecs_open.close()
 
-    @mock.patch('requests.get', side_effect=_mocked_device_info)
+    @mock.patch('requests.Session.get')
+    def test_ws_zone_notification_storm(self, mocked_zone_status):
+        started = Event()
+        release = Event()
+
+        def _mocked_get(*args, **kwargs):
+            started.set()
+            release.wait(2)
+            return _mocked_zone_status_master(*args, **kwargs)
+
+        mocked_zone_status.side_effect = _mocked_get
+        device = MockDevice("192.168.1.1")
+        zones = []
+        device.add_zone_status_listener(zones.append)
+        codecs_open = codecs.open("tests/data/ws_zone.xml", "r", "utf-8")
+        try:
+            content = codecs_open.read()
+        finally:
+            codecs_open.close()
+        device._on_message(None, content)
+        self.assertTrue(started.wait(2))
+        # Frames received while fetching are merged in one more fetch
+        for _ in range(10):
+            device._on_message(None, content)
+        release.set()
+        self.assertTrue(_wait_for(lambda: len(zones) == 2))
+        time.sleep(0.1)
+        self.assertEqual(mocked_zone_status.call_count, 2)
+        self.assertEqual(zones[1].master_id, "1111MASTER")
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
+    def test_ws_info_notification_stale(self, mocked_device_info):
+        device = SoundTouchDevice("192.168.1.1")
+        config = device.config
+        with mock.patch.object(device._deferred, 'request'):
+            device._on_message(None, _read("tests/data/ws_info.xml"))
+        # Stale config fetched again on access
+        self.assertEqual(mocked_device_info.call_count, 1)
+        self.assertIsNot(device.config, config)
+        self.assertEqual(mocked_device_info.call_count, 2)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
     def test_ws_info_notification(self, mocked_device_info):
         device = MockDevice("192.168.1.1")
         self.listener_called = False
         self.info = None
 
         def listener(status_msg):
-            self.listener_called = True
             self.info = status_msg
+            self.listener_called = True
 
         device.add_device_info_listener(listener)
         codecs_open = codecs.open("tests/data/ws_info.xml", "r", "utf-8")
         try:
             content = codecs_open.read()
             device._on_message(None, content)
-            self.assertTrue(self.listener_called)
+            self.assertTrue(_wait_for(lambda: self.listener_called))
             self.assertEqual(mocked_device_info.call_count, 1)
             self.assertEqual(self.info.name, "Home")
         finally:
             codecs_open.close()
 
-    @mock.patch('requests.get', side_effect=_mocked_device_info)
+    @mock.patch('requests.Session.get', side_effect=_mocked_bass)
+    def test_bass(self, mocked_bass):
+        device = MockDevice("192.168.1.1")
+        bass = device.bass()
+        self.assertEqual(mocked_bass.call_count, 1)
+        self.assertEqual(bass.actual, -2)
+        self.assertEqual(bass.target, -3)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_sources)
+    def test_sources(self, mocked_sources):
+        device = MockDevice("192.168.1.1")
+        sources = device.sources()
+        self.assertEqual(mocked_sources.call_count, 1)
+        self.assertEqual(len(sources), 3)
+        self.assertEqual(sources[0].name, "AUX IN")
+        self.assertEqual(sources[0].source, "AUX")
+        self.assertTrue(sources[0].is_local)
+        self.assertEqual(sources[1].source_account, "user")
+        self.assertFalse(sources[1].is_local)
+        self.assertEqual(sources[2].status, "UNAVAILABLE")
+        self.assertIsNone(sources[2].name)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_group_none)
+    def test_group_none(self, mocked_group):
+        device = MockDevice("192.168.1.1")
+        self.assertIsNone(device.group())
+        self.assertEqual(mocked_group.call_count, 1)
+
+    def test_ws_now_selection_notification(self):
+        device = MockDevice("192.168.1.1")
+        selections = []
+        device.add_now_selection_listener(selections.append)
+        device._on_message(None, _read("tests/data/ws_now_selection.xml"))
+        self.assertEqual(len(selections), 1)
+        self.assertEqual(selections[0].preset_id, "2")
+        self.assertEqual(selections[0].name, "Radio Paradise")
+        self.assertIs(device.now_selection(), selections[0])
+
+    def test_ws_recents_notification(self):
+        device = MockDevice("192.168.1.1")
+        recents = []
+        device.add_recents_listener(recents.append)
+        device._on_message(None, _read("tests/data/ws_recents.xml"))
+        self.assertEqual(len(recents), 1)
+        self.assertEqual(len(device.recents()), 2)
+        recent = device.recents()[0]
+        self.assertEqual(recent.recent_id, "2487503")
+        self.assertEqual(recent.device_id, "XXXX")
+        self.assertEqual(recent.utc_time, 1480000000)
+        self.assertEqual(recent.content_item.name, "Clarity")
+        self.assertEqual(recent.content_item.source, "SPOTIFY")
+
+    def test_ws_connection_state_notification(self):
+        device = MockDevice("192.168.1.1")
+        states = []
+        device.add_connection_state_listener(states.append)
+        device._on_message(None, _read("tests/data/ws_connection_state.xml"))
+        self.assertEqual(len(states), 1)
+        self.assertEqual(states[0].state, "NETWORK_WIFI_CONNECTED")
+        self.assertTrue(states[0].up)
+        self.assertEqual(states[0].signal, "MARGINAL_SIGNAL")
+        self.assertEqual(device.connection_state(), states[0])
+
+    def test_ws_group_notification(self):
+        device = SoundTouchDevice("192.168.1.1", lazy=True,
+                                  notification_cache=True)
+        device._on_open(None)
+        groups = []
+        device.add_group_listener(groups.append)
+        device._on_message(None, _read("tests/data/ws_group.xml"))
+        group = groups[0]
+        self.assertEqual(group.group_id, "1115893")
+        self.assertEqual(group.name, "Bose-SM2-060d7d6d6446")
+        self.assertEqual(group.master_id, "XXXX")
+        self.assertEqual(group.status, "GROUP_OK")
+        self.assertEqual([role.role for role in group.roles],
+                         ["LEFT", "RIGHT"])
+        self.assertEqual(group.roles[1].device_id, "YYYY")
+        self.assertEqual(group.roles[1].device_ip, "192.168.1.2")
+        # Served from notification
+        with mock.patch('requests.Session.get') as mocked_get:
+            self.assertEqual(device.group(), group)
+            self.assertEqual(mocked_get.call_count, 0)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_bass)
+    def test_ws_bass_notification(self, mocked_bass):
+        device = MockDevice("192.168.1.1")
+        basses = []
+        device.add_bass_listener(basses.append)
+        device._on_message(None, _read("tests/data/ws_bass.xml"))
+        # bassUpdated doesn't carry the bass: fetched
+        self.assertTrue(_wait_for(lambda: basses))
+        self.assertEqual(mocked_bass.call_count, 1)
+        self.assertEqual(basses[0].actual, -2)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_sources)
+    def test_ws_sources_notification(self, mocked_sources):
+        device = MockDevice("192.168.1.1")
+        sources = []
+        device.add_sources_listener(sources.append)
+        device._on_message(None, _read("tests/data/ws_sources.xml"))
+        self.assertTrue(_wait_for(lambda: sources))
+        self.assertEqual(mocked_sources.call_count, 1)
+        self.assertEqual(len(sources[0]), 3)
+
+    def test_events_update_types(self):
+        device = MockDevice("192.168.1.1")
+        with device.events(types=('recents', 'connection_state'),
+                           timeout=1) as events:
+            device._on_message(None, _read("tests/data/ws_recents.xml"))
+            device._on_message(None,
+                               _read("tests/data/ws_connection_state.xml"))
+            received = [events.get(1), events.get(1)]
+        self.assertEqual([event.type for event in received],
+                         ['recents', 'connection_state'])
+        self.assertTrue(received[1].value.up)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
     @mock.patch('socket.inet_ntoa', return_value='192.168.1.1')
     @mock.patch('zeroconf.ServiceBrowser.__init__', return_value=None,
                 side_effect=_mocked_service_browser)
@@ -1137,19 +2152,430 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(devices[0].host, "192.168.1.1")
         self.assertEqual(devices[0].port, 8090)
 
-    @mock.patch('requests.post', side_effect=_mocked_select_bluetooth)
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
+    @mock.patch('socket.inet_ntoa', return_value='192.168.1.1')
+    @mock.patch('zeroconf.ServiceBrowser.__init__', return_value=None,
+                side_effect=_mocked_service_browser)
+    def test_discover_devices_expected_count(self, mocked_service_browser,
+                                             mocked_inet_ntoa,
+                                             mocked_request_get):
+        start = time.time()
+        devices = libsoundtouch.discover_devices(timeout=5, expected_count=1)
+        # Discovery ends with the last expected device
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(len(devices), 1)
+        self.assertEqual(devices[0].host, "192.168.1.1")
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
+    @mock.patch('socket.inet_ntoa', return_value='192.168.1.1')
+    @mock.patch('zeroconf.ServiceBrowser.__init__', return_value=None,
+                side_effect=_mocked_service_browser)
+    def test_iter_devices(self, mocked_service_browser, mocked_inet_ntoa,
+                          mocked_request_get):
+        found = []
+        start = time.time()
+        for device in libsoundtouch.iter_devices(
+                timeout=5, stop_when=lambda devices: devices[-1].config.name
+                == "Home"):
+            found.append(device)
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual([device.config.name for device in found], ["Home"])
+
+    @mock.patch('requests.Session.get', side_effect=RequestsConnectionError)
+    @mock.patch('socket.inet_ntoa', return_value='192.168.1.1')
+    @mock.patch('zeroconf.ServiceBrowser.__init__', return_value=None,
+                side_effect=_mocked_service_browser)
+    def test_iter_devices_unreachable(self, mocked_service_browser,
+                                      mocked_inet_ntoa, mocked_request_get):
+        failures = {}
+        self.assertEqual(list(libsoundtouch.iter_devices(
+            timeout=0.5, failures=failures)), [])
+        self.assertIsInstance(failures["192.168.1.1"],
+                              RequestsConnectionError)
+
+    @mock.patch('requests.Session.get')
+    @mock.patch('socket.inet_ntoa', side_effect=lambda address: address)
+    @mock.patch('zeroconf.ServiceBrowser.__init__', return_value=None)
+    def test_iter_devices_concurrent(self, mocked_service_browser,
+                                     mocked_inet_ntoa, mocked_request_get):
+        def _mocked_get(url, *args, **kwargs):
+            # 192.168.1.4 never answers in time
+            time.sleep(2 if "192.168.1.4" in url else 0.3)
+            return _mocked_device_info_of(url)
+
+        mocked_request_get.side_effect = _mocked_get
+        mocked_service_browser.side_effect = _mocked_service_browser_hosts(
+            "192.168.1.1", "192.168.1.2", "192.168.1.3", "192.168.1.4")
+        failures = {}
+        start = time.time()
+        devices = libsoundtouch.discover_devices(
+            timeout=1, device_timeout=0.6, failures=failures)
+        # Configurations are fetched concurrently
+        self.assertEqual(sorted(device.host for device in devices),
+                         ["192.168.1.1", "192.168.1.2", "192.168.1.3"])
+        self.assertLess(time.time() - start, 1.5)
+        self.assertEqual(list(failures), ["192.168.1.4"])
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
+    def test_soundtouch_devices_failures(self, mocked_request_get):
+        failures = {}
+        devices = libsoundtouch.soundtouch_devices(
+            ["192.168.1.1", "192.168.1.9"], failures=failures)
+        self.assertEqual([device.host for device in devices],
+                         ["192.168.1.1"])
+        self.assertEqual(list(failures), ["192.168.1.9"])
+
+    def _cache_path(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        return os.path.join(directory, "devices.json")
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
+    def test_device_cache(self, mocked_device_info):
+        path = self._cache_path()
+        cache = DeviceCache(path)
+        self.assertEqual(len(cache), 0)
+        device = SoundTouchDevice("192.168.1.1", ws_port=8081)
+        cache.put(device)
+        self.assertIn("00112233445566", cache)
+        # Loaded from disk, built without request
+        cache = DeviceCache(path)
+        devices = cache.devices(revalidate=False)
+        self.assertEqual(mocked_device_info.call_count, 1)
+        self.assertEqual(len(devices), 1)
+        self.assertEqual(devices[0].host, "192.168.1.1")
+        self.assertEqual(devices[0].ws_port, 8081)
+        self.assertEqual(devices[0].dlna_port, 8091)
+        self.assertEqual(devices[0].config, device.config)
+        self.assertEqual(devices[0].config.components[0].software_version,
+                         device.config.components[0].software_version)
+        # Revalidated in the background
+        devices = cache.devices()
+        cache.wait(2)
+        self.assertEqual(mocked_device_info.call_count, 2)
+        self.assertIn("00112233445566", cache)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info_of)
+    def test_device_cache_mismatch(self, mocked_device_info):
+        cache = DeviceCache(self._cache_path())
+        device = SoundTouchDevice("192.168.1.2")
+        # Another speaker got the address of the cached one
+        device._host = "192.168.1.1"
+        cache.put(device)
+        self.assertIn("192.168.1.2", cache)
+        cache.devices()
+        cache.wait(2)
+        self.assertNotIn("192.168.1.2", cache)
+        self.assertIn("192.168.1.1", cache)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
+    @mock.patch('socket.inet_ntoa', return_value='192.168.1.1')
+    @mock.patch('zeroconf.ServiceBrowser.__init__', return_value=None,
+                side_effect=_mocked_service_browser)
+    def test_discover_devices_cache_moved(self, mocked_service_browser,
+                                          mocked_inet_ntoa,
+                                          mocked_request_get):
+        path = self._cache_path()
+        cache = DeviceCache(path)
+        device = SoundTouchDevice("192.168.1.1")
+        # Cached at its former address
+        device._host = "192.168.1.50"
+        cache.put(device)
+        devices = libsoundtouch.discover_devices(timeout=0.5, cache=cache)
+        self.assertEqual(len(devices), 1)
+        self.assertEqual(devices[0].host, "192.168.1.1")
+        self.assertEqual(DeviceCache(path).devices(revalidate=False)[0].host,
+                         "192.168.1.1")
+
+    def test_device_cache_invalid_file(self):
+        path = self._cache_path()
+        with open(path, "w") as cache_file:
+            cache_file.write("{not json")
+        self.assertEqual(len(DeviceCache(path)), 0)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
+    @mock.patch('socket.inet_ntoa', return_value='192.168.1.1')
+    @mock.patch('zeroconf.ServiceBrowser.__init__', return_value=None,
+                side_effect=_mocked_service_browser)
+    def test_discover_devices_cache(self, mocked_service_browser,
+                                    mocked_inet_ntoa, mocked_request_get):
+        cache = DeviceCache(self._cache_path())
+        devices = libsoundtouch.discover_devices(timeout=1, cache=cache)
+        self.assertEqual(len(devices), 1)
+        self.assertIn("00112233445566", cache)
+        # Cached devices are found first, discovery ends without browsing
+        devices = libsoundtouch.discover_devices(timeout=5, cache=cache,
+                                                 expected_count=1)
+        self.assertEqual(mocked_service_browser.call_count, 1)
+        self.assertEqual(devices[0].config.name, "Home")
+        cache.wait(2)
+
+    def _registry(self):
+        browsers = []
+
+        def _browse(browser, zc, search, listener):
+            self.assertEqual(search, "_soundtouch._tcp.local.")
+            browsers.append(listener)
+
+        patches = [mock.patch('zeroconf.ServiceBrowser.__init__', _browse),
+                   mock.patch('zeroconf.ServiceBrowser.cancel'),
+                   mock.patch('socket.inet_ntoa',
+                              side_effect=lambda address: address)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        zc = mock.MagicMock()
+        registry = libsoundtouch.DeviceRegistry(zeroconf=zc)
+        events = []
+        registry.add_listener(lambda event, device: events.append(
+            (event, device.host)))
+        registry.start()
+        self.addCleanup(registry.stop)
+
+        def announce(name, host):
+            service_info = mock.MagicMock()
+            service_info.address = host
+            service_info.port = 8090
+            zc.get_service_info.return_value = service_info
+            browsers[0].add_service(zc, '', name + '._soundtouch._tcp.local.')
+        return registry, events, announce, browsers
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info_of)
+    def test_registry(self, mocked_device_info):
+        registry, events, announce, browsers = self._registry()
+        announce("Home", "192.168.1.1")
+        announce("Office", "192.168.1.2")
+        self.assertTrue(registry.wait(2, timeout=2))
+        self.assertEqual(registry.get("192.168.1.2").host, "192.168.1.2")
+        self.assertIs(registry.by_ip("192.168.1.1"),
+                      registry.get("192.168.1.1"))
+        self.assertEqual(len(registry.by_name("Home")), 2)
+        self.assertIn("192.168.1.1", registry)
+        self.assertTrue(_wait_for(lambda: len(events) == 2))
+        self.assertEqual(sorted(events),
+                         [(RegistryEvent.ADDED, "192.168.1.1"),
+                          (RegistryEvent.ADDED, "192.168.1.2")])
+        # Announced again: no new request
+        announce("Home", "192.168.1.1")
+        time.sleep(0.1)
+        self.assertEqual(mocked_device_info.call_count, 2)
+        browsers[0].remove_service(None, '', 'Office._soundtouch._tcp.local.')
+        self.assertEqual(events[-1], (RegistryEvent.REMOVED, "192.168.1.2"))
+        self.assertEqual(len(registry), 1)
+        self.assertIsNone(registry.by_ip("192.168.1.2"))
+        self.assertEqual(len(registry.by_name("Home")), 1)
+        registry.stop()
+        self.assertEqual(len(registry), 1)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
+    @mock.patch('socket.inet_ntoa', return_value='192.168.1.1')
+    @mock.patch('zeroconf.ServiceBrowser.cancel')
+    @mock.patch('zeroconf.ServiceBrowser.__init__', return_value=None)
+    def test_discover_devices_shared_zeroconf(self, mocked_service_browser,
+                                              mocked_cancel, mocked_inet_ntoa,
+                                              mocked_request_get):
+        def _browse(zc, search, listener):
+            _mocked_service_browser(zeroconf.Zeroconf.__new__(
+                zeroconf.Zeroconf), search, listener)
+
+        mocked_service_browser.side_effect = _browse
+        zc = mock.MagicMock()
+        devices = libsoundtouch.discover_devices(zeroconf=zc,
+                                                 expected_count=1)
+        self.assertEqual(len(devices), 1)
+        # The browser is cancelled, the shared instance is left open
+        self.assertEqual(mocked_cancel.call_count, 1)
+        self.assertEqual(zc.close.call_count, 0)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_info("AAAA"))
+    def test_registry_address_change(self, mocked_device_info):
+        registry, events, announce, browsers = self._registry()
+        announce("Kitchen", "192.168.1.1")
+        self.assertTrue(registry.wait(1, timeout=2))
+        device = registry.get("AAAA")
+        # New DHCP lease
+        announce("Kitchen", "192.168.1.3")
+        self.assertTrue(_wait_for(lambda: len(events) == 2))
+        self.assertEqual(events[1], (RegistryEvent.UPDATED, "192.168.1.3"))
+        self.assertIs(registry.get("AAAA"), device)
+        self.assertEqual(device.host, "192.168.1.3")
+        self.assertIs(registry.by_ip("192.168.1.3"), device)
+        self.assertIsNone(registry.by_ip("192.168.1.1"))
+
+    @mock.patch('requests.Session.get',
+                side_effect=_mocked_info("AAAA", "192.168.1.3"))
+    def test_registry_update_unlocked(self, mocked_device_info):
+        registry = libsoundtouch.DeviceRegistry()
+        events = []
+        registry.add_listener(lambda event, device: events.append(event))
+        device = registry.add(SoundTouchDevice("192.168.1.1"))
+        locked = []
+
+        def update(host, port, config):
+            # Another thread can use the registry during the update
+            thread = Thread(target=len, args=(registry,))
+            thread.start()
+            thread.join(1)
+            locked.append(thread.is_alive())
+            raise RuntimeError("Update failed")
+
+        with mock.patch.object(device, '_update', side_effect=update):
+            self.assertIs(registry.add(SoundTouchDevice("192.168.1.3")),
+                          device)
+        self.assertEqual(locked, [False])
+        # The failed update is not notified
+        self.assertEqual(events, [RegistryEvent.ADDED])
+        registry.remove_listener(update)
+        self.assertEqual(len(registry.listeners), 1)
+
+    @mock.patch('requests.Session.get',
+                side_effect=_mocked_info("AAAA", "192.168.1.1"))
+    def test_registry_interfaces(self, mocked_device_info):
+        registry, events, announce, browsers = self._registry()
+        announce("Kitchen", "192.168.1.1")
+        self.assertTrue(registry.wait(1, timeout=2))
+        # Same speaker seen on another interface
+        announce("Kitchen-eth", "192.168.1.2")
+        self.assertTrue(_wait_for(
+            lambda: registry.by_ip("192.168.1.2") is not None))
+        self.assertEqual(len(registry), 1)
+        self.assertEqual(registry.get("AAAA").host, "192.168.1.1")
+        self.assertEqual(events, [(RegistryEvent.ADDED, "192.168.1.1")])
+        # Removed with its last service
+        browsers[0].remove_service(None, '', 'Kitchen._soundtouch._tcp.local.')
+        self.assertEqual(len(registry), 1)
+        browsers[0].remove_service(None, '',
+                                   'Kitchen-eth._soundtouch._tcp.local.')
+        self.assertEqual(len(registry), 0)
+        self.assertEqual(events[-1], (RegistryEvent.REMOVED, "192.168.1.1"))
+
+    def _listening_port(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(("127.0.0.1", 0))
+        server.listen(16)
+        self.addCleanup(server.close)
+        return server.getsockname()[1]
+
+    def test_network_hosts(self):
+        self.assertEqual(list(network_hosts("192.168.1.0/30")),
+                         ["192.168.1.1", "192.168.1.2"])
+        self.assertEqual(len(list(network_hosts("192.168.1.17/24"))), 254)
+        self.assertEqual(list(network_hosts("192.168.1.17")),
+                         ["192.168.1.17"])
+        self.assertRaises(ValueError, network_hosts, "192.168.1.0/33")
+        # Generated on demand
+        hosts = network_hosts("10.0.0.0/8")
+        self.assertEqual(next(hosts), "10.0.0.1")
+        self.assertEqual(next(hosts), "10.0.0.2")
+
+    def test_scan_hosts(self):
+        port = self._listening_port()
+        # Only 127.0.0.1 listens, other hosts refuse the connection
+        with mock.patch('libsoundtouch.scan._connect',
+                        wraps=libsoundtouch.scan._connect) as mocked_connect:
+            self.assertEqual(list(scan_hosts("127.0.0.0/24", port,
+                                             connect_timeout=0.5)),
+                             ["127.0.0.1"])
+        self.assertEqual(mocked_connect.call_count, 254)
+        mocked_connect.assert_any_call("127.0.0.254", port)
+
+    def test_scan_hosts_timeout(self):
+        # Connection never established: its socket is not writable
+        silent, peer = socket.socketpair()
+        self.addCleanup(peer.close)
+        silent.setblocking(False)
+        try:
+            while True:
+                silent.send(b'\0' * 65536)
+        except socket.error:
+            pass
+        waits = []
+        selector_class = libsoundtouch.scan.selectors.DefaultSelector
+
+        def _selector():
+            selector = selector_class()
+            select = selector.select
+
+            def _select(timeout=None):
+                waits.append(timeout)
+                return select(timeout)
+
+            selector.select = _select
+            return selector
+
+        with mock.patch('libsoundtouch.scan._connect',
+                        return_value=silent), \
+                mock.patch('libsoundtouch.scan.selectors.DefaultSelector',
+                           side_effect=_selector):
+            self.assertEqual(list(scan_hosts("192.168.1.1", 8090,
+                                             connect_timeout=0.2)), [])
+        # Dropped once the connect timeout is elapsed
+        self.assertTrue(waits)
+        self.assertTrue(all(wait <= 0.2 for wait in waits))
+        self.assertEqual(silent.fileno(), -1)
+
+    def test_scan_hosts_rate(self):
+        port = self._listening_port()
+        times = []
+        clock = []
+
+        def _monotonic():
+            clock.append(time.time())
+            return clock[-1]
+
+        def _connect(host, port):
+            times.append(clock[-1])
+            return connect(host, port)
+
+        connect = libsoundtouch.scan._connect
+        with mock.patch('libsoundtouch.scan.monotonic',
+                        side_effect=_monotonic), \
+                mock.patch('libsoundtouch.scan._connect',
+                           side_effect=_connect):
+            self.assertEqual(list(scan_hosts("127.0.0.0/28", port, rate=50,
+                                             max_connections=2)),
+                             ["127.0.0.1"])
+        # The n-th connection is not opened before n / rate seconds
+        start = clock[0]
+        self.assertEqual(len(times), 14)
+        for index, opened in enumerate(times):
+            self.assertGreaterEqual(opened, start + index / 50.0)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info_of)
+    def test_scan_devices(self, mocked_device_info):
+        port = self._listening_port()
+        registry = libsoundtouch.DeviceRegistry()
+        devices = scan_devices("127.0.0.0/30", port, registry=registry)
+        self.assertEqual([device.host for device in devices], ["127.0.0.1"])
+        self.assertEqual(devices[0].port, port)
+        self.assertIs(registry.get("127.0.0.1"), devices[0])
+        # Already indexed devices are merged
+        self.assertIs(scan_devices("127.0.0.1", port,
+                                   registry=registry)[0], devices[0])
+        self.assertEqual(mocked_device_info.call_count, 1)
+
+    @mock.patch('requests.Session.get', side_effect=RequestsConnectionError)
+    def test_scan_devices_failures(self, mocked_get):
+        port = self._listening_port()
+        failures = {}
+        self.assertEqual(scan_devices("127.0.0.1", port, failures=failures),
+                         [])
+        self.assertIsInstance(failures["127.0.0.1"], RequestsConnectionError)
+
+    @mock.patch('requests.Session.post', side_effect=_mocked_select_bluetooth)
     def test_select_bluetooth(self, mocked_select_bluetooth):
         device = MockDevice("192.168.1.1")
         device.select_source_bluetooth()
         self.assertEqual(mocked_select_bluetooth.call_count, 1)
 
-    @mock.patch('requests.post', side_effect=_mocked_select_aux)
+    @mock.patch('requests.Session.post', side_effect=_mocked_select_aux)
     def test_select_aux(self, mocked_select_aux):
         device = MockDevice("192.168.1.1")
         device.select_source_aux()
         self.assertEqual(mocked_select_aux.call_count, 1)
 
-    @mock.patch('requests.post', side_effect=_mocked_select_content_item)
+    @mock.patch('requests.Session.post',
+                side_effect=_mocked_select_content_item)
     def test_select_content_item(self, mocked_select_content_item):
         device = MockDevice("192.168.1.1")
         device.select_content_item(Source.SPOTIFY, "spotify_account",
@@ -1157,8 +2583,9 @@ class TestLibSoundTouch(unittest.TestCase):
                                    "uri")
         self.assertEqual(mocked_select_content_item.call_count, 1)
 
-    @mock.patch('requests.get', side_effect=_mocked_status_spotify)
-    @mock.patch('requests.post', side_effect=_mocked_select_content_item)
+    @mock.patch('requests.Session.get', side_effect=_mocked_status_spotify)
+    @mock.patch('requests.Session.post',
+                side_effect=_mocked_select_content_item)
     def test_snapshot_restore(self, mocked_device_status,
                               mocked_select_content_item):
         device = MockDevice("192.168.1.1")